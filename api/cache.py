@@ -0,0 +1,232 @@
+import threading
+import uuid
+from collections import OrderedDict
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+DEFAULT_CHART_CACHE = {
+    'BACKEND': 'api.cache.LocMemChartCache',
+    'OPTIONS': {'max_entries': 1024},
+}
+
+# Backends private to each process, invalidating them only reaches the worker that wrote
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+# Longest time a worker serves entries another worker invalidated, on a process-local alias
+PROCESS_LOCAL_TIMEOUT = 30
+
+DEFAULT_CATALOG_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': 3600,
+}
+
+DEFAULT_MEMBERSHIP_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': 3600,
+}
+
+class BaseChartCache:
+    """
+    Cache of rendered dental chart payloads, one slot per patient.
+    Every entry is tagged with the chart version it was rendered from and is only
+    returned for that exact version, so a stale entry can never be served.
+    """
+
+    def get(self, patient_id, version):
+        raise NotImplementedError
+
+    def set(self, patient_id, version, payload):
+        raise NotImplementedError
+
+    def invalidate(self, patient_id):
+        raise NotImplementedError
+
+class NullChartCache(BaseChartCache):
+    """Chart cache that never stores anything."""
+
+    def get(self, patient_id, version):
+        return None
+
+    def set(self, patient_id, version, payload):
+        pass
+
+    def invalidate(self, patient_id):
+        pass
+
+class LocMemChartCache(BaseChartCache):
+    """In-process LRU chart cache, private to each worker."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, patient_id, version):
+        with self._lock:
+            entry = self._entries.get(patient_id)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(patient_id)
+            return entry[1]
+
+    def set(self, patient_id, version, payload):
+        with self._lock:
+            self._entries[patient_id] = (version, payload)
+            self._entries.move_to_end(patient_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, patient_id):
+        with self._lock:
+            self._entries.pop(patient_id, None)
+
+class SharedChartCache(BaseChartCache):
+    """Chart cache on a Django cache alias (e.g. Redis or Memcached) shared by all workers."""
+
+    def __init__(self, alias='default', timeout=3600, key_prefix='dental-chart'):
+        self.alias = alias
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def make_key(self, patient_id):
+        return f"{self.key_prefix}:{patient_id}"
+
+    def get(self, patient_id, version):
+        entry = self.cache.get(self.make_key(patient_id))
+        if entry is None or entry[0] != version:
+            return None
+        return entry[1]
+
+    def set(self, patient_id, version, payload):
+        self.cache.set(self.make_key(patient_id), (version, payload), self.timeout)
+
+    def invalidate(self, patient_id):
+        self.cache.delete(self.make_key(patient_id))
+
+_chart_cache = None
+
+def get_chart_cache():
+    """Return the chart cache configured by the DENTAL_CHART_CACHE setting."""
+    global _chart_cache
+    if _chart_cache is None:
+        config = getattr(settings, 'DENTAL_CHART_CACHE', DEFAULT_CHART_CACHE)
+        if not config:
+            _chart_cache = NullChartCache()
+        else:
+            backend = import_string(config['BACKEND'])
+            _chart_cache = backend(**config.get('OPTIONS', {}))
+    return _chart_cache
+
+@receiver(setting_changed)
+def reset_chart_cache(setting, **kwargs):
+    """Rebuild the chart cache when DENTAL_CHART_CACHE changes, e.g. in tests."""
+    global _chart_cache
+    if setting == 'DENTAL_CHART_CACHE':
+        _chart_cache = None
+
+class VersionedCache:
+    """
+    Per-object cache on a Django cache alias, e.g. the dental catalogs of a clinic or the clinic
+    memberships of a user. Entries are stored under the id's current version, invalidating
+    an object just moves it to a fresh version so every worker sharing the alias reloads it.
+    Use a shared alias (e.g. Redis) when running several workers, entries on a process-local
+    alias only live PROCESS_LOCAL_TIMEOUT seconds.
+    """
+
+    def __init__(self, alias='default', timeout=3600, key_prefix='dental-catalog'):
+        self.alias = alias
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get_version(self, object_id):
+        key = f"{self.key_prefix}-version:{object_id}"
+        version = self.cache.get(key)
+        if version is None:
+            # Random versions, so an evicted version key can never bring back an old entry
+            self.cache.add(key, uuid.uuid4().hex, None)
+            version = self.cache.get(key)
+        return version
+
+    @property
+    def entry_timeout(self):
+        if is_process_local(self.alias):
+            # Other workers never see our invalidations, bound how long they serve old entries
+            return min(self.timeout, PROCESS_LOCAL_TIMEOUT)
+        return self.timeout
+
+    def get(self, object_id, load):
+        """Return the entry of `object_id`, calling `load()` to build it on a miss."""
+        key = f"{self.key_prefix}:{object_id}:{self.get_version(object_id)}"
+        entry = self.cache.get(key)
+        if entry is None:
+            entry = load()
+            self.cache.set(key, entry, self.entry_timeout)
+        return entry
+
+    def invalidate(self, object_id):
+        self.cache.set(f"{self.key_prefix}-version:{object_id}", uuid.uuid4().hex, None)
+
+def is_process_local(alias):
+    """Whether the cache alias is private to each process, like the stock LocMemCache default."""
+    return isinstance(caches[alias], PROCESS_LOCAL_CACHES)
+
+# Versioned caches and the default config of their settings, each must be shared by all workers
+VERSIONED_CACHE_SETTINGS = {
+    'DENTAL_CATALOG_CACHE': DEFAULT_CATALOG_CACHE,
+    'CLINIC_MEMBERSHIP_CACHE': DEFAULT_MEMBERSHIP_CACHE,
+}
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_versioned_caches(app_configs, **kwargs):
+    """Deployments must keep the catalog and membership caches on an alias every worker shares."""
+    errors = []
+    for setting, default in VERSIONED_CACHE_SETTINGS.items():
+        alias = getattr(settings, setting, default).get('ALIAS', 'default')
+        if is_process_local(alias):
+            errors.append(checks.Error(
+                f"{setting} uses the process-local cache alias '{alias}'.",
+                hint='Point it to a cache shared by all workers (e.g. Redis), changes only '
+                     f'reach other workers after {PROCESS_LOCAL_TIMEOUT}s otherwise.',
+                id='api.E001',
+            ))
+    return errors
+
+def get_catalog_cache():
+    """Return the catalog cache configured by the DENTAL_CATALOG_CACHE setting."""
+    config = getattr(settings, 'DENTAL_CATALOG_CACHE', DEFAULT_CATALOG_CACHE)
+    return VersionedCache(alias=config.get('ALIAS', 'default'), timeout=config.get('TIMEOUT', 3600))
+
+def get_chart_names_cache():
+    """
+    Return the versions of the user names rendered charts show, per clinic. Kept apart from
+    the catalog versions so a rename does not reload the catalog, on the DENTAL_CATALOG_CACHE alias.
+    """
+    config = getattr(settings, 'DENTAL_CATALOG_CACHE', DEFAULT_CATALOG_CACHE)
+    return VersionedCache(
+        alias=config.get('ALIAS', 'default'),
+        timeout=config.get('TIMEOUT', 3600),
+        key_prefix='dental-chart-names'
+    )
+
+def get_membership_cache():
+    """Return the per-user clinic membership cache configured by the CLINIC_MEMBERSHIP_CACHE setting."""
+    config = getattr(settings, 'CLINIC_MEMBERSHIP_CACHE', DEFAULT_MEMBERSHIP_CACHE)
+    return VersionedCache(
+        alias=config.get('ALIAS', 'default'),
+        timeout=config.get('TIMEOUT', 3600),
+        key_prefix='clinic-memberships'
+    )
@@ -0,0 +1,128 @@
+import heapq
+from datetime import time
+from itertools import groupby
+
+# Bookable hours and slot grid, the same as the time slot picker
+DAY_START = 9 * 60
+DAY_END = 17 * 60
+SLOT_STEP = 30
+
+def to_minutes(value):
+    """Minutes since midnight of a time, seconds round up so a busy interval is never shortened."""
+    return value.hour * 60 + value.minute + (1 if value.second or value.microsecond else 0)
+
+def to_time(minutes):
+    return time(minutes // 60, minutes % 60)
+
+# Occupancy bitmaps, bit i set when minutes [i * BITMAP_MINUTES, (i + 1) * BITMAP_MINUTES) are booked
+BITMAP_MINUTES = 5
+BITMAP_BITS = 24 * 60 // BITMAP_MINUTES
+BITMAP_BYTES = BITMAP_BITS // 8
+
+def interval_mask(start, end):
+    """Bitmap of the cells touched by minutes [start, end), partly booked cells count as booked."""
+    first = start // BITMAP_MINUTES
+    last = -(-end // BITMAP_MINUTES)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+def bitmap_from_intervals(intervals):
+    bitmap = 0
+    for start, end in intervals:
+        bitmap |= interval_mask(start, end)
+    return bitmap
+
+def bitmap_intervals(bitmap):
+    """Disjoint (start, end) minute intervals of the runs of set bits, in order."""
+    intervals = []
+    offset = 0
+    while bitmap:
+        # Skip the clear bits, then measure the run of set bits
+        skip = (bitmap & -bitmap).bit_length() - 1
+        bitmap >>= skip
+        offset += skip
+        run = (~bitmap & (bitmap + 1)).bit_length() - 1
+        intervals.append([offset * BITMAP_MINUTES, (offset + run) * BITMAP_MINUTES])
+        bitmap >>= run
+        offset += run
+    return intervals
+
+def pack_bitmap(bitmap):
+    return bitmap.to_bytes(BITMAP_BYTES, 'little')
+
+def unpack_bitmap(value):
+    return int.from_bytes(value or b'', 'little')
+
+def merge_intervals(intervals):
+    """Merge (start, end) intervals sorted by start into disjoint ones, in a single pass."""
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+def free_slots(busy, duration, day_start=DAY_START, day_end=DAY_END, step=SLOT_STEP, earliest=None):
+    """
+    Yield the start minute of every slot on the step grid where `duration` minutes
+    fit between the merged busy intervals, walking the day and the intervals together.
+    """
+    start = day_start
+    if earliest is not None and earliest > start:
+        # Round up to the next grid point
+        start += -(-(earliest - day_start) // step) * step
+    for busy_start, busy_end in busy + [[day_end, day_end]]:
+        while start + duration <= min(busy_start, day_end):
+            yield start
+            start += step
+        if busy_end > start:
+            start += -(-(busy_end - start) // step) * step
+        if start + duration > day_end:
+            return
+
+def busy_from_bookings(bookings):
+    """
+    Merged busy intervals keyed by (dentist_id, date), from (dentist_id, date, start_time, end_time)
+    rows sorted by dentist, date and start time, as a single query returns them.
+    """
+    return {
+        key: merge_intervals((to_minutes(start), to_minutes(end)) for _, _, start, end in rows)
+        for key, rows in groupby(bookings, key=lambda row: (row[0], row[1]))
+    }
+
+def find_availability(busy, dentist_ids, dates, duration, limit=None, now=None, **grid):
+    """
+    Free slots of several dentists over several days, in (date, start, dentist) order.
+
+    `busy` maps (dentist_id, date) to disjoint busy intervals in minutes, days without an
+    entry are free. The per-dentist slot streams are interleaved lazily, so a `limit` of N
+    stops after the first N open slots. `now` is a datetime, slots before it are skipped.
+    """
+    def day_slots(day):
+        earliest = to_minutes(now.time()) if now and day == now.date() else None
+        if now and day < now.date():
+            return
+
+        def dentist_slots(dentist_id):
+            for start in free_slots(busy.get((dentist_id, day), []), duration, earliest=earliest, **grid):
+                yield start, dentist_id
+
+        streams = [dentist_slots(dentist_id) for dentist_id in dentist_ids]
+        for start, dentist_id in heapq.merge(*streams):
+            yield {
+                'dentist': dentist_id,
+                'date': day,
+                'start_time': to_time(start),
+                'end_time': to_time(start + duration),
+            }
+
+    slots = []
+    for day in dates:
+        for slot in day_slots(day):
+            slots.append(slot)
+            if limit is not None and len(slots) >= limit:
+                return slots
+    return slots
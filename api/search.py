@@ -0,0 +1,121 @@
+import re
+from bisect import bisect_left
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Relative weight of a match in each indexed field
+FIELD_WEIGHTS = {
+    'code': 4,
+    'name': 3,
+    'description': 1,
+}
+
+# Score multiplier by how a query token matched an indexed token
+EXACT, PREFIX, FUZZY = 3, 2, 1
+
+def tokenize(text):
+    return _TOKEN_RE.findall((text or '').lower())
+
+def _max_typos(token):
+    # Short tokens get no typo tolerance, they would match almost anything
+    if len(token) >= 8:
+        return 2
+    if len(token) >= 4:
+        return 1
+    return 0
+
+def _within_distance(a, b, limit):
+    """Whether the edit distance between a and b is at most limit."""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        if min(current) > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+class CatalogSearchIndex:
+    """
+    In-memory token index over the name, code and description of catalog entries.
+    Every query token must match an indexed token exactly, as a prefix or, when it has
+    no exact or prefix match at all, within a small edit distance. Results are ranked
+    by field weight and match quality, then by name.
+    """
+
+    def __init__(self, entries):
+        self.entries = {entry.id: entry for entry in entries}
+        self.postings = {}
+        for entry in entries:
+            for field, weight in FIELD_WEIGHTS.items():
+                value = getattr(entry, field, '')
+                tokens = tokenize(value)
+                if field == 'code':
+                    # Codes are matched as a whole as well, e.g. "d2140"
+                    tokens.append(''.join(tokens))
+                for token in tokens:
+                    postings = self.postings.setdefault(token, {})
+                    postings[entry.id] = max(postings.get(entry.id, 0), weight)
+        self.vocabulary = sorted(self.postings)
+
+    def _prefixed(self, token):
+        start = bisect_left(self.vocabulary, token)
+        for candidate in self.vocabulary[start:]:
+            if not candidate.startswith(token):
+                break
+            yield candidate
+
+    def _token_scores(self, token):
+        scores = {}
+
+        def add(candidate, quality):
+            for entry_id, weight in self.postings[candidate].items():
+                scores[entry_id] = max(scores.get(entry_id, 0), weight * quality)
+
+        for candidate in self._prefixed(token):
+            add(candidate, EXACT if candidate == token else PREFIX)
+        if not scores:
+            limit = _max_typos(token)
+            if limit:
+                for candidate in self.vocabulary:
+                    if _within_distance(token, candidate, limit):
+                        add(candidate, FUZZY)
+        return scores
+
+    def search(self, query):
+        """Return the entries matching `query`, best match first."""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        scores = None
+        for token in tokens:
+            token_scores = self._token_scores(token)
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {
+                    entry_id: score + token_scores[entry_id]
+                    for entry_id, score in scores.items() if entry_id in token_scores
+                }
+            if not scores:
+                return []
+
+        phrase = ' '.join(tokens)
+        ranked = []
+        for entry_id, score in scores.items():
+            entry = self.entries[entry_id]
+            if ''.join(tokenize(entry.code)) == ''.join(tokens):
+                score += 100
+            elif ' '.join(tokenize(entry.name)).startswith(phrase):
+                score += 10
+            ranked.append((-score, entry.name.lower(), entry_id))
+        ranked.sort()
+        return [self.entries[entry_id] for _, _, entry_id in ranked]
@@ -0,0 +1,66 @@
+from datetime import timedelta
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.viewsets import GenericViewSet
+from api.models import ClinicMembership
+from api.models.dental_chart import get_clinic_catalog
+from api.models.schedule import get_schedule_bitmaps
+from api.scheduling import SLOT_STEP, bitmap_intervals, find_availability
+from api.serializers.appointments import AvailabilityQuerySerializer
+from api.views.mixins import ClinicViewSetMixin
+
+class AvailabilityViewSet(ClinicViewSetMixin, GenericViewSet):
+    """
+    Open appointment slots of several dentists over a range of days in one call.
+    The occupancy bitmaps of every requested dentist and day are read with a single
+    query, ?limit=N returns just the first N openings.
+    """
+
+    def search(self, request, clinic_id=None):
+        clinic = self.get_clinic_from_url()
+        query = AvailabilityQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        memberships = ClinicMembership.objects.filter(clinic=clinic, role='dentist')
+        if 'dentists' in params:
+            memberships = memberships.filter(user_id__in=params['dentists'])
+        dentist_ids = sorted(set(memberships.values_list('user_id', flat=True)))
+        unknown = set(params.get('dentists', [])) - set(dentist_ids)
+        if unknown:
+            raise ValidationError({'dentists': f"Not dentists of this clinic: {', '.join(map(str, sorted(unknown)))}"})
+
+        duration = params.get('duration', SLOT_STEP)
+        if 'procedure' in params:
+            procedure = get_clinic_catalog(clinic.id).procedures.get(params['procedure'])
+            if procedure is None:
+                raise ValidationError({'procedure': 'Unknown procedure'})
+            duration = procedure.duration_minutes
+
+        start_date, end_date = params['start_date'], params['end_date']
+        # Schedules cover bookings in other clinics too, they keep a dentist busy as well
+        busy = {
+            key: bitmap_intervals(bitmap)
+            for key, bitmap in get_schedule_bitmaps(dentist_ids, start_date, end_date).items()
+        }
+        dates = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+        slots = find_availability(
+            busy, dentist_ids, dates, duration,
+            limit=params.get('limit'), now=timezone.localtime()
+        )
+
+        return Response({
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat(),
+            'duration_minutes': duration,
+            'slots': [
+                {
+                    'dentist': slot['dentist'],
+                    'date': slot['date'].isoformat(),
+                    'start_time': slot['start_time'].strftime('%H:%M'),
+                    'end_time': slot['end_time'].strftime('%H:%M'),
+                }
+                for slot in slots
+            ],
+        })
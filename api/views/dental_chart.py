@@ -1,13 +1,418 @@
+import base64
+from django.db import IntegrityError, transaction
+from django.db.models import Q, prefetch_related_objects
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.mixins import CreateModelMixin
+from rest_framework.viewsets import GenericViewSet
+from api.cache import get_catalog_cache, get_chart_cache, get_chart_names_cache
+from api.models import Patient
+from api.models.dental_chart import (
+    ChartHistory, DentalChartCondition, DentalChartProcedure,
+    provision_dental_chart_teeth, uses_virtual_teeth, get_chart_tooth, save_chart_tooth, get_chart_teeth,
+    record_chart_changes, get_clinic_catalog
+)
+from api.serializers.dental_chart import (
+    DentalConditionSerializer, DentalProcedureSerializer, ChartHistorySerializer, ChartBatchSerializer, DentalChartConditionSerializer,
+    DentalChartProcedureSerializer, get_fast_chart_teeth, get_fast_chart_payload, get_chart_version,
+    get_chart_changes, fill_virtual_teeth, compact_chart, COMPACT_TOOTH_FIELDS, COMPACT_TOOTH_TEMPLATE
+)
+from api.views.mixins import ClinicViewSetMixin
+
+def _chart_etag(patient, version, catalog_version, names_version, variant=''):
+    # The chart version covers teeth entries, updated_at covers the patient name, the catalog
+    # version the condition and procedure names and the names version the user names in the chart
+    return (
+        f'"{patient.pk}-{version}-{patient.updated_at.timestamp():.6f}'
+        f'-{catalog_version}-{names_version}{variant}"'
+    )
+
+class CompactChartRenderer(JSONRenderer):
+    """Plain JSON selected with ?format=compact, tells the chart view to send the compact encoding."""
+    format = 'compact'
+
+class ChartHistoryPagination(BasePagination):
+    """
+    Keyset pagination over (date, id), newest first.
+    The cursor carries the (date, id) of the last entry on the previous page, so every
+    page is a range scan from that point instead of an OFFSET over the whole history.
+    """
+    page_size = 50
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        cursor = self.decode_cursor(request)
+        if cursor:
+            date, pk = cursor
+            queryset = queryset.filter(Q(date__lt=date) | Q(date=date, id__lt=pk))
+
+        # Fetch one extra row to know whether there is a next page
+        rows = list(queryset.order_by('-date', '-id')[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        token = f"{last.date.isoformat()}|{last.id}"
+        cursor = base64.urlsafe_b64encode(token.encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            date, pk = base64.urlsafe_b64decode(encoded.encode()).decode().split('|')
+            date = parse_datetime(date)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound('Invalid cursor')
+        if date is None:
+            raise NotFound('Invalid cursor')
+        return date, pk
+
+class DentalCatalogViewSet(ClinicViewSetMixin, CreateModelMixin, GenericViewSet):
+    """
+    Clinic catalog of conditions or procedures, listed from the cached clinic catalog.
+    Subclasses set catalog_attribute to the ClinicCatalog mapping they list and may
+    narrow the entries further in filter_catalog().
+    """
+    catalog_attribute = None
+
+    def get_queryset(self):
+        return self.serializer_class.Meta.model.objects.filter(clinic=self.get_clinic_from_url())
+
+    def filter_catalog(self, entries):
+        return entries
+
+    def list(self, request, clinic_id=None):
+        clinic = self.get_clinic_from_url()
+        catalog = get_clinic_catalog(clinic.id)
+        search = request.query_params.get('search')
+        if search:
+            # Prefix, token and typo tolerant matches from the catalog's index, best first
+            entries = catalog.search(self.catalog_attribute, search)
+        else:
+            entries = list(getattr(catalog, self.catalog_attribute).values())
+        entries = self.filter_catalog(entries)
+        page = self.paginate_queryset(entries)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(entries, many=True).data)
+
+    def perform_create(self, serializer):
+        # Catalog entries added by a clinic are custom, the standard ones come from migrations
+        serializer.save(clinic=self.get_clinic_from_url(), is_standard=False)
+
+class DentalConditionViewSet(DentalCatalogViewSet):
+    serializer_class = DentalConditionSerializer
+    catalog_attribute = 'conditions'
+
+class DentalProcedureViewSet(DentalCatalogViewSet):
+    serializer_class = DentalProcedureSerializer
+    catalog_attribute = 'procedures'
+
+    def filter_catalog(self, entries):
+        entries = super().filter_catalog(entries)
+        category = self.request.query_params.get('category')
+        if category:
+            entries = [entry for entry in entries if entry.category == category]
+        return entries
+
+class DentalChartViewSet(ClinicViewSetMixin, GenericViewSet):
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if self.action == 'retrieve':
+            renderers.append(CompactChartRenderer())
+        return renderers
+
+    def retrieve(self, request, clinic_id=None, patient_id=None):
+        """Get the full dental chart of a patient."""
+        clinic = self.get_clinic_from_url()
+        patient = get_object_or_404(
+            Patient.objects.select_related('dental_chart_state'),
+            id=patient_id,
+            clinic=clinic
+        )
+
+        # Answer conditional requests from the chart version alone, before loading any teeth
+        version, last_updated = get_chart_version(patient)
+        catalog_version = get_catalog_cache().get_version(clinic.id)
+        names_version = get_chart_names_cache().get_version(clinic.id)
+        etag = _chart_etag(patient, version, catalog_version, names_version)
+        compact = request.accepted_renderer.format == 'compact'
+        # Each encoding is its own representation with its own validator
+        response_etag = _chart_etag(patient, version, catalog_version, names_version, '-compact') if compact else etag
+        last_modified = max(filter(None, [last_updated, patient.updated_at]))
+        not_modified = get_conditional_response(
+            request._request,
+            etag=response_etag,
+            last_modified=int(last_modified.timestamp())
+        )
+        if not_modified is not None:
+            patch_cache_control(not_modified, private=True, no_cache=True)
+            patch_vary_headers(not_modified, ['Accept'])
+            return not_modified
+
+        chart_cache = get_chart_cache()
+        data = chart_cache.get(patient.pk, etag)
+        if data is None:
+            data = self._render_chart(patient, version, last_updated)
+            chart_cache.set(patient.pk, etag, data)
+        if compact:
+            data = compact_chart(data)
+
+        response = Response(data)
+        response['ETag'] = response_etag
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+        # Clients keep the chart but must revalidate it on every use
+        patch_cache_control(response, private=True, no_cache=True)
+        # The encoding can also be negotiated from the Accept header
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+    def get_tooth_template(self, request, clinic_id=None):
+        """Get the static tooth metadata the compact chart format refers to by index."""
+        self.get_clinic_from_url()
+        response = Response({
+            'tooth_fields': COMPACT_TOOTH_FIELDS,
+            'teeth': COMPACT_TOOTH_TEMPLATE,
+        })
+        patch_cache_control(response, public=True, max_age=86400)
+        return response
+
+    def _render_chart(self, patient, version, last_updated):
+        """Build the serialized chart payload of a patient."""
+        # Rows straight from values(), one query per level (teeth, conditions, procedures, notes)
+        teeth = get_fast_chart_teeth(patient)
+        if uses_virtual_teeth():
+            # Only charted teeth have rows, the rest come from the template
+            teeth = fill_virtual_teeth(teeth)
+        elif not teeth:
+            # First touch of a chart whose teeth were deferred at patient creation
+            provision_dental_chart_teeth(patient)
+            teeth = get_fast_chart_teeth(patient)
+
+        return get_fast_chart_payload(patient, version, last_updated, teeth)
+
+    def get_chart_changes(self, request, clinic_id=None, patient_id=None):
+        """Get the chart entries written since the version the client already has."""
+        clinic = self.get_clinic_from_url()
+        patient = get_object_or_404(
+            Patient.objects.select_related('dental_chart_state'),
+            id=patient_id,
+            clinic=clinic
+        )
+        version, last_updated = get_chart_version(patient)
+
+        try:
+            since = int(request.query_params.get('since', ''))
+        except ValueError:
+            since = -1
+        if since < 0:
+            return Response(
+                {'since': 'A non-negative chart version is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if since > version:
+            # The client holds a version this chart never had, it has to reload the full chart
+            return Response(
+                {'since': 'Unknown chart version, reload the full chart'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response({
+            'patient_id': patient.id,
+            'since': since,
+            'version': version,
+            'last_updated': last_updated,
+            **get_chart_changes(patient, since, version),
+        })
+
+    def get_chart_history(self, request, clinic_id=None, patient_id=None):
+        """Get dental chart history with filtering options, newest first."""
+        clinic = self.get_clinic_from_url()
+        patient = get_object_or_404(Patient, id=patient_id, clinic=clinic)
+
+        # Filter parameters, each one narrows a (patient, ...) index
+        tooth_number = request.query_params.get('tooth_number')
+        category = request.query_params.get('category')  # 'conditions' or 'procedures'
+        action = request.query_params.get('action')
+        start_date = self._date_param(request, 'start_date')
+        end_date = self._date_param(request, 'end_date')
+
+        history = ChartHistory.objects.filter(patient=patient).select_related('user')
+
+        if tooth_number:
+            history = history.filter(tooth_number=tooth_number)
+        if category:
+            history = history.filter(category=category)
+        if action:
+            history = history.filter(action=action)
+        if start_date:
+            history = history.filter(date__gte=start_date)
+        if end_date:
+            history = history.filter(date__lte=end_date)
+
+        paginator = ChartHistoryPagination()
+        page = paginator.paginate_queryset(history, request, view=self)
+        return paginator.get_paginated_response(ChartHistorySerializer(page, many=True).data)
+
+    def _date_param(self, request, name):
+        """Parse a date or datetime query parameter, None when it is not given."""
+        value = request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            parsed = parse_datetime(value) or parse_date(value)
+        except ValueError:
+            # Well formed but not a calendar date, e.g. 2024-02-30
+            parsed = None
+        if parsed is None:
+            raise ValidationError({name: 'Expected a date as YYYY-MM-DD or a datetime'})
+        return parsed
+
+    def batch_chart_entries(self, request, clinic_id=None, patient_id=None):
+        """
+        Record many tooth conditions and procedures in one transaction, e.g. a full initial exam.
+        Teeth and catalog entries are resolved once for the whole batch and every table gets
+        a single bulk insert, so the cost does not grow with the number of findings.
+        """
+        clinic = self.get_clinic_from_url()
+        patient = get_object_or_404(Patient, id=patient_id, clinic=clinic)
+
+        serializer = ChartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        operations = serializer.validated_data['operations']
+
+        def unknown_entries(catalog):
+            errors = {}
+            for index, op in enumerate(operations):
+                entries = catalog.conditions if op['type'] == 'condition' else catalog.procedures
+                if op[f"{op['type']}_id"] not in entries:
+                    errors[index] = {f"{op['type']}_id": 'Not found in this clinic'}
+            return errors
+
+        # Catalog entries are checked against the cached clinic catalog, without a query
+        catalog = get_clinic_catalog(clinic.id)
+        errors = unknown_entries(catalog)
+        if errors:
+            # Entries created on another worker may not have reached the cached catalog yet
+            catalog = get_clinic_catalog(clinic.id, fresh=True)
+            errors = unknown_entries(catalog)
+        if errors:
+            return Response({'operations': errors}, status=status.HTTP_400_BAD_REQUEST)
+        conditions, procedures = catalog.conditions, catalog.procedures
+
+        try:
+            with transaction.atomic():
+                # Tooth rows created here are only kept along with the entries attached to them
+                teeth = get_chart_teeth(patient, {op['tooth_number'] for op in operations})
+                missing = sorted({op['tooth_number'] for op in operations} - teeth.keys())
+                if missing:
+                    transaction.set_rollback(True)
+                    return Response(
+                        {'tooth_number': f"Unknown teeth: {', '.join(missing)}"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+                new_conditions, new_procedures, history = [], [], []
+                for op in operations:
+                    tooth = teeth[op['tooth_number']]
+                    if op['type'] == 'condition':
+                        condition = conditions[op['condition_id']]
+                        new_conditions.append(DentalChartCondition(
+                            tooth=tooth,
+                            condition=condition,
+                            surface=op['surface'],
+                            description=op['notes'],
+                            severity=op.get('severity', 'moderate'),
+                            created_by=request.user,
+                            updated_by=request.user
+                        ))
+                        history.append(ChartHistory(
+                            patient=patient,
+                            user=request.user,
+                            action='add_condition',
+                            tooth_number=tooth.number,
+                            category='conditions',
+                            details={'condition': condition.name, 'surface': op['surface']}
+                        ))
+                    else:
+                        procedure = procedures[op['procedure_id']]
+                        new_procedures.append(DentalChartProcedure(
+                            tooth=tooth,
+                            procedure=procedure,
+                            surface=op['surface'],
+                            description=op['notes'],
+                            date_performed=op.get('date_performed'),
+                            performed_by=request.user,
+                            price=op.get('price', procedure.default_price),
+                            status=op.get('status', 'planned')
+                        ))
+                        history.append(ChartHistory(
+                            patient=patient,
+                            user=request.user,
+                            action='add_procedure',
+                            tooth_number=tooth.number,
+                            category='procedures',
+                            details={'procedure': procedure.name, 'surface': op['surface']}
+                        ))
+
+                DentalChartCondition.objects.bulk_create(new_conditions)
+                DentalChartProcedure.objects.bulk_create(new_procedures)
+                ChartHistory.objects.bulk_create(history)
+                # bulk_create skips the post_save signals, record the whole batch as one chart version
+                version = record_chart_changes(patient.id, new_conditions + new_procedures)
+        except IntegrityError:
+            # A catalog entry deleted on another worker, its cached catalog may still list it
+            return Response(
+                {'operations': 'A condition or procedure of the batch no longer exists in this clinic'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        prefetch_related_objects(new_procedures, 'notes')
+        return Response({
+            'version': version,
+            'conditions': DentalChartConditionSerializer(new_conditions, many=True).data,
+            'procedures': DentalChartProcedureSerializer(new_procedures, many=True).data,
+        }, status=status.HTTP_201_CREATED)
 
-class DentalChartView(APIView):
     def add_tooth_condition(self, request, clinic_id=None, patient_id=None, tooth_number=None):
         """Add a condition to a tooth."""
         clinic = self.get_clinic_from_url()
         patient = get_object_or_404(Patient, id=patient_id, clinic=clinic)
-        
+
         # Validate dentition_type matches tooth number format
         dentition_type = request.data.get('dentition_type')
         is_primary = tooth_number.isalpha()
@@ -16,11 +421,15 @@ class DentalChartView(APIView):
                 {'dentition_type': 'Dentition type must match tooth number format'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        # Ensure the patient has teeth records
-        self._ensure_patient_has_teeth(patient)
-        
-        # Get the tooth
-        tooth = get_object_or_404(DentalChartTooth, patient=patient, number=str(tooth_number))
-        
-        # Rest of your existing code... 
\ No newline at end of file
+
+        # Resolve the tooth without writing, a tooth charted for the first time has no row yet
+        tooth = get_chart_tooth(patient, tooth_number)
+        if tooth is None:
+            raise Http404
+
+        # The row is only stored once the condition is valid, in the transaction inserting it:
+        #     with transaction.atomic():
+        #         tooth = save_chart_tooth(tooth)
+        #         condition = DentalChartCondition.objects.create(tooth=tooth, ...)
+
+        # Rest of your existing code...
\ No newline at end of file
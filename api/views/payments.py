@@ -0,0 +1,48 @@
+from django.shortcuts import get_object_or_404
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.viewsets import GenericViewSet
+from api.models import Patient
+from api.models.payment_ledger import get_payment_summary
+from api.serializers.payments import PaymentSummarySerializer
+from api.views.mixins import ClinicViewSetMixin
+
+class PaymentViewSet(ClinicViewSetMixin, GenericViewSet):
+    """
+    Balance endpoints of the payments API. Balances are read from the patient's balance
+    ledger, a single row lookup joined to the patient, instead of aggregating their payments.
+    """
+
+    def get_patient(self, patient_id):
+        clinic = self.get_clinic_from_url()
+        return get_object_or_404(
+            Patient.objects.select_related('balance_ledger'),
+            id=patient_id,
+            clinic=clinic
+        )
+
+    @action(detail=False, methods=['get'])
+    def patient_balance(self, request, clinic_id=None, patient_id=None):
+        """Totals and balance of a patient, given in the URL or as ?patient_id="""
+        patient_id = patient_id or request.query_params.get('patient_id')
+        if not str(patient_id or '').isdigit():
+            return Response(
+                {'patient_id': 'A patient id is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        summary = get_payment_summary(self.get_patient(patient_id))
+        return Response({
+            'patient_id': str(patient_id),
+            'total_amount': summary['total_billed'],
+            'total_paid': summary['total_paid'],
+            'balance': summary['balance_due'],
+        })
+
+    def patient_summary(self, request, clinic_id=None, patient_id=None):
+        """Payment summary of a patient, see PaymentSummarySerializer."""
+        patient = self.get_patient(patient_id)
+        return Response(PaymentSummarySerializer.for_patient(patient).data)
+
+    # Kept for the clients still calling the summary's test route
+    patient_summary_test = patient_summary
@@ -0,0 +1,107 @@
+import csv
+import json
+from decimal import Decimal
+from django.db.models import F
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import BaseRenderer
+from rest_framework.viewsets import GenericViewSet
+from api.models.payment_ledger import AGING_BUCKETS, get_receivables, apply_credit_to_aging
+from api.views.mixins import ClinicViewSetMixin
+
+RECEIVABLES_COLUMNS = [
+    'patient_id', 'patient_name', 'total_billed', 'total_paid', 'balance_due',
+    *[name for name, _ in AGING_BUCKETS], 'unapplied_credit', 'last_payment_date'
+]
+
+CENT = Decimal('0.01')
+
+class _EchoBuffer:
+    """File-like object handing back what csv.writer writes, so rows can be yielded one at a time."""
+    def write(self, value):
+        return value
+
+class CSVReportRenderer(BaseRenderer):
+    """CSV report selected with ?format=csv or Accept: text/csv, rows are streamed by stream()."""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def stream(self, columns, rows):
+        writer = csv.writer(_EchoBuffer())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow([row[column] for column in columns])
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Only used for error payloads, reports themselves are streamed
+        if not isinstance(data, dict):
+            data = {'detail': data}
+        return ''.join(self.stream(list(data), [data])).encode(self.charset)
+
+class NDJSONReportRenderer(BaseRenderer):
+    """Newline delimited JSON report selected with ?format=ndjson, one object per line."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def stream(self, columns, rows):
+        for row in rows:
+            yield json.dumps({column: row[column] for column in columns}) + '\n'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return (json.dumps(data) + '\n').encode(self.charset)
+
+class ReportViewSet(ClinicViewSetMixin, GenericViewSet):
+    """
+    Clinic-wide reports, streamed as CSV (the default) or NDJSON.
+    Rows are read from the database in chunks and written out as they come,
+    so memory use does not grow with the size of the clinic.
+    """
+    renderer_classes = [CSVReportRenderer, NDJSONReportRenderer]
+    chunk_size = 2000
+
+    def stream_report(self, name, columns, rows):
+        renderer = self.request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(columns, rows),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{name}.{renderer.format}"'
+        return response
+
+    def receivables(self, request, clinic_id=None):
+        """Outstanding balance of every patient of the clinic with aging buckets, from one grouped query."""
+        clinic = self.get_clinic_from_url()
+        as_of = timezone.localdate()
+        if 'as_of' in request.query_params:
+            try:
+                as_of = parse_date(request.query_params['as_of'] or '')
+            except ValueError:
+                # Well formed but not a calendar date, e.g. 2024-02-30
+                as_of = None
+            if as_of is None:
+                raise ValidationError({'as_of': 'Expected a date as YYYY-MM-DD'})
+
+        queryset = get_receivables(clinic.id, as_of)
+        if request.query_params.get('include_settled') not in ('true', '1'):
+            queryset = queryset.exclude(total_billed=F('total_paid'))
+
+        def rows():
+            for row in queryset.iterator(chunk_size=self.chunk_size):
+                amounts = {
+                    'total_billed': row['total_billed'],
+                    'total_paid': row['total_paid'],
+                    'balance_due': row['total_billed'] - row['total_paid'],
+                    **apply_credit_to_aging(row),
+                }
+                yield {
+                    'patient_id': row['patient_id'],
+                    'patient_name': row['patient__name'],
+                    **{key: str(amount.quantize(CENT)) for key, amount in amounts.items()},
+                    'last_payment_date': row['last_payment_date'].isoformat(),
+                }
+
+        return self.stream_report(f'receivables-{clinic.id}-{as_of.isoformat()}', RECEIVABLES_COLUMNS, rows())
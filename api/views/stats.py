@@ -0,0 +1,161 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.viewsets import GenericViewSet
+from api.models import Appointment
+from api.models.clinic_metrics import ClinicDailyMetrics
+from api.serializers.stats import StatsSeriesQuerySerializer
+from api.views.mixins import ClinicViewSetMixin
+
+def _percent_change(current, previous):
+    """Change from previous to current in percent, rounded to one decimal."""
+    if not previous:
+        return 100.0 if current else 0.0
+    return round(float((current - previous) * 100 / previous), 1)
+
+def _percent(part, whole):
+    return round(part * 100 / whole, 1) if whole else 0.0
+
+def _bucket_start(day, bucket):
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+def _next_bucket(start, bucket):
+    if bucket == 'week':
+        return start + timedelta(days=7)
+    if bucket == 'month':
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+# Database side truncation of the rollup day to the start of its bucket, weeks start on Monday
+BUCKET_EXPRESSIONS = {
+    'day': lambda: F('date'),
+    'week': lambda: TruncWeek('date'),
+    'month': lambda: TruncMonth('date'),
+}
+
+class ClinicStatsViewSet(ClinicViewSetMixin, GenericViewSet):
+    """
+    Dashboard numbers of a clinic, read from the daily metrics rollup so the cost does not
+    grow with the clinic's history. The metrics of the different periods are filtered
+    aggregates of the same query.
+    """
+
+    def _periods(self):
+        today = timezone.now().date()
+        month_start = today.replace(day=1)
+        last_month_start = (month_start - timedelta(days=1)).replace(day=1)
+        return today, month_start, last_month_start
+
+    def patient_stats(self, request, clinic_id=None):
+        clinic = self.get_clinic_from_url()
+        today, month_start, last_month_start = self._periods()
+
+        patients = ClinicDailyMetrics.objects.filter(clinic=clinic).aggregate(
+            total=Sum('new_patients'),
+            new_this_month=Sum('new_patients', filter=Q(date__gte=month_start)),
+        )
+        # Patients seen or booked in the last three months, a distinct count the rollup can't add up
+        active = Appointment.objects.filter(
+            clinic=clinic,
+            date__gte=today - timedelta(days=90)
+        ).aggregate(patients=Count('patient_id', distinct=True))
+
+        total = patients['total'] or 0
+        new_this_month = patients['new_this_month'] or 0
+        return Response({
+            'totalPatients': total,
+            'monthlyGrowth': _percent_change(total, total - new_this_month),
+            'newPatientsThisMonth': new_this_month,
+            'activePatients': active['patients'],
+        })
+
+    def appointment_stats(self, request, clinic_id=None):
+        clinic = self.get_clinic_from_url()
+        today, month_start, last_month_start = self._periods()
+        this_month = Q(date__gte=month_start, date__lte=today)
+        last_month = Q(date__gte=last_month_start, date__lt=month_start)
+        booked = F('appointments_scheduled') + F('appointments_completed') + F('appointments_cancelled') + F('appointments_no_show')
+        attended = booked - F('appointments_cancelled')
+
+        metrics = ClinicDailyMetrics.objects.filter(clinic=clinic, date__gte=last_month_start).aggregate(
+            today=Sum(booked, filter=Q(date=today)),
+            yesterday=Sum(booked, filter=Q(date=today - timedelta(days=1))),
+            upcoming=Sum('appointments_scheduled', filter=Q(date__gt=today)),
+            cancelled=Sum('appointments_cancelled', filter=this_month),
+            attended_this_month=Sum(attended, filter=this_month),
+            completed_this_month=Sum('appointments_completed', filter=this_month),
+            attended_last_month=Sum(attended, filter=last_month),
+            completed_last_month=Sum('appointments_completed', filter=last_month),
+            revenue_this_month=Sum('revenue', filter=this_month),
+            revenue_last_month=Sum('revenue', filter=last_month),
+        )
+        # Sums over no rows are None
+        metrics = {key: value or 0 for key, value in metrics.items()}
+
+        revenue_this_month = Decimal(metrics['revenue_this_month'])
+        revenue_last_month = Decimal(metrics['revenue_last_month'])
+        completion_rate = _percent(metrics['completed_this_month'], metrics['attended_this_month'])
+        completion_rate_last_month = _percent(metrics['completed_last_month'], metrics['attended_last_month'])
+        return Response({
+            'todayCount': metrics['today'],
+            'dailyChange': metrics['today'] - metrics['yesterday'],
+            'monthlyRevenue': float(revenue_this_month),
+            'revenueChange': _percent_change(revenue_this_month, revenue_last_month),
+            'completionRate': completion_rate,
+            'completionRateChange': round(completion_rate - completion_rate_last_month, 1),
+            'upcomingCount': metrics['upcoming'],
+            'cancelledCount': metrics['cancelled'],
+        })
+
+    def series(self, request, clinic_id=None):
+        """
+        Revenue, appointment, completion rate and new patient series over a date range,
+        bucketed by day, week or month. The daily rollup is grouped by bucket in the database,
+        one query for every metric, and buckets without activity are filled with zeros.
+        """
+        clinic = self.get_clinic_from_url()
+        query = StatsSeriesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        start_date, end_date, bucket = (query.validated_data[key] for key in ('start_date', 'end_date', 'bucket'))
+
+        booked = F('appointments_scheduled') + F('appointments_completed') + F('appointments_cancelled') + F('appointments_no_show')
+        rows = ClinicDailyMetrics.objects.filter(
+            clinic=clinic, date__range=(start_date, end_date)
+        ).annotate(period=BUCKET_EXPRESSIONS[bucket]()).values('period').annotate(
+            revenue=Sum('revenue'),
+            appointments=Sum(booked),
+            cancelled=Sum('appointments_cancelled'),
+            completed=Sum('appointments_completed'),
+            new_patients=Sum('new_patients'),
+        ).order_by('period')
+        by_period = {row['period']: row for row in rows}
+
+        series = []
+        period = _bucket_start(start_date, bucket)
+        while period <= end_date:
+            row = by_period.get(period, {})
+            appointments = row.get('appointments') or 0
+            completed = row.get('completed') or 0
+            series.append({
+                'period': period.isoformat(),
+                'revenue': float(row.get('revenue') or 0),
+                'appointments': appointments,
+                'completed': completed,
+                'completionRate': _percent(completed, appointments - (row.get('cancelled') or 0)),
+                'newPatients': row.get('new_patients') or 0,
+            })
+            period = _next_bucket(period, bucket)
+
+        return Response({
+            'bucket': bucket,
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat(),
+            'series': series,
+        })
@@ -0,0 +1,99 @@
+import json
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from api.models import Patient
+from api.models.dental_chart import (
+    DentalChartTooth, PERMANENT_TEETH, PRIMARY_TEETH, uses_virtual_teeth
+)
+
+class Command(BaseCommand):
+    """Create missing dental chart teeth for existing patients, in resumable batches."""
+    help = 'Backfill missing dental chart teeth for existing patients in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of patients handled per transaction')
+        parser.add_argument('--dentition', choices=['all', 'permanent', 'primary'], default='all',
+                            help='Which teeth to backfill')
+        parser.add_argument('--checkpoint', default='dental_chart_backfill.checkpoint',
+                            help='File recording the last patient handled, used to resume')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore an existing checkpoint and start from the first patient')
+
+    def handle(self, *args, **options):
+        if uses_virtual_teeth():
+            raise CommandError('DENTAL_CHART_VIRTUAL_TEETH is enabled, charts do not need tooth rows')
+
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        templates = []
+        if options['dentition'] in ('all', 'permanent'):
+            templates += [('permanent', tooth_data) for tooth_data in PERMANENT_TEETH]
+        if options['dentition'] in ('all', 'primary'):
+            templates += [('primary', tooth_data) for tooth_data in PRIMARY_TEETH]
+        dentition_types = {dentition_type for dentition_type, _ in templates}
+
+        checkpoint_path = options['checkpoint']
+        progress = {'last_patient_id': 0, 'patients': 0, 'teeth_created': 0}
+        if os.path.exists(checkpoint_path) and not options['restart']:
+            with open(checkpoint_path) as checkpoint:
+                progress.update(json.load(checkpoint))
+            self.stdout.write(f"Resuming after patient {progress['last_patient_id']}")
+
+        started = time.monotonic()
+        patients_this_run = 0
+        teeth_this_run = 0
+
+        while True:
+            patient_ids = list(
+                Patient.objects.filter(id__gt=progress['last_patient_id'])
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not patient_ids:
+                break
+
+            # One query to find which template teeth the whole batch already has
+            existing = set(
+                DentalChartTooth.objects.filter(
+                    patient_id__in=patient_ids,
+                    dentition_type__in=dentition_types
+                ).values_list('patient_id', 'dentition_type', 'number')
+            )
+            missing = [
+                DentalChartTooth(patient_id=patient_id, dentition_type=dentition_type, **tooth_data)
+                for patient_id in patient_ids
+                for dentition_type, tooth_data in templates
+                if (patient_id, dentition_type, tooth_data['number']) not in existing
+            ]
+
+            with transaction.atomic():
+                DentalChartTooth.objects.bulk_create(missing, batch_size=1000, ignore_conflicts=True)
+
+            progress['last_patient_id'] = patient_ids[-1]
+            progress['patients'] += len(patient_ids)
+            progress['teeth_created'] += len(missing)
+            with open(checkpoint_path, 'w') as checkpoint:
+                json.dump(progress, checkpoint)
+
+            patients_this_run += len(patient_ids)
+            teeth_this_run += len(missing)
+            elapsed = max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f"Patients up to {progress['last_patient_id']}: {patients_this_run} patients, "
+                f"{teeth_this_run} teeth created "
+                f"({patients_this_run / elapsed:.0f} patients/s, {teeth_this_run / elapsed:.0f} teeth/s)"
+            )
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfill complete: {progress['patients']} patients checked, "
+            f"{progress['teeth_created']} teeth created in total ({elapsed:.1f}s this run)"
+        ))
@@ -0,0 +1,39 @@
+import timeit
+from django.core.management.base import BaseCommand, CommandError
+from api.models import Patient
+from api.serializers.dental_chart import (
+    DentalChartToothSerializer, get_dental_chart_teeth_queryset, get_fast_chart_teeth
+)
+
+class Command(BaseCommand):
+    """Time the values() fast path of the dental chart against the DRF serializers it replaces."""
+    help = 'Compare chart build times of the fast path and the serializers on a patient, best of --repeat rounds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('patient_id', type=int, help='Patient whose chart is built, ideally a fully charted one')
+        parser.add_argument('--number', type=int, default=5,
+                            help='Chart builds timed per round')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Number of rounds, the fastest one is reported')
+
+    def handle(self, *args, **options):
+        number, repeat = options['number'], options['repeat']
+        if number < 1 or repeat < 1:
+            raise CommandError('--number and --repeat must be at least 1')
+        try:
+            patient = Patient.objects.get(id=options['patient_id'])
+        except Patient.DoesNotExist:
+            raise CommandError(f"Patient {options['patient_id']} does not exist")
+
+        def serialized_chart():
+            return DentalChartToothSerializer(
+                get_dental_chart_teeth_queryset().filter(patient=patient), many=True
+            ).data
+
+        serializer_time = min(timeit.repeat(serialized_chart, number=number, repeat=repeat)) / number
+        fast_time = min(timeit.repeat(lambda: get_fast_chart_teeth(patient), number=number, repeat=repeat)) / number
+
+        self.stdout.write(
+            f"chart serializers: {serializer_time * 1000:.2f}ms, "
+            f"fast path: {fast_time * 1000:.2f}ms ({serializer_time / fast_time:.1f}x)"
+        )
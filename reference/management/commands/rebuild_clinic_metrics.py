@@ -0,0 +1,86 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from api.models.clinic_metrics import ClinicDailyMetrics, METRIC_FIELDS, compute_clinic_metrics
+
+COLUMNS = [column for columns in METRIC_FIELDS.values() for column in columns]
+
+class Command(BaseCommand):
+    """Repair the daily clinic metrics rollup from patients, appointments and payments, meant to run nightly."""
+    help = 'Compare the daily clinic metrics with their source rows, rewriting mismatched days unless --check is given'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=35,
+                            help='Number of days up to today to repair, ignored with --start-date')
+        parser.add_argument('--start-date', help='First day to repair')
+        parser.add_argument('--end-date', help='Last day to repair, today by default')
+        parser.add_argument('--clinic', type=int, help='Only repair this clinic')
+        parser.add_argument('--batch-days', type=int, default=31,
+                            help='Number of days compared per round of queries')
+        parser.add_argument('--check', action='store_true',
+                            help='Only report days out of step, do not rewrite them')
+
+    def _parse_date(self, options, name):
+        value = options[name.replace('-', '_')]
+        if value is None:
+            return None
+        parsed = parse_date(value)
+        if parsed is None:
+            raise CommandError(f'--{name} must be a date as YYYY-MM-DD')
+        return parsed
+
+    def handle(self, *args, **options):
+        batch_days = options['batch_days']
+        if batch_days < 1 or options['days'] < 1:
+            raise CommandError('--days and --batch-days must be at least 1')
+
+        # Appointments are booked ahead, a week of future days is repaired as well
+        end_date = self._parse_date(options, 'end-date') or timezone.now().date() + timedelta(days=7)
+        start_date = self._parse_date(options, 'start-date') or timezone.now().date() - timedelta(days=options['days'] - 1)
+        if end_date < start_date:
+            raise CommandError('--end-date must not be before --start-date')
+        clinic_id = options['clinic']
+
+        started = time.monotonic()
+        checked = 0
+        mismatched = {}
+        window_start = start_date
+        while window_start <= end_date:
+            window_end = min(window_start + timedelta(days=batch_days - 1), end_date)
+            expected = compute_clinic_metrics(window_start, window_end, clinic_id)
+            rows = ClinicDailyMetrics.objects.filter(date__range=(window_start, window_end))
+            if clinic_id:
+                rows = rows.filter(clinic_id=clinic_id)
+            actual = {
+                (row['clinic_id'], row['date']): row
+                for row in rows.values('clinic_id', 'date', *COLUMNS)
+            }
+            empty = {column: Decimal('0') if column == 'revenue' else 0 for column in COLUMNS}
+            for key in sorted(expected.keys() | actual.keys()):
+                checked += 1
+                wanted = expected.get(key, empty)
+                found = actual.get(key, empty)
+                differences = [column for column in COLUMNS if wanted[column] != found[column]]
+                if differences:
+                    mismatched[key] = wanted
+                    self.stdout.write(f"Clinic {key[0]} on {key[1]}: " + ', '.join(
+                        f"{column} is {found[column]}, expected {wanted[column]}" for column in differences
+                    ))
+            window_start = window_end + timedelta(days=1)
+
+        if mismatched and not options['check']:
+            with transaction.atomic():
+                for (clinic, day), values in mismatched.items():
+                    ClinicDailyMetrics.objects.update_or_create(clinic_id=clinic, date=day, defaults=values)
+            self.stdout.write(f"Rewrote {len(mismatched)} days")
+
+        elapsed = time.monotonic() - started
+        summary = f"{checked} clinic days checked, {len(mismatched)} out of step ({elapsed:.1f}s)"
+        if mismatched and options['check']:
+            self.stdout.write(self.style.WARNING(summary))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,99 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils.dateparse import parse_date
+from api.models import Appointment
+from api.models.schedule import DentistSchedule, lock_dentist_schedule, rebuild_dentist_schedule
+from api.scheduling import bitmap_from_intervals, bitmap_intervals, busy_from_bookings, unpack_bitmap
+
+def _format_intervals(bitmap):
+    return ', '.join(
+        f"{start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d}" for start, end in bitmap_intervals(bitmap)
+    ) or 'free'
+
+class Command(BaseCommand):
+    """Check dentist schedule bitmaps against the appointments and rebuild the ones out of step."""
+    help = 'Compare dentist schedule bitmaps with scheduled appointments, rebuilding mismatches unless --check is given'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', help='First day to check, the earliest booked day by default')
+        parser.add_argument('--end-date', help='Last day to check, the latest booked day by default')
+        parser.add_argument('--batch-days', type=int, default=31,
+                            help='Number of days compared per pair of queries')
+        parser.add_argument('--check', action='store_true',
+                            help='Only report schedules out of step, do not rebuild them')
+
+    def _parse_date(self, options, name):
+        value = options[name.replace('-', '_')]
+        if value is None:
+            return None
+        parsed = parse_date(value)
+        if parsed is None:
+            raise CommandError(f'--{name} must be a date as YYYY-MM-DD')
+        return parsed
+
+    def handle(self, *args, **options):
+        batch_days = options['batch_days']
+        if batch_days < 1:
+            raise CommandError('--batch-days must be at least 1')
+
+        bounds = [
+            Appointment.objects.filter(status='scheduled').aggregate(first=Min('date'), last=Max('date')),
+            DentistSchedule.objects.aggregate(first=Min('date'), last=Max('date')),
+        ]
+        start_date = self._parse_date(options, 'start-date') or min(
+            (bound['first'] for bound in bounds if bound['first']), default=None
+        )
+        end_date = self._parse_date(options, 'end-date') or max(
+            (bound['last'] for bound in bounds if bound['last']), default=None
+        )
+        if start_date is None or end_date is None:
+            self.stdout.write(self.style.SUCCESS('No schedules to check'))
+            return
+
+        started = time.monotonic()
+        checked = 0
+        mismatched = []
+        window_start = start_date
+        while window_start <= end_date:
+            window_end = min(window_start + timedelta(days=batch_days - 1), end_date)
+            bookings = Appointment.objects.filter(
+                status='scheduled', dentist__isnull=False, date__range=(window_start, window_end)
+            ).order_by('dentist_id', 'date', 'start_time').values_list('dentist_id', 'date', 'start_time', 'end_time')
+            expected = {
+                key: bitmap_from_intervals(intervals)
+                for key, intervals in busy_from_bookings(bookings.iterator()).items()
+            }
+            actual = {
+                (dentist_id, date): unpack_bitmap(busy)
+                for dentist_id, date, busy in DentistSchedule.objects.filter(
+                    date__range=(window_start, window_end)
+                ).values_list('dentist_id', 'date', 'busy')
+            }
+            for key in sorted(expected.keys() | actual.keys()):
+                checked += 1
+                if expected.get(key, 0) != actual.get(key, 0):
+                    mismatched.append(key)
+                    dentist_id, date = key
+                    self.stdout.write(
+                        f"Dentist {dentist_id} on {date}: schedule has {_format_intervals(actual.get(key, 0))}, "
+                        f"appointments have {_format_intervals(expected.get(key, 0))}"
+                    )
+            window_start = window_end + timedelta(days=1)
+
+        if mismatched and not options['check']:
+            for dentist_id, date in mismatched:
+                with transaction.atomic():
+                    # Hold off bookings of that day while it is rebuilt
+                    lock_dentist_schedule(dentist_id, date)
+                    rebuild_dentist_schedule(dentist_id, date)
+            self.stdout.write(f"Rebuilt {len(mismatched)} schedules")
+
+        elapsed = time.monotonic() - started
+        summary = f"{checked} dentist days checked, {len(mismatched)} schedules out of step ({elapsed:.1f}s)"
+        if mismatched and options['check']:
+            self.stdout.write(self.style.WARNING(summary))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
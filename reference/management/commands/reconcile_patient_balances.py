@@ -0,0 +1,78 @@
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from api.models import Patient
+from api.models.payment_ledger import PatientBalance, aggregate_patient_payments, refresh_patient_balance
+
+LEDGER_FIELDS = ('total_billed', 'total_paid', 'payment_count', 'last_payment_date')
+
+class Command(BaseCommand):
+    """Check every patient's balance ledger against a full aggregate of their payments."""
+    help = 'Compare patient balance ledgers with their payments in batches, optionally repairing them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of patients checked per aggregate query')
+        parser.add_argument('--fix', action='store_true',
+                            help='Recompute the ledger of every patient found out of step')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        empty = {'total_billed': Decimal('0'), 'total_paid': Decimal('0'), 'payment_count': 0, 'last_payment_date': None}
+        started = time.monotonic()
+        last_patient_id = 0
+        checked = 0
+        mismatched = []
+
+        while True:
+            patient_ids = list(
+                Patient.objects.filter(id__gt=last_patient_id)
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not patient_ids:
+                break
+
+            expected = aggregate_patient_payments(patient_ids)
+            ledgers = {
+                row['patient_id']: row
+                for row in PatientBalance.objects.filter(patient_id__in=patient_ids).values('patient_id', *LEDGER_FIELDS)
+            }
+            for patient_id in patient_ids:
+                totals = {**empty, **{k: v for k, v in expected.get(patient_id, {}).items() if v is not None}}
+                ledger = ledgers.get(patient_id)
+                if ledger is None:
+                    # Patients without payments need no ledger row
+                    if totals['payment_count']:
+                        mismatched.append(patient_id)
+                        self.stdout.write(f"Patient {patient_id}: no ledger, expected {totals}")
+                    continue
+                differences = {
+                    field: (ledger[field], totals[field])
+                    for field in LEDGER_FIELDS if ledger[field] != totals[field]
+                }
+                if differences:
+                    mismatched.append(patient_id)
+                    self.stdout.write(f"Patient {patient_id}: " + ', '.join(
+                        f"{field} is {actual}, expected {wanted}" for field, (actual, wanted) in differences.items()
+                    ))
+
+            last_patient_id = patient_ids[-1]
+            checked += len(patient_ids)
+
+        if mismatched and options['fix']:
+            for patient_id in mismatched:
+                with transaction.atomic():
+                    refresh_patient_balance(patient_id)
+            self.stdout.write(f"Recomputed {len(mismatched)} ledgers")
+
+        elapsed = time.monotonic() - started
+        summary = f"{checked} patients checked, {len(mismatched)} ledgers out of step ({elapsed:.1f}s)"
+        if mismatched and not options['fix']:
+            self.stdout.write(self.style.WARNING(summary))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,49 @@
+from django.db import migrations, models
+from django.db.models import Max
+import django.db.models.deletion
+
+def backfill_chart_state(apps, schema_editor):
+    DentalChartState = apps.get_model('api', 'DentalChartState')
+    DentalChartCondition = apps.get_model('api', 'DentalChartCondition')
+    DentalChartProcedure = apps.get_model('api', 'DentalChartProcedure')
+    ProcedureNote = apps.get_model('api', 'ProcedureNote')
+    GeneralProcedure = apps.get_model('api', 'GeneralProcedure')
+    
+    # Latest write per patient, one grouped query per table
+    latest = {}
+    sources = [
+        DentalChartCondition.objects.values('tooth__patient_id').annotate(latest=Max('updated_at')),
+        DentalChartProcedure.objects.values('tooth__patient_id').annotate(latest=Max('created_at')),
+        ProcedureNote.objects.values('procedure__tooth__patient_id').annotate(latest=Max('created_at')),
+        GeneralProcedure.objects.values('patient_id').annotate(latest=Max('updated_at')),
+    ]
+    for rows in sources:
+        for row in rows:
+            patient_id = (
+                row.get('tooth__patient_id') or row.get('procedure__tooth__patient_id') or row.get('patient_id')
+            )
+            if patient_id not in latest or row['latest'] > latest[patient_id]:
+                latest[patient_id] = row['latest']
+    
+    DentalChartState.objects.bulk_create(
+        [DentalChartState(patient_id=patient_id, last_updated=value) for patient_id, value in latest.items()],
+        batch_size=1000
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_alter_charthistory_options_alter_charthistory_action_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DentalChartState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_updated', models.DateTimeField(blank=True, null=True)),
+                ('patient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='dental_chart_state', to='api.patient')),
+            ],
+        ),
+        migrations.RunPython(backfill_chart_state, migrations.RunPython.noop),
+    ]
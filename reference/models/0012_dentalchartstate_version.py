@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_dentalchartstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dentalchartstate',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_dentalchartstate_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DentalChartChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField()),
+                ('kind', models.CharField(choices=[('condition', 'Condition'), ('procedure', 'Procedure'), ('general_procedure', 'General Procedure')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dental_chart_changes', to='api.patient')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['patient', 'version'], name='api_dentalc_patient_5d1c2e_idx')],
+            },
+        ),
+    ]
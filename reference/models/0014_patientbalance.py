@@ -0,0 +1,38 @@
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+import django.db.models.deletion
+
+def backfill_patient_balances(apps, schema_editor):
+    Payment = apps.get_model('api', 'Payment')
+    PatientBalance = apps.get_model('api', 'PatientBalance')
+    
+    # Totals of every patient with payments, one grouped query
+    rows = Payment.objects.values('patient_id').annotate(
+        total_billed=Sum('total_amount'),
+        total_paid=Sum('amount_paid'),
+        payment_count=Count('id'),
+        last_payment_date=Max('payment_date')
+    )
+    PatientBalance.objects.bulk_create([PatientBalance(**row) for row in rows], batch_size=1000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_dentalchartchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_billed', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_paid', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('payment_count', models.PositiveIntegerField(default=0)),
+                ('last_payment_date', models.DateField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('patient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='balance_ledger', to='api.patient')),
+            ],
+        ),
+        migrations.RunPython(backfill_patient_balances, migrations.RunPython.noop),
+    ]
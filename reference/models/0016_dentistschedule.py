@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from api.scheduling import bitmap_from_intervals, busy_from_bookings, pack_bitmap
+
+def backfill_dentist_schedules(apps, schema_editor):
+    Appointment = apps.get_model('api', 'Appointment')
+    DentistSchedule = apps.get_model('api', 'DentistSchedule')
+    
+    bookings = Appointment.objects.filter(
+        status='scheduled', dentist__isnull=False
+    ).order_by('dentist_id', 'date', 'start_time').values_list('dentist_id', 'date', 'start_time', 'end_time')
+    DentistSchedule.objects.bulk_create([
+        DentistSchedule(dentist_id=dentist_id, date=date, busy=pack_bitmap(bitmap_from_intervals(intervals)))
+        for (dentist_id, date), intervals in busy_from_bookings(bookings.iterator()).items()
+    ], batch_size=1000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_appointment_dentist_slot_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DentistSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('busy', models.BinaryField(default=bytes)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('dentist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedules', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('dentist', 'date')},
+            },
+        ),
+        migrations.RunPython(backfill_dentist_schedules, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+from datetime import timezone
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+STATUS_FIELDS = {
+    'scheduled': 'appointments_scheduled',
+    'completed': 'appointments_completed',
+    'cancelled': 'appointments_cancelled',
+    'no_show': 'appointments_no_show',
+}
+
+def backfill_clinic_metrics(apps, schema_editor):
+    Patient = apps.get_model('api', 'Patient')
+    Appointment = apps.get_model('api', 'Appointment')
+    Payment = apps.get_model('api', 'Payment')
+    ClinicDailyMetrics = apps.get_model('api', 'ClinicDailyMetrics')
+    
+    # One grouped query per source table over the whole history
+    metrics = {}
+    for row in Patient.objects.annotate(day=TruncDate('created_at', tzinfo=timezone.utc)).values(
+        'clinic_id', 'day'
+    ).annotate(count=Count('id')).order_by():
+        metrics.setdefault((row['clinic_id'], row['day']), {})['new_patients'] = row['count']
+    for row in Appointment.objects.values('clinic_id', day=F('date')).annotate(**{
+        field: Count('id', filter=Q(status=status)) for status, field in STATUS_FIELDS.items()
+    }).order_by():
+        metrics.setdefault((row['clinic_id'], row['day']), {}).update(
+            {field: row[field] for field in STATUS_FIELDS.values()}
+        )
+    for row in Payment.objects.values('clinic_id', day=F('payment_date')).annotate(total=Sum('amount_paid')).order_by():
+        metrics.setdefault((row['clinic_id'], row['day']), {})['revenue'] = row['total'] or 0
+    
+    ClinicDailyMetrics.objects.bulk_create([
+        ClinicDailyMetrics(clinic_id=clinic_id, date=day, **values)
+        for (clinic_id, day), values in metrics.items()
+    ], batch_size=1000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_dentistschedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClinicDailyMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('new_patients', models.PositiveIntegerField(default=0)),
+                ('appointments_scheduled', models.PositiveIntegerField(default=0)),
+                ('appointments_completed', models.PositiveIntegerField(default=0)),
+                ('appointments_cancelled', models.PositiveIntegerField(default=0)),
+                ('appointments_no_show', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('clinic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_metrics', to='api.clinic')),
+            ],
+            options={
+                'unique_together': {('clinic', 'date')},
+            },
+        ),
+        migrations.RunPython(backfill_clinic_metrics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,161 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from django.db import models, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from django.utils.dateparse import parse_date
+from api.models import Appointment, Clinic, Patient, Payment
+
+# Rollup column of each appointment status
+APPOINTMENT_STATUS_FIELDS = {
+    'scheduled': 'appointments_scheduled',
+    'completed': 'appointments_completed',
+    'cancelled': 'appointments_cancelled',
+    'no_show': 'appointments_no_show',
+}
+
+# Rollup columns maintained from each source table
+METRIC_FIELDS = {
+    'patients': ['new_patients'],
+    'appointments': list(APPOINTMENT_STATUS_FIELDS.values()),
+    'payments': ['revenue'],
+}
+
+class ClinicDailyMetrics(models.Model):
+    """
+    Per clinic and day totals the dashboard reads instead of scanning patients, appointments and payments.
+    Days are UTC dates like timezone.now().date(). Each write to a source row recomputes the
+    columns of its day from that table, rebuild_clinic_metrics repairs whole ranges.
+    """
+    clinic = models.ForeignKey(Clinic, on_delete=models.CASCADE, related_name='daily_metrics')
+    date = models.DateField()
+    new_patients = models.PositiveIntegerField(default=0)
+    appointments_scheduled = models.PositiveIntegerField(default=0)
+    appointments_completed = models.PositiveIntegerField(default=0)
+    appointments_cancelled = models.PositiveIntegerField(default=0)
+    appointments_no_show = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('clinic', 'date')
+
+    def __str__(self):
+        return f"Metrics of clinic {self.clinic_id} on {self.date}"
+
+def _start_of_day(day):
+    return datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+
+def compute_clinic_metrics(start_date, end_date, clinic_id=None, kinds=tuple(METRIC_FIELDS)):
+    """
+    Return {(clinic_id, date): {column: value}} over the date range from the source tables,
+    one grouped query per kind of metric.
+    """
+    def scope(queryset):
+        return queryset.filter(clinic_id=clinic_id) if clinic_id else queryset
+
+    metrics = {}
+
+    def add(rows, **columns):
+        for row in rows:
+            values = metrics.setdefault((row['clinic_id'], row['day']), {})
+            for column, source in columns.items():
+                values[column] = row[source]
+
+    if 'patients' in kinds:
+        add(scope(Patient.objects.filter(
+            created_at__gte=_start_of_day(start_date),
+            created_at__lt=_start_of_day(end_date + timedelta(days=1))
+        )).annotate(day=TruncDate('created_at', tzinfo=dt_timezone.utc)).values('clinic_id', 'day').annotate(
+            count=Count('id')
+        ).order_by(), new_patients='count')
+    if 'appointments' in kinds:
+        add(scope(Appointment.objects.filter(date__range=(start_date, end_date))).values('clinic_id', day=models.F('date')).annotate(**{
+            column: Count('id', filter=Q(status=status)) for status, column in APPOINTMENT_STATUS_FIELDS.items()
+        }).order_by(), **{column: column for column in APPOINTMENT_STATUS_FIELDS.values()})
+    if 'payments' in kinds:
+        add(scope(Payment.objects.filter(payment_date__range=(start_date, end_date))).values(
+            'clinic_id', day=models.F('payment_date')
+        ).annotate(total=Sum('amount_paid')).order_by(), revenue='total')
+
+    # Columns of the requested kinds a day has no source rows for are zero
+    columns = [column for kind in kinds for column in METRIC_FIELDS[kind]]
+    for values in metrics.values():
+        for column in columns:
+            values.setdefault(column, Decimal('0') if column == 'revenue' else 0)
+    return metrics
+
+def refresh_clinic_day(clinic_id, day, kind):
+    """
+    Recompute the `kind` columns of a clinic's day from their source table.
+    The row is locked first, so concurrent writes to the same day are counted one after the other.
+    """
+    with transaction.atomic():
+        metrics, _ = ClinicDailyMetrics.objects.select_for_update().get_or_create(clinic_id=clinic_id, date=day)
+        values = compute_clinic_metrics(day, day, clinic_id, kinds=[kind]).get((clinic_id, day))
+        for column in METRIC_FIELDS[kind]:
+            setattr(metrics, column, values[column] if values else 0)
+        metrics.save()
+    return metrics
+
+def _utc_date(value):
+    return value.astimezone(dt_timezone.utc).date() if value else None
+
+def _cascaded_from_clinic(origin):
+    origin_model = origin.model if isinstance(origin, models.QuerySet) else type(origin)
+    # The clinic's metrics go away with it
+    return origin is not None and issubclass(origin_model, Clinic)
+
+# Source fields each table's rollup depends on, remembered on load as they may change on save.
+# Read from __dict__ as touching a deferred field would load it right here.
+_TRACKED_FIELDS = {
+    Patient: ('patients', 'created_at', ('clinic_id',)),
+    Appointment: ('appointments', 'date', ('clinic_id', 'status')),
+    Payment: ('payments', 'payment_date', ('clinic_id', 'amount_paid')),
+}
+
+def _metrics_state(instance):
+    _, date_field, fields = _TRACKED_FIELDS[type(instance)]
+    day = instance.__dict__.get(date_field)
+    if isinstance(day, datetime):
+        day = _utc_date(day)
+    elif isinstance(day, str):
+        # Assigned but not saved and reloaded yet
+        day = parse_date(day)
+    return day, tuple(instance.__dict__.get(field) for field in fields)
+
+@receiver(post_init, sender=Patient)
+@receiver(post_init, sender=Appointment)
+@receiver(post_init, sender=Payment)
+def remember_metrics_state(sender, instance, **kwargs):
+    instance._metrics_state = _metrics_state(instance)
+
+@receiver(post_save, sender=Patient)
+@receiver(post_save, sender=Appointment)
+@receiver(post_save, sender=Payment)
+def metrics_source_saved(sender, instance, created=False, **kwargs):
+    """Refresh the rollup days a patient, appointment or payment was written to or moved out of."""
+    kind = _TRACKED_FIELDS[sender][0]
+    previous = instance._metrics_state
+    current = _metrics_state(instance)
+    if created or previous != current:
+        days = {(current[1][0], current[0])}
+        if not created:
+            days.add((previous[1][0], previous[0]))
+        for clinic_id, day in days:
+            if clinic_id and day:
+                refresh_clinic_day(clinic_id, day, kind)
+    instance._metrics_state = current
+
+@receiver(post_delete, sender=Patient)
+@receiver(post_delete, sender=Appointment)
+@receiver(post_delete, sender=Payment)
+def metrics_source_deleted(sender, instance, origin=None, **kwargs):
+    """Take a deleted patient, appointment or payment off its rollup day."""
+    if _cascaded_from_clinic(origin):
+        return
+    day, fields = _metrics_state(instance)
+    if fields[0] and day:
+        refresh_clinic_day(fields[0], day, _TRACKED_FIELDS[sender][0])
@@ -0,0 +1,45 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from api.cache import get_membership_cache
+from api.models import Clinic, ClinicMembership
+
+def get_user_memberships(user_id):
+    """
+    Return the user's clinic memberships as a list of {'id', 'name', 'role', 'is_primary'}
+    clinic dicts, from the membership cache or from one query on a miss.
+    """
+    def load():
+        return [
+            {'id': clinic_id, 'name': name, 'role': role, 'is_primary': is_primary}
+            for clinic_id, name, role, is_primary in ClinicMembership.objects.filter(user_id=user_id).values_list(
+                'clinic_id', 'clinic__name', 'role', 'is_primary'
+            )
+        ]
+    return get_membership_cache().get(user_id, load)
+
+def invalidate_user_memberships(user_ids):
+    membership_cache = get_membership_cache()
+    for user_id in user_ids:
+        membership_cache.invalidate(user_id)
+
+    def invalidate_again():
+        # A login racing this write may have cached the old rows meanwhile
+        for user_id in user_ids:
+            membership_cache.invalidate(user_id)
+
+    transaction.on_commit(invalidate_again)
+
+@receiver(post_save, sender=ClinicMembership)
+@receiver(post_delete, sender=ClinicMembership)
+def clinic_membership_changed(sender, instance, **kwargs):
+    """Drop the cached memberships of a user who joins, leaves or changes role in a clinic."""
+    invalidate_user_memberships([instance.user_id])
+
+@receiver(post_save, sender=Clinic)
+def clinic_changed(sender, instance, created=False, **kwargs):
+    """Drop the cached memberships of every member of a clinic, they carry its name."""
+    if not created:
+        invalidate_user_memberships(list(
+            ClinicMembership.objects.filter(clinic=instance).values_list('user_id', flat=True)
+        ))
@@ -0,0 +1,136 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.db import models, transaction
+from django.db.models import Count, F, Max, Q, Sum, Value
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from api.models import Patient, Payment
+
+class PatientBalance(models.Model):
+    """
+    Materialized payment totals of a patient, kept in step with their payments.
+    Reading a balance is a single row lookup instead of an aggregate over every payment.
+    """
+    patient = models.OneToOneField(Patient, on_delete=models.CASCADE, related_name='balance_ledger')
+    total_billed = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    payment_count = models.PositiveIntegerField(default=0)
+    last_payment_date = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def balance_due(self):
+        return self.total_billed - self.total_paid
+
+    def __str__(self):
+        return f"Balance of patient {self.patient_id}: {self.balance_due}"
+
+def aggregate_patient_payments(patient_ids):
+    """Return {patient_id: totals} computed from the payments themselves, one grouped query."""
+    rows = Payment.objects.filter(patient_id__in=patient_ids).values('patient_id').annotate(
+        total_billed=Sum('total_amount'),
+        total_paid=Sum('amount_paid'),
+        payment_count=Count('id'),
+        last_payment_date=Max('payment_date')
+    )
+    return {row.pop('patient_id'): row for row in rows}
+
+# Aging buckets of outstanding charges, (name, oldest age in days), youngest first
+AGING_BUCKETS = [
+    ('current', 0),
+    ('days_31_60', 31),
+    ('days_61_90', 61),
+    ('days_over_90', 91),
+]
+
+def get_receivables(clinic_id, as_of):
+    """
+    Outstanding charges and unapplied credit of every patient of a clinic as of a date,
+    one grouped query ordered by patient. Each row carries the charges of every aging
+    bucket, apply_credit_to_aging() settles the credit against them.
+    """
+    outstanding = Greatest(F('total_amount') - F('amount_paid'), Value(Decimal('0')))
+    credit = Greatest(F('amount_paid') - F('total_amount'), Value(Decimal('0')))
+    buckets = {}
+    for index, (name, min_age) in enumerate(AGING_BUCKETS):
+        age = Q(payment_date__lte=as_of - timedelta(days=min_age))
+        if index + 1 < len(AGING_BUCKETS):
+            age &= Q(payment_date__gt=as_of - timedelta(days=AGING_BUCKETS[index + 1][1]))
+        buckets[name] = Sum(outstanding, filter=age)
+    return Payment.objects.filter(clinic_id=clinic_id, payment_date__lte=as_of).values(
+        'patient_id', 'patient__name'
+    ).annotate(
+        total_billed=Sum('total_amount'),
+        total_paid=Sum('amount_paid'),
+        credit=Sum(credit),
+        last_payment_date=Max('payment_date'),
+        **buckets
+    ).order_by('patient_id')
+
+def apply_credit_to_aging(row):
+    """
+    Aging of a get_receivables() row: overpayments and balance payments settle the oldest
+    charges first. Returns {bucket name: amount} plus the credit left over.
+    """
+    credit = row['credit'] or Decimal('0')
+    aging = {}
+    for name, _ in reversed(AGING_BUCKETS):
+        amount = row[name] or Decimal('0')
+        applied = min(amount, credit)
+        aging[name] = amount - applied
+        credit -= applied
+    aging['unapplied_credit'] = credit
+    return aging
+
+def refresh_patient_balance(patient_id):
+    """
+    Recompute the patient's ledger row from their payments.
+    The row is locked first, so concurrent payments of the same patient are applied one after the other.
+    """
+    with transaction.atomic():
+        ledger, _ = PatientBalance.objects.select_for_update().get_or_create(patient_id=patient_id)
+        totals = aggregate_patient_payments([patient_id]).get(patient_id, {})
+        ledger.total_billed = totals.get('total_billed') or Decimal('0')
+        ledger.total_paid = totals.get('total_paid') or Decimal('0')
+        ledger.payment_count = totals.get('payment_count', 0)
+        ledger.last_payment_date = totals.get('last_payment_date')
+        ledger.save()
+    return ledger
+
+def get_payment_summary(patient):
+    """Payment summary of a patient from the ledger, in the shape of PaymentSummarySerializer."""
+    try:
+        ledger = patient.balance_ledger
+    except PatientBalance.DoesNotExist:
+        # No payment has been recorded for this patient
+        ledger = PatientBalance(patient=patient)
+    return {
+        'total_billed': ledger.total_billed,
+        'total_paid': ledger.total_paid,
+        'balance_due': ledger.balance_due,
+        'last_payment_date': ledger.last_payment_date,
+    }
+
+@receiver(post_init, sender=Payment)
+def remember_payment_patient(sender, instance, **kwargs):
+    # A payment moved to another patient has to be taken off the old patient's ledger too,
+    # read from __dict__ as touching a deferred field would load it right here
+    instance._ledger_patient_id = instance.__dict__.get('patient_id')
+
+@receiver(post_save, sender=Payment)
+def payment_saved(sender, instance, **kwargs):
+    """Refresh the ledger of the patient a payment was written for."""
+    patient_ids = {instance.patient_id, instance._ledger_patient_id} - {None}
+    for patient_id in sorted(patient_ids):
+        refresh_patient_balance(patient_id)
+    instance._ledger_patient_id = instance.patient_id
+
+@receiver(post_delete, sender=Payment)
+def payment_deleted(sender, instance, origin=None, **kwargs):
+    """Refresh the ledger of the patient a payment was removed from."""
+    origin_model = origin.model if isinstance(origin, models.QuerySet) else type(origin)
+    if origin is not None and origin_model is not Payment:
+        # Cascade from a patient or clinic delete, the ledger goes away with the patient
+        return
+    refresh_patient_balance(instance.patient_id)
@@ -0,0 +1,97 @@
+from django.contrib.auth.models import User
+from django.db import models, transaction
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from api.models import Appointment
+from api.scheduling import (
+    to_minutes, interval_mask, bitmap_from_intervals, pack_bitmap, unpack_bitmap
+)
+
+class DentistSchedule(models.Model):
+    """
+    Occupancy bitmap of a dentist's day in 5 minute cells, built from their scheduled appointments.
+    Availability and conflict checks test bits instead of scanning appointments, and the row
+    doubles as the lock bookings of that dentist and day take before writing.
+    """
+    dentist = models.ForeignKey(User, on_delete=models.CASCADE, related_name='schedules')
+    date = models.DateField()
+    busy = models.BinaryField(default=bytes)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('dentist', 'date')
+
+    @property
+    def bitmap(self):
+        return unpack_bitmap(self.busy)
+
+    def __str__(self):
+        return f"Schedule of dentist {self.dentist_id} on {self.date}"
+
+def scheduled_intervals(dentist_id, date):
+    """Busy (start, end) minutes of the dentist's scheduled appointments on the date."""
+    return [
+        (to_minutes(start_time), to_minutes(end_time))
+        for start_time, end_time in Appointment.objects.filter(
+            dentist_id=dentist_id, date=date, status='scheduled'
+        ).values_list('start_time', 'end_time')
+    ]
+
+def lock_dentist_schedule(dentist_id, date):
+    """Lock the schedule row of a dentist's day until the end of the transaction and return it."""
+    schedule, _ = DentistSchedule.objects.select_for_update().get_or_create(dentist_id=dentist_id, date=date)
+    return schedule
+
+def rebuild_dentist_schedule(dentist_id, date):
+    """Recompute the bitmap of a dentist's day from the appointments, the source of truth."""
+    with transaction.atomic():
+        # Lock before reading the appointments, a booking holding the row commits first
+        # and its appointment is part of the bitmap written here
+        schedule = lock_dentist_schedule(dentist_id, date)
+        bitmap = bitmap_from_intervals(scheduled_intervals(dentist_id, date))
+        schedule.busy = pack_bitmap(bitmap)
+        schedule.save(update_fields=['busy', 'updated_at'])
+    return bitmap
+
+def may_overlap(dentist_id, date, start_time, end_time):
+    """
+    Whether [start_time, end_time) touches a booked cell of the dentist's day.
+    False is definite, True only says the appointments have to be checked.
+    """
+    busy = DentistSchedule.objects.filter(dentist_id=dentist_id, date=date).values_list('busy', flat=True).first()
+    return bool(unpack_bitmap(busy) & interval_mask(to_minutes(start_time), to_minutes(end_time)))
+
+def get_schedule_bitmaps(dentist_ids, start_date, end_date):
+    """Return {(dentist_id, date): bitmap} of the dentists over the date range, one query."""
+    return {
+        (dentist_id, date): unpack_bitmap(busy)
+        for dentist_id, date, busy in DentistSchedule.objects.filter(
+            dentist_id__in=dentist_ids, date__range=(start_date, end_date)
+        ).values_list('dentist_id', 'date', 'busy')
+    }
+
+@receiver(post_init, sender=Appointment)
+def remember_appointment_slot(sender, instance, **kwargs):
+    # An appointment moved to another dentist or day frees its old slot too,
+    # read from __dict__ as touching a deferred field would load it right here
+    instance._schedule_key = (instance.__dict__.get('dentist_id'), instance.__dict__.get('date'))
+
+@receiver(post_save, sender=Appointment)
+def appointment_saved(sender, instance, **kwargs):
+    """Rebuild the schedules an appointment was booked into, moved out of or cancelled in."""
+    keys = {instance._schedule_key, (instance.dentist_id, instance.date)}
+    for dentist_id, date in keys:
+        if dentist_id is None or date is None:
+            continue
+        rebuild_dentist_schedule(dentist_id, date)
+    instance._schedule_key = (instance.dentist_id, instance.date)
+
+@receiver(post_delete, sender=Appointment)
+def appointment_deleted(sender, instance, origin=None, **kwargs):
+    """Free the slot of a deleted appointment, also when a patient delete cascades to it."""
+    origin_model = origin.model if isinstance(origin, models.QuerySet) else type(origin)
+    if origin is not None and issubclass(origin_model, User):
+        # The dentist's schedules go away with them
+        return
+    if instance.dentist_id and instance.date:
+        rebuild_dentist_schedule(instance.dentist_id, instance.date)
@@ -1,7 +1,7 @@
 # Serializers package 
 
 # Import serializers here for easy access
-from api.serializers.patients import PatientSerializer, PatientDetailSerializer
+from api.serializers.patients import PatientSerializer, PatientListSerializer, PatientDetailSerializer
 from api.serializers.appointments import AppointmentSerializer, AppointmentDetailSerializer, UserSerializer
 from api.serializers.treatments import (
     TreatmentSerializer, 
@@ -21,6 +21,7 @@ from api.serializers.auth import (
 # This allows importing directly from api.serializers
 __all__ = [
     'PatientSerializer',
+    'PatientListSerializer',
     'PatientDetailSerializer',
     'AppointmentSerializer',
     'AppointmentDetailSerializer',
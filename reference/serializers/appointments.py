@@ -1,7 +1,12 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from datetime import timedelta
 from api.models import Appointment, Patient
+from api.models.schedule import lock_dentist_schedule, may_overlap
 from api.serializers.patients import PatientSerializer
+from api.serializers.users import UserNameListSerializer, display_name, get_user_name_resolver
 
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for User model (simplified version for appointments)"""
@@ -13,7 +18,8 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'username', 'email']
     
     def get_full_name(self, obj):
-        return f"{obj.first_name} {obj.last_name}".strip() or obj.username
+        get_user_name_resolver(self.context).remember(obj)
+        return display_name(obj)
 
 class AppointmentSerializer(serializers.ModelSerializer):
     """
@@ -33,11 +39,11 @@ class AppointmentSerializer(serializers.ModelSerializer):
             'duration_minutes'
         ]
         read_only_fields = ['id', 'patient_name', 'dentist_name', 'status_display', 'duration_minutes']
+        list_serializer_class = UserNameListSerializer
+        user_fields = ['dentist']
     
     def get_dentist_name(self, obj):
-        if obj.dentist:
-            return f"{obj.dentist.first_name} {obj.dentist.last_name}".strip() or obj.dentist.username
-        return ""
+        return get_user_name_resolver(self.context).display_name(obj.dentist_id) or ""
 
 class AppointmentDetailSerializer(serializers.ModelSerializer):
     """
@@ -73,42 +79,116 @@ class AppointmentDetailSerializer(serializers.ModelSerializer):
         Validate that end_time is after start_time and that the appointment doesn't overlap
         with existing appointments for the same dentist.
         """
-        start_time = data.get('start_time')
-        end_time = data.get('end_time')
-        date = data.get('date')
-        dentist = data.get('dentist')
+        slot = self.booked_slot(data)
+        start_time = slot['start_time']
+        end_time = slot['end_time']
         
         # Check if end_time is after start_time
         if start_time and end_time and start_time >= end_time:
             raise serializers.ValidationError("End time must be after start time")
         
-        # Check for overlapping appointments for the same dentist
-        if start_time and end_time and date and dentist:
-            # Get the appointment being updated (if any)
-            instance = self.instance
-            
-            # Query for overlapping appointments
-            overlapping = Appointment.objects.filter(
-                dentist=dentist,
-                date=date,
-                status='scheduled'
-            ).exclude(
-                # Exclude the current appointment if updating
-                id=instance.id if instance else None
-            )
-            
-            # Check for overlaps
-            for appt in overlapping:
-                # Check if the new appointment overlaps with an existing one
-                if (
-                    (start_time <= appt.start_time < end_time) or  # New appointment starts before and ends during/after existing
-                    (start_time < appt.end_time <= end_time) or    # New appointment starts during and ends after existing
-                    (appt.start_time <= start_time < appt.end_time) or  # Existing appointment starts before and ends during/after new
-                    (appt.start_time < end_time <= appt.end_time)      # Existing appointment starts during and ends after new
-                ):
-                    raise serializers.ValidationError(
-                        f"This appointment overlaps with an existing appointment for {dentist.get_full_name()} "
-                        f"on {date} from {appt.start_time} to {appt.end_time}"
-                    )
+        self.check_overlap(data, prefilter=True)
+        return data
+    
+    def booked_slot(self, data):
+        """
+        The dentist, date, times and status the appointment has once `data` is saved.
+        A partial update, e.g. a reschedule sending only the times, keeps the other values of the instance.
+        """
+        slot = {field: data.get(field) for field in ('dentist', 'date', 'start_time', 'end_time', 'status')}
+        if self.instance is not None:
+            for field in slot:
+                if field not in data:
+                    slot[field] = getattr(self.instance, field)
+        return slot
+    
+    def check_overlap(self, data, prefilter=False):
+        """
+        Raise a ValidationError if the appointment overlaps a scheduled appointment of the same dentist.
+        With prefilter the schedule bitmap may answer a free slot without reading the appointments.
+        """
+        slot = self.booked_slot(data)
+        start_time = slot['start_time']
+        end_time = slot['end_time']
+        date = slot['date']
+        dentist = slot['dentist']
+        if not (start_time and end_time and date and dentist):
+            return
+        if slot['status'] not in (None, 'scheduled'):
+            # Only scheduled appointments hold their slot
+            return
+        if prefilter and not may_overlap(dentist.id, date, start_time, end_time):
+            # Every 5 minute cell of the slot is free in the dentist's schedule bitmap
+            return
         
-        return data 
\ No newline at end of file
+        # Two half-open intervals overlap when each starts before the other ends,
+        # answered by a range scan of the (dentist, date, start_time) index
+        overlapping = Appointment.objects.filter(
+            dentist=dentist,
+            date=date,
+            status='scheduled',
+            start_time__lt=end_time,
+            end_time__gt=start_time
+        )
+        if self.instance:
+            # Exclude the current appointment if updating
+            overlapping = overlapping.exclude(id=self.instance.id)
+        appt = overlapping.order_by('start_time').only('start_time', 'end_time').first()
+        if appt:
+            raise serializers.ValidationError(
+                f"This appointment overlaps with an existing appointment for {dentist.get_full_name()} "
+                f"on {date} from {appt.start_time} to {appt.end_time}"
+            )
+    
+    def lock_dentist_schedule(self, validated_data):
+        """
+        Lock the schedule row of the dentist's day for the rest of the transaction and check
+        for overlaps again. Concurrent bookings of the same dentist and day queue up here, so
+        only one of two clashing appointments can be written, other bookings are not held up.
+        The bitmap is derived data, under the lock the appointments themselves are checked.
+        """
+        slot = self.booked_slot(validated_data)
+        if slot['dentist'] is None or slot['date'] is None:
+            return
+        lock_dentist_schedule(slot['dentist'].id, slot['date'])
+        self.check_overlap(validated_data)
+    
+    def create(self, validated_data):
+        with transaction.atomic():
+            self.lock_dentist_schedule(validated_data)
+            return super().create(validated_data)
+    
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            self.lock_dentist_schedule(validated_data)
+            return super().update(instance, validated_data)
+
+class AvailabilityQuerySerializer(serializers.Serializer):
+    """Query parameters of an availability search over several dentists and days."""
+    MAX_DAYS = 31
+    
+    dentists = serializers.CharField(required=False, help_text="Comma separated dentist ids, every dentist of the clinic by default")
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+    duration = serializers.IntegerField(required=False, min_value=5, max_value=480)
+    procedure = serializers.IntegerField(required=False, help_text="Take the duration from this dental procedure")
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=500)
+    
+    def validate_dentists(self, value):
+        try:
+            return [int(dentist_id) for dentist_id in value.split(',') if dentist_id.strip()]
+        except ValueError:
+            raise serializers.ValidationError("Expected comma separated dentist ids")
+    
+    def validate(self, data):
+        start_date = data.setdefault('start_date', timezone.localdate())
+        if 'end_date' not in data:
+            # A first-N search looks as far ahead as allowed, otherwise one week
+            days = self.MAX_DAYS if 'limit' in data else 7
+            data['end_date'] = start_date + timedelta(days=days - 1)
+        end_date = data['end_date']
+        if end_date < start_date:
+            raise serializers.ValidationError("End date must not be before start date")
+        if (end_date - start_date).days >= self.MAX_DAYS:
+            raise serializers.ValidationError(f"Search at most {self.MAX_DAYS} days at once")
+        return data
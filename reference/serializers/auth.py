@@ -3,6 +3,8 @@ from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from api.models import Clinic, ClinicMembership
+from api.models.memberships import get_user_memberships
+from api.serializers.users import display_name, get_user_name_resolver
 
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for User model"""
@@ -14,7 +16,8 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'full_name']
     
     def get_full_name(self, obj):
-        return f"{obj.first_name} {obj.last_name}".strip() or obj.username
+        get_user_name_resolver(self.context).remember(obj)
+        return display_name(obj)
 
 class RegisterSerializer(serializers.ModelSerializer):
     """Serializer for user registration"""
@@ -52,35 +55,17 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
             'full_name': f"{user.first_name} {user.last_name}".strip() or user.username,
         }
         
-        # Add clinics data
-        memberships = ClinicMembership.objects.filter(user=user).select_related('clinic')
-        clinics = []
-        
-        for membership in memberships:
-            clinics.append({
-                'id': membership.clinic.id,
-                'name': membership.clinic.name,
-                'role': membership.role,
-                'is_primary': membership.is_primary,
-            })
-        
+        # Add clinics data, one cached list of memberships answers everything below
+        clinics = [dict(membership) for membership in get_user_memberships(user.id)]
         data['clinics'] = clinics
         
-        # Add current clinic if user has a primary clinic
-        primary_membership = memberships.filter(is_primary=True).first()
-        if primary_membership:
-            data['current_clinic'] = {
-                'id': primary_membership.clinic.id,
-                'name': primary_membership.clinic.name,
-                'role': primary_membership.role,
-            }
-        elif memberships.exists():
-            # If no primary clinic, use the first one
-            first_membership = memberships.first()
+        # Add current clinic, the primary one or else the first
+        current = next((clinic for clinic in clinics if clinic['is_primary']), clinics[0] if clinics else None)
+        if current:
             data['current_clinic'] = {
-                'id': first_membership.clinic.id,
-                'name': first_membership.clinic.name,
-                'role': first_membership.role,
+                'id': current['id'],
+                'name': current['name'],
+                'role': current['role'],
             }
         else:
             data['current_clinic'] = None
@@ -94,12 +79,11 @@ class ClinicSelectionSerializer(serializers.Serializer):
     def validate_clinic_id(self, value):
         user = self.context['request'].user
         
-        try:
-            # Check if the user is a member of this clinic
-            membership = ClinicMembership.objects.get(user=user, clinic_id=value)
-            return value
-        except ClinicMembership.DoesNotExist:
+        # Check if the user is a member of this clinic, straight from the database as the
+        # cached memberships may lag behind a removal on other workers
+        if not ClinicMembership.objects.filter(user=user, clinic_id=value).exists():
             raise serializers.ValidationError("You are not a member of this clinic.")
+        return value
 
 class PasswordChangeSerializer(serializers.Serializer):
     """Serializer for changing password"""
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from api.models import Patient
+from api.models.payment_ledger import get_payment_summary
 
 class PatientSerializer(serializers.ModelSerializer):
     """
@@ -11,6 +12,25 @@ class PatientSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'age', 'gender', 'phone', 'email']
         read_only_fields = ['id']
 
+class PatientListSerializer(PatientSerializer):
+    """
+    Patient list entry with the patient's balance due, read from their balance ledger.
+    Select the ledger along with the patients, see with_balance_ledger().
+    """
+    balance_due = serializers.SerializerMethodField()
+
+    class Meta(PatientSerializer.Meta):
+        fields = PatientSerializer.Meta.fields + ['balance_due']
+
+    @staticmethod
+    def with_balance_ledger(queryset):
+        return queryset.select_related('balance_ledger')
+
+    def get_balance_due(self, obj):
+        return serializers.DecimalField(max_digits=10, decimal_places=2).to_representation(
+            get_payment_summary(obj)['balance_due']
+        )
+
 class PatientDetailSerializer(serializers.ModelSerializer):
     """
     Detailed serializer for Patient model.
@@ -1,8 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from api.models import Payment, PaymentItem, Patient, Appointment, Treatment
+from api.models.payment_ledger import get_payment_summary
 from api.serializers.patients import PatientSerializer
 from api.serializers.appointments import AppointmentSerializer, UserSerializer
+from django.db import transaction
 from decimal import Decimal
 
 class PaymentItemSerializer(serializers.ModelSerializer):
@@ -108,6 +110,36 @@ class PaymentDetailSerializer(serializers.ModelSerializer):
         
         return data
     
+    def _build_items(self, payment, payment_items_data):
+        """
+        Turn the payment_items payload into unsaved PaymentItems.
+        Every referenced treatment is loaded with a single query, ids from other clinics are dropped.
+        """
+        def treatment_pk(value):
+            try:
+                return int(value) if value not in (None, '') else None
+            except (TypeError, ValueError):
+                return None
+        
+        treatment_ids = {treatment_pk(item.get('treatment_id')) for item in payment_items_data} - {None}
+        treatments = Treatment.objects.filter(clinic=payment.clinic).in_bulk(treatment_ids)
+        
+        items = []
+        for item_data in payment_items_data:
+            item_data = dict(item_data)
+            item_id = item_data.pop('id', None)
+            treatment_id = treatment_pk(item_data.pop('treatment_id', None))
+            item = PaymentItem(
+                payment=payment,
+                treatment=treatments.get(treatment_id),
+                **item_data
+            )
+            if item.amount is not None:
+                # Compare amounts sent as strings or numbers with the stored decimals
+                item.amount = Decimal(str(item.amount))
+            items.append((item_id, item))
+        return items
+    
     def create(self, validated_data):
         """
         Create a payment with payment items.
@@ -118,63 +150,82 @@ class PaymentDetailSerializer(serializers.ModelSerializer):
         # Set the created_by field to the current user
         validated_data['created_by'] = self.context['request'].user
         
-        # Create the payment
-        payment = Payment.objects.create(**validated_data)
-        
-        # Create payment items
-        for item_data in payment_items_data:
-            treatment_id = item_data.pop('treatment_id', None)
-            treatment = None
-            
-            if treatment_id:
-                try:
-                    treatment = Treatment.objects.get(id=treatment_id, clinic=payment.clinic)
-                except Treatment.DoesNotExist:
-                    pass
+        with transaction.atomic():
+            # Create the payment
+            payment = Payment.objects.create(**validated_data)
             
-            PaymentItem.objects.create(
-                payment=payment,
-                treatment=treatment,
-                **item_data
-            )
+            # Create payment items with a single insert
+            PaymentItem.objects.bulk_create([
+                item for _, item in self._build_items(payment, payment_items_data)
+            ])
         
         return payment
     
     def update(self, instance, validated_data):
         """
         Update a payment with payment items.
+        Items are diffed against the stored ones, so unchanged items are not touched.
         """
         # Extract payment items data
         payment_items_data = validated_data.pop('payment_items', None)
         
-        # Update the payment
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
-        
-        # Update payment items if provided
-        if payment_items_data is not None:
-            # Delete existing items
-            instance.items.all().delete()
+        with transaction.atomic():
+            # Update the payment
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
             
-            # Create new items
-            for item_data in payment_items_data:
-                treatment_id = item_data.pop('treatment_id', None)
-                treatment = None
-                
-                if treatment_id:
-                    try:
-                        treatment = Treatment.objects.get(id=treatment_id, clinic=instance.clinic)
-                    except Treatment.DoesNotExist:
-                        pass
-                
-                PaymentItem.objects.create(
-                    payment=instance,
-                    treatment=treatment,
-                    **item_data
-                )
-        
-        return instance 
+            # Update payment items if provided
+            if payment_items_data is not None:
+                self._sync_items(instance, payment_items_data)
+        
+        return instance
+    
+    def _sync_items(self, payment, payment_items_data):
+        """Apply the payment_items payload with as few writes as possible, one statement per kind."""
+        existing = {item.id: item for item in payment.items.all()}
+        
+        def key(item):
+            return item.description, item.amount, item.treatment_id
+        
+        # Items sent back with their id keep it, the rest are matched on content
+        to_update, to_create, wanted = [], [], []
+        for item_id, item in self._build_items(payment, payment_items_data):
+            if item_id in existing:
+                item.pk = item_id
+                if key(existing.pop(item_id)) != key(item):
+                    to_update.append(item)
+            else:
+                wanted.append(item)
+        
+        unmatched = {}
+        for item in existing.values():
+            unmatched.setdefault(key(item), []).append(item)
+        
+        for item in wanted:
+            if unmatched.get(key(item)):
+                # Identical to a stored item, leave it as it is
+                unmatched[key(item)].pop()
+            else:
+                to_create.append(item)
+        
+        # Reuse leftover rows for new items before inserting or deleting anything
+        leftovers = [item for items in unmatched.values() for item in items]
+        while to_create and leftovers:
+            item = to_create.pop()
+            item.pk = leftovers.pop().pk
+            to_update.append(item)
+        
+        if to_update:
+            PaymentItem.objects.bulk_update(to_update, ['description', 'amount', 'treatment'])
+        if to_create:
+            PaymentItem.objects.bulk_create(to_create)
+        if leftovers:
+            PaymentItem.objects.filter(id__in=[item.id for item in leftovers]).delete()
+        
+        # Drop any prefetched items so the response reads the new ones
+        if hasattr(payment, '_prefetched_objects_cache'):
+            payment._prefetched_objects_cache.pop('items', None)
 
 class PaymentSummarySerializer(serializers.Serializer):
     """
@@ -186,6 +237,11 @@ class PaymentSummarySerializer(serializers.Serializer):
     balance_due = serializers.DecimalField(max_digits=10, decimal_places=2)
     last_payment_date = serializers.DateField(allow_null=True)
     
+    @classmethod
+    def for_patient(cls, patient):
+        """Summary of a patient read from their balance ledger, without aggregating payments."""
+        return cls(get_payment_summary(patient))
+    
     def to_representation(self, instance):
         """
         Handle potential None values in the data.
@@ -0,0 +1,22 @@
+from datetime import timedelta
+from django.utils import timezone
+from rest_framework import serializers
+
+class StatsSeriesQuerySerializer(serializers.Serializer):
+    """Query parameters of a stats time series."""
+    MAX_DAYS = 5 * 366
+    BUCKETS = ['day', 'week', 'month']
+    
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+    bucket = serializers.ChoiceField(choices=BUCKETS, default='day')
+    
+    def validate(self, data):
+        # The last 30 days by default, days are UTC like the daily metrics
+        end_date = data.setdefault('end_date', timezone.now().date())
+        start_date = data.setdefault('start_date', end_date - timedelta(days=29))
+        if end_date < start_date:
+            raise serializers.ValidationError("End date must not be before start date")
+        if (end_date - start_date).days >= self.MAX_DAYS:
+            raise serializers.ValidationError(f"Series cover at most {self.MAX_DAYS} days")
+        return data
@@ -0,0 +1,85 @@
+from rest_framework import serializers
+from django.contrib.auth.models import User
+from django.db import models
+
+def display_name(user):
+    """Full name of a user, falling back to the username."""
+    return f"{user.first_name} {user.last_name}".strip() or user.username
+
+class UserNameResolver:
+    """
+    Request-scoped memo of user names keyed by user id.
+    Ids are loaded in bulk with prime(), anything not primed is loaded on first use,
+    so every user is fetched at most once per request whichever serializer asks for it.
+    """
+
+    def __init__(self):
+        self._users = {}
+
+    def remember(self, user):
+        self._users[user.id] = (f"{user.first_name} {user.last_name}".strip(), user.username)
+
+    def prime(self, user_ids):
+        missing = {user_id for user_id in user_ids if user_id is not None} - self._users.keys()
+        if not missing:
+            return
+        for user_id, first_name, last_name, username in User.objects.filter(id__in=missing).values_list(
+            'id', 'first_name', 'last_name', 'username'
+        ):
+            self._users[user_id] = (f"{first_name} {last_name}".strip(), username)
+        # Remember deleted users too so they are not looked up again
+        for user_id in missing - self._users.keys():
+            self._users[user_id] = None
+
+    def _get(self, user_id):
+        if user_id is None:
+            return None
+        self.prime([user_id])
+        return self._users[user_id]
+
+    def full_name(self, user_id):
+        """Same as User.get_full_name(), None when there is no user."""
+        user = self._get(user_id)
+        return user[0] if user else None
+
+    def display_name(self, user_id):
+        """Full name falling back to the username, None when there is no user."""
+        user = self._get(user_id)
+        return (user[0] or user[1]) if user else None
+
+def get_user_name_resolver(context):
+    """
+    Return the UserNameResolver shared by every serializer of the current request.
+    Without a request in the context it lives in the context itself, which nested serializers share.
+    """
+    holder = context.get('request')
+    if holder is None:
+        return context.setdefault('user_name_resolver', UserNameResolver())
+    resolver = getattr(holder, '_user_name_resolver', None)
+    if resolver is None:
+        resolver = holder._user_name_resolver = UserNameResolver()
+    return resolver
+
+class UserNameListSerializer(serializers.ListSerializer):
+    """
+    List serializer that loads the names of every user its rows reference in one query.
+    The child serializer lists the user foreign keys it reads in Meta.user_fields,
+    users already loaded with select_related are taken as they are.
+    """
+
+    def to_representation(self, data):
+        # Same unwrapping as ListSerializer, a related manager serves its prefetched rows
+        rows = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        resolver = get_user_name_resolver(self.context)
+        user_ids = set()
+        for row in rows:
+            for name in self.child.Meta.user_fields:
+                field = row._meta.get_field(name)
+                if field.is_cached(row):
+                    user = field.get_cached_value(row)
+                    if user is not None:
+                        resolver.remember(user)
+                else:
+                    user_ids.add(getattr(row, field.attname))
+        resolver.prime(user_ids)
+        return super().to_representation(rows)
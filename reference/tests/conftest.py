@@ -1,9 +1,15 @@
 import pytest
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from rest_framework.test import APIClient
 from rest_framework_simplejwt.tokens import RefreshToken
 from api.models import Clinic, ClinicMembership
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Start every test with an empty cache, ids come back once a test's rows are rolled back."""
+    cache.clear()
+
 @pytest.fixture
 def api_client():
     """Return an API client for testing."""
@@ -1,9 +1,12 @@
 from rest_framework import serializers
+from django.db.models import Prefetch
 from api.models.dental_chart import (
     DentalCondition, DentalProcedure, DentalChartTooth, 
-    DentalChartCondition, DentalChartProcedure, ChartHistory, ProcedureNote, GeneralProcedure
+    DentalChartCondition, DentalChartProcedure, ChartHistory, ProcedureNote, GeneralProcedure,
+    DentalChartState, DentalChartChange, PERMANENT_TEETH, PRIMARY_TEETH
 )
 from api.models import Patient
+from api.serializers.users import UserNameListSerializer, get_user_name_resolver
 
 class DentalConditionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -18,8 +21,8 @@ class DentalProcedureSerializer(serializers.ModelSerializer):
 class DentalChartConditionSerializer(serializers.ModelSerializer):
     condition_name = serializers.CharField(source='condition.name', read_only=True)
     condition_code = serializers.CharField(source='condition.code', read_only=True)
-    created_by = serializers.CharField(source='created_by.get_full_name', read_only=True)
-    updated_by = serializers.CharField(source='updated_by.get_full_name', read_only=True)
+    created_by = serializers.SerializerMethodField()
+    updated_by = serializers.SerializerMethodField()
     
     class Meta:
         model = DentalChartCondition
@@ -28,6 +31,14 @@ class DentalChartConditionSerializer(serializers.ModelSerializer):
             'severity', 'created_at', 'updated_at', 'created_by', 'updated_by'
         ]
         read_only_fields = ['created_at', 'updated_at', 'created_by', 'updated_by']
+        list_serializer_class = UserNameListSerializer
+        user_fields = ['created_by', 'updated_by']
+    
+    def get_created_by(self, obj):
+        return get_user_name_resolver(self.context).full_name(obj.created_by_id)
+    
+    def get_updated_by(self, obj):
+        return get_user_name_resolver(self.context).full_name(obj.updated_by_id)
 
 class ProcedureNoteSerializer(serializers.ModelSerializer):
     created_by = serializers.SerializerMethodField()
@@ -35,16 +46,16 @@ class ProcedureNoteSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProcedureNote
         fields = ['id', 'note', 'appointment_date', 'created_by', 'created_at']
+        list_serializer_class = UserNameListSerializer
+        user_fields = ['created_by']
     
     def get_created_by(self, obj):
-        if obj.created_by:
-            return obj.created_by.get_full_name() or obj.created_by.username
-        return None
+        return get_user_name_resolver(self.context).display_name(obj.created_by_id)
 
 class DentalChartProcedureSerializer(serializers.ModelSerializer):
     procedure_name = serializers.CharField(source='procedure.name', read_only=True)
     procedure_code = serializers.CharField(source='procedure.code', read_only=True)
-    performed_by = serializers.CharField(source='performed_by.get_full_name', read_only=True)
+    performed_by = serializers.SerializerMethodField()
     progress_notes = ProcedureNoteSerializer(source='notes', many=True, read_only=True)
     
     class Meta:
@@ -55,6 +66,11 @@ class DentalChartProcedureSerializer(serializers.ModelSerializer):
             'created_at', 'progress_notes'
         ]
         read_only_fields = ['created_at', 'performed_by']
+        list_serializer_class = UserNameListSerializer
+        user_fields = ['performed_by']
+    
+    def get_performed_by(self, obj):
+        return get_user_name_resolver(self.context).full_name(obj.performed_by_id)
 
 class DentalChartToothSerializer(serializers.ModelSerializer):
     conditions = DentalChartConditionSerializer(many=True, read_only=True)
@@ -71,6 +87,239 @@ class DentalChartToothSerializer(serializers.ModelSerializer):
             'procedures'
         ]
 
+def get_dental_chart_teeth_queryset():
+    """
+    Teeth queryset with every relation read by DentalChartToothSerializer loaded up front.
+    A full chart costs one query per level (teeth, conditions, procedures, notes)
+    no matter how many teeth or entries the patient has.
+    """
+    return DentalChartTooth.objects.order_by('number').prefetch_related(
+        Prefetch(
+            'conditions',
+            queryset=DentalChartCondition.objects.select_related(
+                'condition', 'created_by', 'updated_by'
+            ).order_by('id')
+        ),
+        Prefetch(
+            'procedures',
+            queryset=DentalChartProcedure.objects.select_related(
+                'procedure', 'performed_by'
+            ).prefetch_related(
+                Prefetch('notes', queryset=ProcedureNote.objects.select_related('created_by'))
+            ).order_by('id')
+        ),
+    )
+
+def _tooth_key(tooth):
+    # Works for model instances and for the plain dicts of the fast path
+    if isinstance(tooth, dict):
+        return tooth['dentition_type'], tooth['number']
+    return tooth.dentition_type, tooth.number
+
+def fill_virtual_teeth(teeth):
+    """
+    Lay the patient's materialized teeth over the static tooth template.
+    Teeth without a row are returned as plain dicts with empty conditions and procedures,
+    which DentalChartToothSerializer renders the same way as a model instance.
+    """
+    rows = {_tooth_key(tooth): tooth for tooth in teeth}
+    chart = []
+    for dentition_type, template in (('permanent', PERMANENT_TEETH), ('primary', PRIMARY_TEETH)):
+        for tooth_data in template:
+            chart.append(rows.pop((dentition_type, tooth_data['number']), None) or {
+                'dentition_type': dentition_type,
+                'conditions': [],
+                'procedures': [],
+                **tooth_data,
+            })
+    # Rows outside the template, e.g. charts created before the FDI numbering
+    return chart + list(rows.values())
+
+# Field instances used to format values exactly like the serializers above
+_datetime_field = serializers.DateTimeField()
+_price_field = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+def _format_datetime(value):
+    return _datetime_field.to_representation(value) if value is not None else None
+
+def _full_name(row, prefix):
+    return f"{row[prefix + 'first_name']} {row[prefix + 'last_name']}".strip()
+
+def _user_name(row, prefix):
+    # Same as UserNameResolver.full_name(), None when there is no user
+    return _full_name(row, prefix) if row[prefix + 'id'] is not None else None
+
+def _user_values(prefix):
+    return [prefix + 'id', prefix + 'first_name', prefix + 'last_name']
+
+def get_fast_chart_teeth(patient):
+    """
+    Read-only fast path producing the same dicts as DentalChartToothSerializer over
+    get_dental_chart_teeth_queryset(), built straight from values() rows.
+    Skips the per-field serializer machinery and model instantiation, one query per level.
+    """
+    teeth = list(
+        DentalChartTooth.objects.filter(patient=patient).order_by('number').values(
+            'id', 'number', 'dentition_type', 'name', 'quadrant'
+        )
+    )
+    if not teeth:
+        return []
+
+    chart = {}
+    for tooth in teeth:
+        chart[tooth['id']] = {
+            'number': tooth['number'],
+            'dentition_type': tooth['dentition_type'],
+            'name': tooth['name'],
+            'quadrant': tooth['quadrant'],
+            'conditions': [],
+            'procedures': [],
+        }
+
+    conditions = DentalChartCondition.objects.filter(tooth__patient=patient).order_by('id').values(
+        'id', 'tooth_id', 'condition_id', 'condition__name', 'condition__code', 'surface',
+        'description', 'severity', 'created_at', 'updated_at',
+        *_user_values('created_by__'), *_user_values('updated_by__')
+    )
+    for row in conditions:
+        data = {
+            'id': row['id'],
+            'condition_id': row['condition_id'],
+            'condition_name': row['condition__name'],
+            'condition_code': row['condition__code'],
+            'surface': row['surface'],
+            'description': row['description'],
+            'severity': row['severity'],
+            'created_at': _format_datetime(row['created_at']),
+            'updated_at': _format_datetime(row['updated_at']),
+            'created_by': _user_name(row, 'created_by__'),
+            'updated_by': _user_name(row, 'updated_by__'),
+        }
+        chart[row['tooth_id']]['conditions'].append(data)
+
+    procedures = {}
+    for row in DentalChartProcedure.objects.filter(tooth__patient=patient).order_by('id').values(
+        'id', 'tooth_id', 'procedure_id', 'procedure__name', 'procedure__code', 'surface',
+        'description', 'date_performed', 'price', 'status', 'created_at', *_user_values('performed_by__')
+    ):
+        data = {
+            'id': row['id'],
+            'procedure_id': row['procedure_id'],
+            'procedure_name': row['procedure__name'],
+            'procedure_code': row['procedure__code'],
+            'surface': row['surface'],
+            'description': row['description'],
+            'date_performed': _format_datetime(row['date_performed']),
+            'performed_by': _user_name(row, 'performed_by__'),
+            'price': _price_field.to_representation(row['price']) if row['price'] is not None else None,
+            'status': row['status'],
+            'created_at': _format_datetime(row['created_at']),
+            'progress_notes': [],
+        }
+        procedures[row['id']] = data
+        chart[row['tooth_id']]['procedures'].append(data)
+
+    if procedures:
+        notes = ProcedureNote.objects.filter(procedure_id__in=procedures).order_by('-appointment_date').values(
+            'id', 'procedure_id', 'note', 'appointment_date', 'created_at',
+            *_user_values('created_by__'), 'created_by__username'
+        )
+        for row in notes:
+            created_by = None
+            if row['created_by__id'] is not None:
+                created_by = _full_name(row, 'created_by__') or row['created_by__username']
+            procedures[row['procedure_id']]['progress_notes'].append({
+                'id': row['id'],
+                'note': row['note'],
+                'appointment_date': _format_datetime(row['appointment_date']),
+                'created_by': created_by,
+                'created_at': _format_datetime(row['created_at']),
+            })
+
+    return list(chart.values())
+
+def get_fast_chart_payload(patient, version, last_updated, teeth):
+    """Fast path equivalent of DentalChartViewSerializer over dicts from get_fast_chart_teeth()."""
+    return {
+        'id': patient.id,
+        'patient_id': patient.id,
+        'patient_name': patient.name,
+        'last_updated': _format_datetime(last_updated),
+        'version': version,
+        'permanent_teeth': [tooth for tooth in teeth if tooth['dentition_type'] == 'permanent'],
+        'primary_teeth': [tooth for tooth in teeth if tooth['dentition_type'] == 'primary'],
+    }
+
+# Static tooth metadata of the compact chart format, a tooth matching its template entry is sent as its index
+COMPACT_TOOTH_FIELDS = ['number', 'dentition_type', 'name', 'quadrant']
+COMPACT_TOOTH_TEMPLATE = [
+    [tooth_data['number'], dentition_type, tooth_data['name'], tooth_data['quadrant']]
+    for dentition_type, template in (('permanent', PERMANENT_TEETH), ('primary', PRIMARY_TEETH))
+    for tooth_data in template
+]
+_COMPACT_TEMPLATE_INDEX = {tuple(row): index for index, row in enumerate(COMPACT_TOOTH_TEMPLATE)}
+
+def _columns(rows, fields, **extra):
+    columns = {field: [row[field] for row in rows] for field in fields}
+    columns.update(extra)
+    return columns
+
+def compact_chart(data):
+    """
+    Re-encode a DentalChartViewSerializer payload in the compact format.
+    Teeth are template indexes (or inline [number, dentition_type, name, quadrant] rows for
+    teeth off the template) and conditions, procedures and notes are columnar arrays whose
+    'tooth' and 'procedure' columns point back into the teeth and procedures lists.
+    """
+    teeth, conditions, procedures, notes = [], [], [], []
+    condition_teeth, procedure_teeth, note_procedures = [], [], []
+    for tooth in list(data['permanent_teeth']) + list(data['primary_teeth']):
+        tooth_index = len(teeth)
+        row = [tooth[field] for field in COMPACT_TOOTH_FIELDS]
+        teeth.append(_COMPACT_TEMPLATE_INDEX.get(tuple(row), row))
+        for condition in tooth['conditions']:
+            conditions.append(condition)
+            condition_teeth.append(tooth_index)
+        for procedure in tooth['procedures']:
+            for note in procedure['progress_notes']:
+                notes.append(note)
+                note_procedures.append(len(procedures))
+            procedures.append(procedure)
+            procedure_teeth.append(tooth_index)
+
+    condition_fields = DentalChartConditionSerializer.Meta.fields
+    procedure_fields = [field for field in DentalChartProcedureSerializer.Meta.fields if field != 'progress_notes']
+    return {
+        'format': 'compact',
+        'id': data['id'],
+        'patient_id': data['patient_id'],
+        'patient_name': data['patient_name'],
+        'last_updated': data['last_updated'],
+        'version': data['version'],
+        'tooth_fields': COMPACT_TOOTH_FIELDS,
+        'teeth': teeth,
+        'conditions': _columns(conditions, condition_fields, tooth=condition_teeth),
+        'procedures': _columns(procedures, procedure_fields, tooth=procedure_teeth),
+        'progress_notes': _columns(notes, ProcedureNoteSerializer.Meta.fields, procedure=note_procedures),
+    }
+
+def get_chart_version(patient):
+    """
+    Return the (version, last_updated) watermark of the patient's dental chart.
+    Free when the patient was loaded with select_related('dental_chart_state').
+    """
+    try:
+        state = patient.dental_chart_state
+    except DentalChartState.DoesNotExist:
+        # Nothing has been charted for this patient yet
+        return 0, None
+    return state.version, state.last_updated
+
+def get_chart_last_updated(patient):
+    """Return when the patient's dental chart was last written, from its watermark row."""
+    return get_chart_version(patient)[1]
+
 class DentalChartSerializer(serializers.ModelSerializer):
     teeth = DentalChartToothSerializer(source='dental_chart_teeth', many=True, read_only=True)
     patient_name = serializers.CharField(source='name', read_only=True)
@@ -81,22 +330,7 @@ class DentalChartSerializer(serializers.ModelSerializer):
         fields = ['id', 'patient_name', 'last_updated', 'teeth']
     
     def get_last_updated(self, obj):
-        # Get the most recent update to any tooth condition or procedure
-        latest_condition = DentalChartCondition.objects.filter(
-            tooth__patient=obj
-        ).order_by('-updated_at').first()
-        
-        latest_procedure = DentalChartProcedure.objects.filter(
-            tooth__patient=obj
-        ).order_by('-created_at').first()
-        
-        if latest_condition and latest_procedure:
-            return max(latest_condition.updated_at, latest_procedure.created_at)
-        elif latest_condition:
-            return latest_condition.updated_at
-        elif latest_procedure:
-            return latest_procedure.created_at
-        return None
+        return get_chart_last_updated(obj)
 
 class ChartHistorySerializer(serializers.ModelSerializer):
     action_display = serializers.CharField(source='get_action_display')
@@ -106,22 +340,25 @@ class ChartHistorySerializer(serializers.ModelSerializer):
         model = ChartHistory
         fields = ['id', 'date', 'action', 'action_display', 'tooth_number', 
                  'category', 'details', 'user_name']
+        list_serializer_class = UserNameListSerializer
+        user_fields = ['user']
     
     def get_user_name(self, obj):
-        return obj.user.get_full_name() or obj.user.username
+        return get_user_name_resolver(self.context).display_name(obj.user_id)
 
 class DentalChartViewSerializer(serializers.Serializer):
     id = serializers.IntegerField()
     patient_id = serializers.IntegerField()
     patient_name = serializers.CharField()
     last_updated = serializers.DateTimeField()
+    version = serializers.IntegerField()
     permanent_teeth = DentalChartToothSerializer(many=True)
     primary_teeth = DentalChartToothSerializer(many=True)
 
 class GeneralProcedureSerializer(serializers.ModelSerializer):
     procedure_name = serializers.CharField(source='procedure.name', read_only=True)
     procedure_code = serializers.CharField(source='procedure.code', read_only=True)
-    performed_by = serializers.CharField(source='dentist.get_full_name', read_only=True)
+    performed_by = serializers.SerializerMethodField()
     procedure_id = serializers.IntegerField(write_only=True)
 
     class Meta:
@@ -135,4 +372,86 @@ class GeneralProcedureSerializer(serializers.ModelSerializer):
                            'created_at', 'updated_at']
         extra_kwargs = {
             'procedure_id': {'required': True}
-        } 
\ No newline at end of file
+        }
+        list_serializer_class = UserNameListSerializer
+        user_fields = ['dentist']
+
+    def get_performed_by(self, obj):
+        return get_user_name_resolver(self.context).full_name(obj.dentist_id)
+
+def _tooth_entries(entries, serializer_class):
+    # Delta clients need to know which tooth to patch
+    data = serializer_class(entries, many=True).data
+    return [
+        {'tooth_number': entry.tooth.number, 'dentition_type': entry.tooth.dentition_type, **row}
+        for entry, row in zip(entries, data)
+    ]
+
+def get_chart_changes(patient, since, until):
+    """
+    Collect every chart entry written in versions since+1 through until.
+    Entries that still exist come back in full under 'updated', deleted ones by id
+    under 'removed'. Costs one query for the change log plus one per entry type.
+    """
+    touched = {'condition': set(), 'procedure': set(), 'general_procedure': set()}
+    changes = DentalChartChange.objects.filter(
+        patient=patient, version__gt=since, version__lte=until
+    ).values_list('kind', 'object_id').distinct()
+    for kind, object_id in changes:
+        touched[kind].add(object_id)
+
+    # An empty id__in never reaches the database
+    conditions = list(DentalChartCondition.objects.filter(
+        tooth__patient=patient, id__in=touched['condition']
+    ).select_related('tooth', 'condition', 'created_by', 'updated_by').order_by('id'))
+    procedures = list(DentalChartProcedure.objects.filter(
+        tooth__patient=patient, id__in=touched['procedure']
+    ).select_related('tooth', 'procedure', 'performed_by').prefetch_related(
+        Prefetch('notes', queryset=ProcedureNote.objects.select_related('created_by'))
+    ).order_by('id'))
+    general_procedures = list(GeneralProcedure.objects.filter(
+        patient=patient, id__in=touched['general_procedure']
+    ).select_related('procedure', 'dentist').order_by('id'))
+
+    return {
+        'conditions': {
+            'updated': _tooth_entries(conditions, DentalChartConditionSerializer),
+            'removed': sorted(touched['condition'] - {entry.id for entry in conditions}),
+        },
+        'procedures': {
+            'updated': _tooth_entries(procedures, DentalChartProcedureSerializer),
+            'removed': sorted(touched['procedure'] - {entry.id for entry in procedures}),
+        },
+        'general_procedures': {
+            'updated': GeneralProcedureSerializer(general_procedures, many=True).data,
+            'removed': sorted(touched['general_procedure'] - {entry.id for entry in general_procedures}),
+        },
+    }
+
+class ChartBatchOperationSerializer(serializers.Serializer):
+    """One condition or procedure to record on a tooth in a batch charting request."""
+    TYPES = ['condition', 'procedure']
+
+    type = serializers.ChoiceField(choices=TYPES)
+    tooth_number = serializers.CharField(max_length=10)
+    dentition_type = serializers.ChoiceField(choices=['permanent', 'primary'])
+    condition_id = serializers.IntegerField(required=False)
+    procedure_id = serializers.IntegerField(required=False)
+    surface = serializers.CharField(max_length=50, required=False, allow_blank=True, default='')
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+    severity = serializers.ChoiceField(choices=DentalChartCondition.SEVERITY_CHOICES, required=False)
+    date_performed = serializers.DateTimeField(required=False, allow_null=True)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, allow_null=True)
+    status = serializers.ChoiceField(choices=DentalChartProcedure.STATUS_CHOICES, required=False)
+
+    def validate(self, data):
+        catalog_field = f"{data['type']}_id"
+        if data.get(catalog_field) is None:
+            raise serializers.ValidationError({catalog_field: 'This field is required.'})
+        is_primary = data['tooth_number'].isalpha()
+        if is_primary != (data['dentition_type'] == 'primary'):
+            raise serializers.ValidationError({'dentition_type': 'Dentition type must match tooth number format'})
+        return data
+
+class ChartBatchSerializer(serializers.Serializer):
+    operations = ChartBatchOperationSerializer(many=True, allow_empty=False, max_length=200)
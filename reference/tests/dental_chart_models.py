@@ -1,9 +1,13 @@
-from django.db import models
+from django.db import models, transaction
+from django.conf import settings
 from django.contrib.auth.models import User
-from api.models import Patient, Clinic
+from api.models import Patient, Clinic, ClinicMembership
+from api.cache import get_chart_cache, get_catalog_cache, get_chart_names_cache
+from api.search import CatalogSearchIndex
 from django.utils import timezone
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, post_save, pre_delete, post_delete
 from django.dispatch import receiver
+from django.core.exceptions import ObjectDoesNotExist
 
 class DentalCondition(models.Model):
     """Model for dental conditions like cavity, fracture, etc."""
@@ -176,96 +180,425 @@ class GeneralProcedure(models.Model):
     def __str__(self):
         return f"{self.procedure.name} for {self.patient.name} on {self.date_performed or 'Not performed'}"
 
-@receiver(post_save, sender=Patient)
-def create_dental_chart(sender, instance, created, **kwargs):
-    """Create dental chart teeth when a patient is created."""
-    if created:
-        # Define permanent teeth data using FDI system
-        permanent_teeth_data = [
-            # Upper Right (1st quadrant)
-            {'number': '11', 'name': 'Upper Right Central Incisor', 'quadrant': 'upper_right'},
-            {'number': '12', 'name': 'Upper Right Lateral Incisor', 'quadrant': 'upper_right'},
-            {'number': '13', 'name': 'Upper Right Canine', 'quadrant': 'upper_right'},
-            {'number': '14', 'name': 'Upper Right First Premolar', 'quadrant': 'upper_right'},
-            {'number': '15', 'name': 'Upper Right Second Premolar', 'quadrant': 'upper_right'},
-            {'number': '16', 'name': 'Upper Right First Molar', 'quadrant': 'upper_right'},
-            {'number': '17', 'name': 'Upper Right Second Molar', 'quadrant': 'upper_right'},
-            {'number': '18', 'name': 'Upper Right Third Molar', 'quadrant': 'upper_right'},
-            
-            # Upper Left (2nd quadrant)
-            {'number': '21', 'name': 'Upper Left Central Incisor', 'quadrant': 'upper_left'},
-            {'number': '22', 'name': 'Upper Left Lateral Incisor', 'quadrant': 'upper_left'},
-            {'number': '23', 'name': 'Upper Left Canine', 'quadrant': 'upper_left'},
-            {'number': '24', 'name': 'Upper Left First Premolar', 'quadrant': 'upper_left'},
-            {'number': '25', 'name': 'Upper Left Second Premolar', 'quadrant': 'upper_left'},
-            {'number': '26', 'name': 'Upper Left First Molar', 'quadrant': 'upper_left'},
-            {'number': '27', 'name': 'Upper Left Second Molar', 'quadrant': 'upper_left'},
-            {'number': '28', 'name': 'Upper Left Third Molar', 'quadrant': 'upper_left'},
-            
-            # Lower Left (3rd quadrant)
-            {'number': '31', 'name': 'Lower Left Central Incisor', 'quadrant': 'lower_left'},
-            {'number': '32', 'name': 'Lower Left Lateral Incisor', 'quadrant': 'lower_left'},
-            {'number': '33', 'name': 'Lower Left Canine', 'quadrant': 'lower_left'},
-            {'number': '34', 'name': 'Lower Left First Premolar', 'quadrant': 'lower_left'},
-            {'number': '35', 'name': 'Lower Left Second Premolar', 'quadrant': 'lower_left'},
-            {'number': '36', 'name': 'Lower Left First Molar', 'quadrant': 'lower_left'},
-            {'number': '37', 'name': 'Lower Left Second Molar', 'quadrant': 'lower_left'},
-            {'number': '38', 'name': 'Lower Left Third Molar', 'quadrant': 'lower_left'},
-            
-            # Lower Right (4th quadrant)
-            {'number': '41', 'name': 'Lower Right Central Incisor', 'quadrant': 'lower_right'},
-            {'number': '42', 'name': 'Lower Right Lateral Incisor', 'quadrant': 'lower_right'},
-            {'number': '43', 'name': 'Lower Right Canine', 'quadrant': 'lower_right'},
-            {'number': '44', 'name': 'Lower Right First Premolar', 'quadrant': 'lower_right'},
-            {'number': '45', 'name': 'Lower Right Second Premolar', 'quadrant': 'lower_right'},
-            {'number': '46', 'name': 'Lower Right First Molar', 'quadrant': 'lower_right'},
-            {'number': '47', 'name': 'Lower Right Second Molar', 'quadrant': 'lower_right'},
-            {'number': '48', 'name': 'Lower Right Third Molar', 'quadrant': 'lower_right'},
-        ]
-        
-        # Define primary teeth data
-        primary_teeth_data = [
-            # Upper Right
-            {'number': 'A', 'name': 'Upper Right Primary Second Molar', 'quadrant': 'upper_right'},
-            {'number': 'B', 'name': 'Upper Right Primary First Molar', 'quadrant': 'upper_right'},
-            {'number': 'C', 'name': 'Upper Right Primary Canine', 'quadrant': 'upper_right'},
-            {'number': 'D', 'name': 'Upper Right Primary Lateral Incisor', 'quadrant': 'upper_right'},
-            {'number': 'E', 'name': 'Upper Right Primary Central Incisor', 'quadrant': 'upper_right'},
-            
-            # Upper Left
-            {'number': 'F', 'name': 'Upper Left Primary Central Incisor', 'quadrant': 'upper_left'},
-            {'number': 'G', 'name': 'Upper Left Primary Lateral Incisor', 'quadrant': 'upper_left'},
-            {'number': 'H', 'name': 'Upper Left Primary Canine', 'quadrant': 'upper_left'},
-            {'number': 'I', 'name': 'Upper Left Primary First Molar', 'quadrant': 'upper_left'},
-            {'number': 'J', 'name': 'Upper Left Primary Second Molar', 'quadrant': 'upper_left'},
-            
-            # Lower Left
-            {'number': 'K', 'name': 'Lower Left Primary Second Molar', 'quadrant': 'lower_left'},
-            {'number': 'L', 'name': 'Lower Left Primary First Molar', 'quadrant': 'lower_left'},
-            {'number': 'M', 'name': 'Lower Left Primary Canine', 'quadrant': 'lower_left'},
-            {'number': 'N', 'name': 'Lower Left Primary Lateral Incisor', 'quadrant': 'lower_left'},
-            {'number': 'O', 'name': 'Lower Left Primary Central Incisor', 'quadrant': 'lower_left'},
-            
-            # Lower Right
-            {'number': 'P', 'name': 'Lower Right Primary Central Incisor', 'quadrant': 'lower_right'},
-            {'number': 'Q', 'name': 'Lower Right Primary Lateral Incisor', 'quadrant': 'lower_right'},
-            {'number': 'R', 'name': 'Lower Right Primary Canine', 'quadrant': 'lower_right'},
-            {'number': 'S', 'name': 'Lower Right Primary First Molar', 'quadrant': 'lower_right'},
-            {'number': 'T', 'name': 'Lower Right Primary Second Molar', 'quadrant': 'lower_right'},
+class DentalChartState(models.Model):
+    """Denormalized per-patient dental chart watermark, bumped on every chart write."""
+    patient = models.OneToOneField(Patient, on_delete=models.CASCADE, related_name='dental_chart_state')
+    last_updated = models.DateTimeField(null=True, blank=True)
+    version = models.PositiveBigIntegerField(default=0)  # Incremented on every chart write
+
+    def __str__(self):
+        return f"Dental chart of {self.patient.name} updated {self.last_updated}"
+
+class DentalChartChange(models.Model):
+    """Append-only log of the chart entries touched by each chart version, used for delta sync."""
+    KINDS = [
+        ('condition', 'Condition'),
+        ('procedure', 'Procedure'),
+        ('general_procedure', 'General Procedure'),
+    ]
+    
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='dental_chart_changes')
+    version = models.PositiveBigIntegerField()
+    kind = models.CharField(max_length=20, choices=KINDS)
+    object_id = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', 'version'])
         ]
-        
-        # Create permanent teeth records
-        for tooth_data in permanent_teeth_data:
-            DentalChartTooth.objects.create(
-                patient=instance,
-                dentition_type='permanent',
-                **tooth_data
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} in version {self.version} of patient {self.patient_id}"
+
+def touch_dental_chart(patient_id, timestamp=None, create=True):
+    """
+    Move the patient's dental chart watermark forward to `timestamp` (now by default)
+    and increment its version. Returns the new version, or None if there is no state row.
+    """
+    timestamp = timestamp or timezone.now()
+    with transaction.atomic():
+        updated = DentalChartState.objects.filter(patient_id=patient_id).update(
+            last_updated=timestamp,
+            version=models.F('version') + 1
+        )
+        if not updated and create:
+            _, created = DentalChartState.objects.get_or_create(
+                patient_id=patient_id,
+                defaults={'last_updated': timestamp, 'version': 1}
             )
-        
-        # Create primary teeth records
-        for tooth_data in primary_teeth_data:
-            DentalChartTooth.objects.create(
-                patient=instance,
-                dentition_type='primary',
-                **tooth_data
-            )
\ No newline at end of file
+            if not created:
+                # Another request created the row in between, bump it like the update above
+                return touch_dental_chart(patient_id, timestamp, create=False)
+        # The row stays locked until commit, so this is the version our write produced
+        return DentalChartState.objects.filter(
+            patient_id=patient_id
+        ).values_list('version', flat=True).first()
+
+CHART_ENTRY_MODELS = (DentalChartCondition, DentalChartProcedure, ProcedureNote, GeneralProcedure)
+
+def _chart_patient_id(instance):
+    """Resolve the patient a dental chart row belongs to."""
+    try:
+        if isinstance(instance, GeneralProcedure):
+            return instance.patient_id
+        if isinstance(instance, ProcedureNote):
+            return instance.procedure.tooth.patient_id
+        return instance.tooth.patient_id
+    except ObjectDoesNotExist:
+        # The parent rows are already gone, e.g. while the patient is being deleted
+        return None
+
+def _chart_change_key(instance):
+    """Return the (kind, object_id) a delta sync client has to refetch for a written row."""
+    if isinstance(instance, DentalChartCondition):
+        return 'condition', instance.id
+    if isinstance(instance, GeneralProcedure):
+        return 'general_procedure', instance.id
+    if isinstance(instance, ProcedureNote):
+        # Notes travel inside their procedure
+        return 'procedure', instance.procedure_id
+    return 'procedure', instance.id
+
+def record_chart_changes(patient_id, entries, create=True):
+    """
+    Bump the patient's chart version once for `entries`, log them for delta sync
+    and drop the cached chart. Used by the signals and by bulk writes, which skip them.
+    """
+    return _record_chart_change_keys(patient_id, {_chart_change_key(entry) for entry in entries}, create)
+
+def _record_chart_change_keys(patient_id, keys, create=True):
+    with transaction.atomic():
+        version = touch_dental_chart(patient_id, create=create)
+        if version:
+            DentalChartChange.objects.bulk_create([
+                DentalChartChange(patient_id=patient_id, version=version, kind=kind, object_id=object_id)
+                for kind, object_id in keys
+            ])
+    get_chart_cache().invalidate(patient_id)
+    return version
+
+def _record_chart_write(instance, create=True):
+    patient_id = _chart_patient_id(instance)
+    if patient_id:
+        record_chart_changes(patient_id, [instance], create=create)
+
+@receiver(post_save, sender=DentalChartCondition)
+@receiver(post_save, sender=DentalChartProcedure)
+@receiver(post_save, sender=ProcedureNote)
+@receiver(post_save, sender=GeneralProcedure)
+def dental_chart_saved(sender, instance, **kwargs):
+    """Bump the chart version, log the change and drop the cached chart when an entry is written."""
+    _record_chart_write(instance)
+
+@receiver(post_delete, sender=DentalChartCondition)
+@receiver(post_delete, sender=DentalChartProcedure)
+@receiver(post_delete, sender=ProcedureNote)
+@receiver(post_delete, sender=GeneralProcedure)
+def dental_chart_deleted(sender, instance, origin=None, **kwargs):
+    """Bump the chart version, log the change and drop the cached chart when an entry is removed."""
+    if _deleted_with(origin, (Patient, Clinic)):
+        # Cascade from a patient or clinic delete, the whole chart goes away and there is nothing left to sync
+        return
+    if _deleted_with(origin, (DentalCondition, DentalProcedure)):
+        # Logged once per patient by catalog_entry_deleted
+        return
+    # Never create a state row here, the patient may be on its way out too
+    _record_chart_write(instance, create=False)
+
+def _deleted_with(origin, model_classes):
+    """Whether a delete started from an instance or queryset of one of `model_classes`."""
+    if origin is None:
+        return False
+    # A queryset delete reports the queryset as its origin
+    origin_model = origin.model if isinstance(origin, models.QuerySet) else type(origin)
+    return issubclass(origin_model, model_classes)
+
+@receiver(pre_delete, sender=DentalCondition)
+@receiver(pre_delete, sender=DentalProcedure)
+def catalog_entry_deleting(sender, instance, origin=None, **kwargs):
+    """Remember the chart entries a condition or procedure takes with it, grouped by patient."""
+    if _deleted_with(origin, (Clinic,)):
+        return
+    if isinstance(instance, DentalCondition):
+        kind, entries = 'condition', DentalChartCondition.objects.filter(condition=instance)
+    else:
+        kind, entries = 'procedure', DentalChartProcedure.objects.filter(procedure=instance)
+    instance._chart_changes = {}
+    for patient_id, object_id in entries.values_list('tooth__patient_id', 'id'):
+        instance._chart_changes.setdefault(patient_id, set()).add((kind, object_id))
+
+@receiver(post_delete, sender=DentalCondition)
+@receiver(post_delete, sender=DentalProcedure)
+def catalog_entry_deleted(sender, instance, **kwargs):
+    """Log the removal of the chart entries a deleted condition or procedure cascaded to, one version per patient."""
+    for patient_id, keys in getattr(instance, '_chart_changes', {}).items():
+        _record_chart_change_keys(patient_id, keys, create=False)
+
+# Tooth template shared by every dental chart, permanent teeth use the FDI system
+PERMANENT_TEETH = [
+    # Upper Right (1st quadrant)
+    {'number': '11', 'name': 'Upper Right Central Incisor', 'quadrant': 'upper_right'},
+    {'number': '12', 'name': 'Upper Right Lateral Incisor', 'quadrant': 'upper_right'},
+    {'number': '13', 'name': 'Upper Right Canine', 'quadrant': 'upper_right'},
+    {'number': '14', 'name': 'Upper Right First Premolar', 'quadrant': 'upper_right'},
+    {'number': '15', 'name': 'Upper Right Second Premolar', 'quadrant': 'upper_right'},
+    {'number': '16', 'name': 'Upper Right First Molar', 'quadrant': 'upper_right'},
+    {'number': '17', 'name': 'Upper Right Second Molar', 'quadrant': 'upper_right'},
+    {'number': '18', 'name': 'Upper Right Third Molar', 'quadrant': 'upper_right'},
+    
+    # Upper Left (2nd quadrant)
+    {'number': '21', 'name': 'Upper Left Central Incisor', 'quadrant': 'upper_left'},
+    {'number': '22', 'name': 'Upper Left Lateral Incisor', 'quadrant': 'upper_left'},
+    {'number': '23', 'name': 'Upper Left Canine', 'quadrant': 'upper_left'},
+    {'number': '24', 'name': 'Upper Left First Premolar', 'quadrant': 'upper_left'},
+    {'number': '25', 'name': 'Upper Left Second Premolar', 'quadrant': 'upper_left'},
+    {'number': '26', 'name': 'Upper Left First Molar', 'quadrant': 'upper_left'},
+    {'number': '27', 'name': 'Upper Left Second Molar', 'quadrant': 'upper_left'},
+    {'number': '28', 'name': 'Upper Left Third Molar', 'quadrant': 'upper_left'},
+    
+    # Lower Left (3rd quadrant)
+    {'number': '31', 'name': 'Lower Left Central Incisor', 'quadrant': 'lower_left'},
+    {'number': '32', 'name': 'Lower Left Lateral Incisor', 'quadrant': 'lower_left'},
+    {'number': '33', 'name': 'Lower Left Canine', 'quadrant': 'lower_left'},
+    {'number': '34', 'name': 'Lower Left First Premolar', 'quadrant': 'lower_left'},
+    {'number': '35', 'name': 'Lower Left Second Premolar', 'quadrant': 'lower_left'},
+    {'number': '36', 'name': 'Lower Left First Molar', 'quadrant': 'lower_left'},
+    {'number': '37', 'name': 'Lower Left Second Molar', 'quadrant': 'lower_left'},
+    {'number': '38', 'name': 'Lower Left Third Molar', 'quadrant': 'lower_left'},
+    
+    # Lower Right (4th quadrant)
+    {'number': '41', 'name': 'Lower Right Central Incisor', 'quadrant': 'lower_right'},
+    {'number': '42', 'name': 'Lower Right Lateral Incisor', 'quadrant': 'lower_right'},
+    {'number': '43', 'name': 'Lower Right Canine', 'quadrant': 'lower_right'},
+    {'number': '44', 'name': 'Lower Right First Premolar', 'quadrant': 'lower_right'},
+    {'number': '45', 'name': 'Lower Right Second Premolar', 'quadrant': 'lower_right'},
+    {'number': '46', 'name': 'Lower Right First Molar', 'quadrant': 'lower_right'},
+    {'number': '47', 'name': 'Lower Right Second Molar', 'quadrant': 'lower_right'},
+    {'number': '48', 'name': 'Lower Right Third Molar', 'quadrant': 'lower_right'},
+]
+
+PRIMARY_TEETH = [
+    # Upper Right
+    {'number': 'A', 'name': 'Upper Right Primary Second Molar', 'quadrant': 'upper_right'},
+    {'number': 'B', 'name': 'Upper Right Primary First Molar', 'quadrant': 'upper_right'},
+    {'number': 'C', 'name': 'Upper Right Primary Canine', 'quadrant': 'upper_right'},
+    {'number': 'D', 'name': 'Upper Right Primary Lateral Incisor', 'quadrant': 'upper_right'},
+    {'number': 'E', 'name': 'Upper Right Primary Central Incisor', 'quadrant': 'upper_right'},
+    
+    # Upper Left
+    {'number': 'F', 'name': 'Upper Left Primary Central Incisor', 'quadrant': 'upper_left'},
+    {'number': 'G', 'name': 'Upper Left Primary Lateral Incisor', 'quadrant': 'upper_left'},
+    {'number': 'H', 'name': 'Upper Left Primary Canine', 'quadrant': 'upper_left'},
+    {'number': 'I', 'name': 'Upper Left Primary First Molar', 'quadrant': 'upper_left'},
+    {'number': 'J', 'name': 'Upper Left Primary Second Molar', 'quadrant': 'upper_left'},
+    
+    # Lower Left
+    {'number': 'K', 'name': 'Lower Left Primary Second Molar', 'quadrant': 'lower_left'},
+    {'number': 'L', 'name': 'Lower Left Primary First Molar', 'quadrant': 'lower_left'},
+    {'number': 'M', 'name': 'Lower Left Primary Canine', 'quadrant': 'lower_left'},
+    {'number': 'N', 'name': 'Lower Left Primary Lateral Incisor', 'quadrant': 'lower_left'},
+    {'number': 'O', 'name': 'Lower Left Primary Central Incisor', 'quadrant': 'lower_left'},
+    
+    # Lower Right
+    {'number': 'P', 'name': 'Lower Right Primary Central Incisor', 'quadrant': 'lower_right'},
+    {'number': 'Q', 'name': 'Lower Right Primary Lateral Incisor', 'quadrant': 'lower_right'},
+    {'number': 'R', 'name': 'Lower Right Primary Canine', 'quadrant': 'lower_right'},
+    {'number': 'S', 'name': 'Lower Right Primary First Molar', 'quadrant': 'lower_right'},
+    {'number': 'T', 'name': 'Lower Right Primary Second Molar', 'quadrant': 'lower_right'},
+]
+
+# Template entry per tooth number, numbers and letters never overlap
+TOOTH_TEMPLATE = {
+    **{tooth['number']: dict(tooth, dentition_type='permanent') for tooth in PERMANENT_TEETH},
+    **{tooth['number']: dict(tooth, dentition_type='primary') for tooth in PRIMARY_TEETH},
+}
+
+def uses_virtual_teeth():
+    """
+    Whether charts keep their teeth virtual (DENTAL_CHART_VIRTUAL_TEETH setting).
+    In that mode a tooth row only exists once a condition or procedure is attached to it.
+    """
+    return getattr(settings, 'DENTAL_CHART_VIRTUAL_TEETH', False)
+
+def provision_dental_chart_teeth(patient):
+    """
+    Create the patient's template teeth with a single bulk insert.
+    Teeth the patient already has are left untouched.
+    """
+    teeth = [
+        DentalChartTooth(patient=patient, dentition_type='permanent', **tooth_data)
+        for tooth_data in PERMANENT_TEETH
+    ] + [
+        DentalChartTooth(patient=patient, dentition_type='primary', **tooth_data)
+        for tooth_data in PRIMARY_TEETH
+    ]
+    DentalChartTooth.objects.bulk_create(teeth, ignore_conflicts=True)
+
+def get_chart_tooth(patient, number):
+    """
+    Return the patient's tooth for `number` without writing anything. A tooth that has no row
+    yet comes back unsaved from the template, save_chart_tooth() stores it with the first entry
+    charted on it. Returns None when the number is neither on the chart nor in the template.
+    """
+    number = str(number)
+    tooth = DentalChartTooth.objects.filter(patient=patient, number=number).first()
+    if tooth is not None or number not in TOOTH_TEMPLATE:
+        return tooth
+    
+    template = TOOTH_TEMPLATE[number]
+    return DentalChartTooth(
+        patient=patient,
+        number=number,
+        dentition_type=template['dentition_type'],
+        name=template['name'],
+        quadrant=template['quadrant']
+    )
+
+def save_chart_tooth(tooth):
+    """
+    Return the stored row of a tooth from get_chart_tooth(), creating it if it was unsaved.
+    Call it in the transaction inserting the entry charted on the tooth, so a rejected
+    entry leaves no row behind.
+    """
+    if tooth.pk is not None:
+        return tooth
+    
+    if not uses_virtual_teeth():
+        # Provisioning was deferred, materialize the whole chart like the signal would have
+        provision_dental_chart_teeth(tooth.patient)
+        return DentalChartTooth.objects.get(patient=tooth.patient, number=tooth.number)
+    
+    # Another request may have stored the tooth meanwhile
+    stored, _ = DentalChartTooth.objects.get_or_create(
+        patient=tooth.patient,
+        number=tooth.number,
+        dentition_type=tooth.dentition_type,
+        defaults={'name': tooth.name, 'quadrant': tooth.quadrant}
+    )
+    return stored
+
+def get_chart_teeth(patient, numbers):
+    """
+    Batch version of get_chart_tooth: return {number: tooth} for every number on the chart
+    or in the template, creating missing rows with at most one insert.
+    """
+    numbers = {str(number) for number in numbers}
+    teeth = {
+        tooth.number: tooth
+        for tooth in DentalChartTooth.objects.filter(patient=patient, number__in=numbers)
+    }
+    missing = {number for number in numbers - teeth.keys() if number in TOOTH_TEMPLATE}
+    if not missing:
+        return teeth
+    
+    if not uses_virtual_teeth():
+        provision_dental_chart_teeth(patient)
+    else:
+        DentalChartTooth.objects.bulk_create([
+            DentalChartTooth(
+                patient=patient,
+                number=number,
+                dentition_type=TOOTH_TEMPLATE[number]['dentition_type'],
+                name=TOOTH_TEMPLATE[number]['name'],
+                quadrant=TOOTH_TEMPLATE[number]['quadrant']
+            )
+            for number in missing
+        ], ignore_conflicts=True)
+    # Re-read so ids are set even for rows a concurrent request inserted first
+    teeth.update(
+        (tooth.number, tooth)
+        for tooth in DentalChartTooth.objects.filter(patient=patient, number__in=missing)
+    )
+    return teeth
+
+@receiver(post_save, sender=Patient)
+def create_dental_chart(sender, instance, created, **kwargs):
+    """
+    Create dental chart teeth when a patient is created.
+    With DENTAL_CHART_DEFER_TEETH enabled the teeth are created when the chart is first touched,
+    with DENTAL_CHART_VIRTUAL_TEETH only the teeth that get charted are ever created.
+    """
+    if not created or uses_virtual_teeth():
+        return
+    if not getattr(settings, 'DENTAL_CHART_DEFER_TEETH', False):
+        provision_dental_chart_teeth(instance)
+
+class ClinicCatalog:
+    """
+    Snapshot of a clinic's dental conditions and procedures, keyed by id in name order.
+    Search indexes are built once with the snapshot and cached along with it.
+    """
+
+    def __init__(self, conditions, procedures):
+        self.conditions = {condition.id: condition for condition in conditions}
+        self.procedures = {procedure.id: procedure for procedure in procedures}
+        self.indexes = {
+            'conditions': CatalogSearchIndex(conditions),
+            'procedures': CatalogSearchIndex(procedures),
+        }
+
+    def search(self, kind, query):
+        """Return the 'conditions' or 'procedures' matching `query`, best match first."""
+        return self.indexes[kind].search(query)
+
+def get_clinic_catalog(clinic_id, fresh=False):
+    """
+    Return the clinic's condition and procedure catalogs from the catalog cache.
+    Lookups by id are free once the catalog is cached, fresh=True reads the database instead.
+    """
+    def load():
+        return ClinicCatalog(
+            list(DentalCondition.objects.filter(clinic_id=clinic_id).order_by('name', 'id')),
+            list(DentalProcedure.objects.filter(clinic_id=clinic_id).order_by('name', 'id'))
+        )
+    if fresh:
+        return load()
+    return get_catalog_cache().get(clinic_id, load)
+
+@receiver(post_save, sender=DentalCondition)
+@receiver(post_delete, sender=DentalCondition)
+@receiver(post_save, sender=DentalProcedure)
+@receiver(post_delete, sender=DentalProcedure)
+def clinic_catalog_changed(sender, instance, **kwargs):
+    """Move the clinic's catalog to a new version when a condition or procedure changes."""
+    invalidate_clinic_catalog(instance.clinic_id)
+
+# User fields rendered charts show as author names
+CHART_NAME_FIELDS = ('first_name', 'last_name', 'username')
+
+def _chart_names(user):
+    # Read from __dict__ as touching a deferred field would load it right here
+    return tuple(user.__dict__.get(field) for field in CHART_NAME_FIELDS)
+
+@receiver(post_init, sender=User)
+def remember_chart_names(sender, instance, **kwargs):
+    instance._chart_names = _chart_names(instance)
+
+@receiver(post_save, sender=User)
+def chart_user_renamed(sender, instance, created=False, **kwargs):
+    """
+    Move the chart names of a renamed user's clinics to a new version. Rendered charts embed
+    the names of their authors and are cached and validated against that version.
+    """
+    names = _chart_names(instance)
+    if created or names == instance._chart_names:
+        # New users wrote nothing yet, logins and password changes keep the names
+        return
+    instance._chart_names = names
+    for clinic_id in ClinicMembership.objects.filter(user=instance).values_list('clinic_id', flat=True):
+        invalidate_chart_names(clinic_id)
+
+def invalidate_clinic_catalog(clinic_id):
+    """Move the clinic's catalog, and the condition and procedure names charts show from it, to a new version."""
+    catalog_cache = get_catalog_cache()
+    catalog_cache.invalidate(clinic_id)
+    # Again once committed, a read racing this write may have cached the old rows meanwhile
+    transaction.on_commit(lambda: catalog_cache.invalidate(clinic_id))
+
+def invalidate_chart_names(clinic_id):
+    """Move the user names the clinic's charts show to a new version."""
+    names_cache = get_chart_names_cache()
+    names_cache.invalidate(clinic_id)
+    # Again once committed, a chart rendered meanwhile may have cached the old names
+    transaction.on_commit(lambda: names_cache.invalidate(clinic_id))
@@ -4,6 +4,12 @@ from rest_framework import status
 from django.contrib.auth.models import User
 from datetime import datetime, timedelta, date
 from api.models import Appointment, Patient, Clinic, ClinicMembership
+from api.models.schedule import DentistSchedule
+from api.scheduling import bitmap_intervals, pack_bitmap
+from api.serializers.appointments import AppointmentDetailSerializer
+from rest_framework.exceptions import ValidationError
+from django.core.management import call_command
+from io import StringIO
 
 @pytest.mark.django_db
 class TestAppointmentEndpoints:
@@ -137,6 +143,39 @@ class TestAppointmentEndpoints:
         assert appointment.patient == patient
         assert appointment.dentist == dentist
     
+    def test_create_overlapping_appointment(self, authenticated_client, user, clinic, clinic_membership, patient, dentist,
+                                            dentist_membership, appointment):
+        """Test that appointments overlapping a scheduled one of the same dentist are rejected."""
+        url = reverse('clinic-appointment-list', args=[clinic.id])
+        data = {
+            'patient_id': patient.id,
+            'dentist_id': dentist.id,
+            'date': appointment.date.strftime('%Y-%m-%d'),
+            'start_time': '10:15:00',
+            'end_time': '10:45:00'
+        }
+        response = authenticated_client.post(url, data, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'overlaps' in str(response.data)
+        
+        # A stale schedule bitmap does not let a clashing booking through
+        DentistSchedule.objects.filter(dentist=dentist).update(busy=pack_bitmap(0))
+        response = authenticated_client.post(url, data, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'overlaps' in str(response.data)
+        
+        # Back to back appointments do not overlap
+        data.update(start_time='10:30:00', end_time='11:00:00')
+        response = authenticated_client.post(url, data, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        
+        # Cancelled appointments free their slot
+        appointment.status = 'cancelled'
+        appointment.save()
+        data.update(start_time='09:45:00', end_time='10:30:00')
+        response = authenticated_client.post(url, data, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+    
     def test_get_appointment_detail(self, authenticated_client, user, clinic, clinic_membership, appointment):
         """Test getting appointment details."""
         url = reverse('clinic-appointment-detail', args=[clinic.id, appointment.id])
@@ -170,6 +209,35 @@ class TestAppointmentEndpoints:
         assert str(appointment.end_time) == '11:45:00'
         assert appointment.notes == 'Updated notes'
     
+    def test_concurrent_reschedules_into_same_slot(self, clinic, patient, dentist, appointment):
+        """Test that two PATCH reschedules racing for one slot cannot both be saved."""
+        other = Appointment.objects.create(
+            clinic=clinic,
+            patient=patient,
+            dentist=dentist,
+            date=appointment.date,
+            start_time='14:00:00',
+            end_time='14:30:00',
+            status='scheduled'
+        )
+        data = {'start_time': '16:00:00', 'end_time': '16:30:00'}
+        first = AppointmentDetailSerializer(appointment, data=data, partial=True)
+        second = AppointmentDetailSerializer(other, data=data, partial=True)
+        # Both see the slot free, the dentist and date come from the appointments
+        assert first.is_valid(), first.errors
+        assert second.is_valid(), second.errors
+        
+        first.save()
+        with pytest.raises(ValidationError, match='overlaps'):
+            second.save()
+        other.refresh_from_db()
+        assert str(other.start_time) == '14:00:00'
+        
+        # A reschedule onto a taken slot is caught before saving too
+        second = AppointmentDetailSerializer(other, data={'start_time': '16:15:00', 'end_time': '16:45:00'}, partial=True)
+        assert not second.is_valid()
+        assert 'overlaps' in str(second.errors)
+    
     def test_cancel_appointment(self, authenticated_client, user, clinic, clinic_membership, appointment):
         """Test canceling an appointment."""
         url = reverse('clinic-appointment-cancel', args=[clinic.id, appointment.id])
@@ -186,6 +254,40 @@ class TestAppointmentEndpoints:
         response = authenticated_client.post(url)
         assert response.status_code == status.HTTP_400_BAD_REQUEST
     
+    def test_dentist_schedule_follows_appointments(self, authenticated_client, user, clinic, clinic_membership, appointment):
+        """Test that the dentist's schedule bitmap is kept in step as an appointment moves and is cancelled."""
+        def busy():
+            schedule = DentistSchedule.objects.get(dentist=appointment.dentist, date=appointment.date)
+            return bitmap_intervals(schedule.bitmap)
+        
+        assert busy() == [[10 * 60, 10 * 60 + 30]]
+        
+        url = reverse('clinic-appointment-detail', args=[clinic.id, appointment.id])
+        response = authenticated_client.patch(url, {'start_time': '11:00:00', 'end_time': '11:45:00'}, format='json')
+        assert response.status_code == status.HTTP_200_OK
+        assert busy() == [[11 * 60, 11 * 60 + 45]]
+        
+        response = authenticated_client.post(reverse('clinic-appointment-cancel', args=[clinic.id, appointment.id]))
+        assert response.status_code == status.HTTP_200_OK
+        assert busy() == []
+    
+    def test_rebuild_dentist_schedules(self, appointment):
+        """Test that the rebuild command reports and repairs schedules out of step with the appointments."""
+        DentistSchedule.objects.filter(dentist=appointment.dentist).update(busy=pack_bitmap(0))
+        
+        out = StringIO()
+        call_command('rebuild_dentist_schedules', '--check', stdout=out)
+        assert 'schedule has free, appointments have 10:00-10:30' in out.getvalue()
+        assert DentistSchedule.objects.get(dentist=appointment.dentist).bitmap == 0
+        
+        call_command('rebuild_dentist_schedules', stdout=StringIO())
+        schedule = DentistSchedule.objects.get(dentist=appointment.dentist)
+        assert bitmap_intervals(schedule.bitmap) == [[10 * 60, 10 * 60 + 30]]
+        
+        out = StringIO()
+        call_command('rebuild_dentist_schedules', '--check', stdout=out)
+        assert '0 schedules out of step' in out.getvalue()
+    
     def test_update_appointment_status(self, authenticated_client, user, clinic, clinic_membership, appointment):
         """Test updating appointment status."""
         url = reverse('clinic-appointment-update-status', args=[clinic.id, appointment.id])
@@ -3,6 +3,9 @@ from django.urls import reverse
 from django.contrib.auth.models import User
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from api.models import Clinic, ClinicMembership
 
 @pytest.mark.django_db
 class TestAuthentication:
@@ -22,6 +25,45 @@ class TestAuthentication:
         assert 'refresh' in response.data
         assert 'user' in response.data
     
+    def test_login_reads_memberships_once(self, api_client, user, clinic, clinic_membership):
+        """Test that login builds the clinics from one cached membership list, refreshed on membership changes."""
+        url = reverse('token_obtain_pair')
+        data = {
+            'username': 'testuser',
+            'password': 'testpassword'
+        }
+        
+        def membership_queries(queries):
+            return [query for query in queries.captured_queries if 'api_clinicmembership' in query['sql']]
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.post(url, data, format='json')
+        assert response.status_code == status.HTTP_200_OK
+        assert len(membership_queries(queries)) == 1
+        assert response.data['clinics'] == [
+            {'id': clinic.id, 'name': 'Test Clinic', 'role': 'admin', 'is_primary': True}
+        ]
+        assert response.data['current_clinic'] == {'id': clinic.id, 'name': 'Test Clinic', 'role': 'admin'}
+        
+        # Served from the cache until the memberships change
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.post(url, data, format='json')
+        assert len(membership_queries(queries)) == 0
+        
+        clinic_membership.is_primary = False
+        clinic_membership.save()
+        other_clinic = Clinic.objects.create(name='Other Clinic')
+        ClinicMembership.objects.create(user=user, clinic=other_clinic, role='dentist', is_primary=True)
+        response = api_client.post(url, data, format='json')
+        assert len(response.data['clinics']) == 2
+        assert response.data['current_clinic']['id'] == other_clinic.id
+        
+        # Renaming a clinic refreshes its members too
+        other_clinic.name = 'Renamed Clinic'
+        other_clinic.save()
+        response = api_client.post(url, data, format='json')
+        assert response.data['current_clinic']['name'] == 'Renamed Clinic'
+    
     def test_login_invalid_credentials(self, api_client, user):
         """Test login with invalid credentials."""
         url = reverse('token_obtain_pair')
@@ -1,12 +1,23 @@
+import json
 import pytest
+from io import StringIO
+from django.core.management import call_command
 from django.urls import reverse
 from rest_framework import status
 from django.contrib.auth.models import User
-from datetime import datetime
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from datetime import datetime, timedelta
+from api.cache import PROCESS_LOCAL_TIMEOUT, VersionedCache, check_versioned_caches, get_catalog_cache
 from api.models import Clinic, ClinicMembership, Patient
 from api.models.dental_chart import (
     DentalCondition, DentalProcedure, DentalChartTooth, 
-    DentalChartCondition, DentalChartProcedure, ChartHistory
+    DentalChartCondition, DentalChartProcedure, ChartHistory, DentalChartState, ProcedureNote,
+    ClinicCatalog, get_chart_tooth, save_chart_tooth
+)
+from api.serializers.dental_chart import (
+    ChartHistorySerializer, DentalChartToothSerializer, DentalChartViewSerializer, get_dental_chart_teeth_queryset,
+    get_fast_chart_teeth, get_fast_chart_payload
 )
 from django.utils import timezone
 
@@ -549,7 +560,7 @@ class TestDentalChartEndpoints:
         response = authenticated_client.get(url)
         
         assert response.status_code == status.HTTP_200_OK
-        assert response.data['count'] == 2  # Check count in paginated response
+        assert response.data['next'] is None  # Everything fits on the first page
         assert len(response.data['results']) == 2  # Check results in paginated response
 
     def test_create_custom_dental_condition(self, authenticated_client, user, clinic, clinic_membership):
@@ -786,6 +797,25 @@ class TestDentalChartEndpoints:
         for condition in response.data['results']:
             assert 'cavity' in condition['name'].lower() or 'cavity' in condition['description'].lower()
 
+    def test_search_dental_procedures_ranked(self, authenticated_client, user, clinic,
+                                             clinic_membership, standard_dental_procedures):
+        """Test prefix, code and typo tolerant catalog search with ranked results."""
+        url = reverse('dental-procedures', args=[clinic.id])
+        
+        def search(query):
+            response = authenticated_client.get(url, {'search': query})
+            assert response.status_code == status.HTTP_200_OK
+            return [procedure['name'] for procedure in response.data['results']]
+        
+        assert search('extr') == ['Extraction - Simple', 'Extraction - Surgical']
+        assert search('extractoin') == ['Extraction - Simple', 'Extraction - Surgical']
+        assert search('D3330')[0] == 'Root Canal - Molar'
+        assert search('root canal mol')[0] == 'Root Canal - Molar'
+        assert set(search('root canal')[:3]) == {
+            'Root Canal - Anterior', 'Root Canal - Premolar', 'Root Canal - Molar'
+        }
+        assert search('zzz') == []
+
     def test_filter_dental_procedures_by_category(self, authenticated_client, user, clinic, 
                                                  clinic_membership, standard_dental_procedures):
         """Test filtering dental procedures by category."""
@@ -1104,6 +1134,581 @@ class TestDentalChartEndpoints:
         response = authenticated_client.get(url)
         
         assert response.status_code == status.HTTP_200_OK
-        assert response.data['count'] == 1  # Check count in paginated response
+        assert response.data['next'] is None  # Everything fits on the first page
         assert len(response.data['results']) == 1  # Check results in paginated response
-        assert response.data['results'][0]['tooth_number'] == '1' 
\ No newline at end of file
+        assert response.data['results'][0]['tooth_number'] == '1'
+        
+        # Test filtering by date range, malformed dates are rejected
+        url = reverse('dental-chart-history', kwargs={
+            'clinic_id': clinic.id,
+            'patient_id': patient_with_teeth.id
+        })
+        today = timezone.now().date()
+        response = authenticated_client.get(url, {'start_date': (today - timedelta(days=1)).isoformat()})
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['results']) == 2
+        for bad_date in ('yesterday', '2024-02-30'):
+            response = authenticated_client.get(url, {'end_date': bad_date})
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+            assert 'end_date' in response.data
+
+    def test_chart_watermark_tracks_writes(self, authenticated_client, user, clinic,
+                                          clinic_membership, patient_with_teeth, dental_condition):
+        """Test that chart writes move the watermark read by last_updated."""
+        tooth = DentalChartTooth.objects.get(
+            patient=patient_with_teeth,
+            number='1',
+            dentition_type='permanent'
+        )
+        condition = DentalChartCondition.objects.create(
+            tooth=tooth,
+            condition=dental_condition,
+            surface='occlusal',
+            created_by=user
+        )
+        
+        state = DentalChartState.objects.get(patient=patient_with_teeth)
+        assert state.last_updated >= condition.updated_at
+        first_watermark = state.last_updated
+        
+        condition.delete()
+        state.refresh_from_db()
+        assert state.last_updated > first_watermark
+        
+        url = reverse('dental-chart', kwargs={
+            'clinic_id': clinic.id,
+            'patient_id': patient_with_teeth.id
+        })
+        response = authenticated_client.get(url)
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['last_updated'] is not None
+
+    def test_get_chart_history_cursor_pagination(self, authenticated_client, user, clinic,
+                                                clinic_membership, patient_with_teeth):
+        """Test walking the chart history page by page with the keyset cursor."""
+        for i in range(5):
+            ChartHistory.objects.create(
+                patient=patient_with_teeth,
+                user=user,
+                action='add_condition' if i % 2 else 'add_procedure',
+                tooth_number='1',
+                category='conditions' if i % 2 else 'procedures',
+                details={'index': i}
+            )
+        
+        url = reverse('dental-chart-history', kwargs={
+            'clinic_id': clinic.id,
+            'patient_id': patient_with_teeth.id
+        }) + '?page_size=2'
+        
+        seen = []
+        while url:
+            response = authenticated_client.get(url)
+            assert response.status_code == status.HTTP_200_OK
+            assert len(response.data['results']) <= 2
+            seen.extend(entry['details']['index'] for entry in response.data['results'])
+            url = response.data['next']
+        
+        assert seen == [4, 3, 2, 1, 0]
+        
+        # Filter by action
+        url = reverse('dental-chart-history', kwargs={
+            'clinic_id': clinic.id,
+            'patient_id': patient_with_teeth.id
+        }) + '?action=add_condition'
+        response = authenticated_client.get(url)
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert [entry['details']['index'] for entry in response.data['results']] == [3, 1]
+        assert response.data['results'][0]['user_name'] == user.username
+
+
+    def test_get_chart_changes_since_version(self, authenticated_client, user, clinic, clinic_membership,
+                                             patient_with_teeth, dental_condition, dental_procedure):
+        """Test that the delta endpoint returns only entries written after the client's version."""
+        tooth = DentalChartTooth.objects.get(
+            patient=patient_with_teeth,
+            number='1',
+            dentition_type='permanent'
+        )
+        kept = DentalChartCondition.objects.create(
+            tooth=tooth,
+            condition=dental_condition,
+            surface='occlusal',
+            created_by=user
+        )
+        removed = DentalChartCondition.objects.create(
+            tooth=tooth,
+            condition=dental_condition,
+            surface='mesial',
+            created_by=user
+        )
+        
+        chart_url = reverse('dental-chart', kwargs={
+            'clinic_id': clinic.id,
+            'patient_id': patient_with_teeth.id
+        })
+        since = authenticated_client.get(chart_url).data['version']
+        
+        removed_id = removed.id
+        # Queryset deletes are logged as well as instance deletes
+        DentalChartCondition.objects.filter(id=removed_id).delete()
+        procedure = DentalChartProcedure.objects.create(
+            tooth=tooth,
+            procedure=dental_procedure,
+            surface='occlusal',
+            performed_by=user,
+            price=120.00
+        )
+        
+        url = reverse('dental-chart-changes', kwargs={
+            'clinic_id': clinic.id,
+            'patient_id': patient_with_teeth.id
+        })
+        response = authenticated_client.get(url, {'since': since})
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['version'] == since + 2
+        assert response.data['conditions']['updated'] == []
+        assert response.data['conditions']['removed'] == [removed_id]
+        assert [entry['id'] for entry in response.data['procedures']['updated']] == [procedure.id]
+        assert response.data['procedures']['updated'][0]['tooth_number'] == '1'
+        assert kept.id not in response.data['conditions']['removed']
+        
+        # Nothing new since the latest version
+        response = authenticated_client.get(url, {'since': since + 2})
+        assert response.data['procedures'] == {'updated': [], 'removed': []}
+        
+        # Versions the chart never had, or no version at all, are rejected
+        assert authenticated_client.get(url, {'since': since + 3}).status_code == status.HTTP_400_BAD_REQUEST
+        assert authenticated_client.get(url).status_code == status.HTTP_400_BAD_REQUEST
+        
+        # Deleting a catalog condition logs the chart entries it cascades to
+        dental_condition.delete()
+        response = authenticated_client.get(url, {'since': since + 2})
+        assert response.data['version'] == since + 3
+        assert response.data['conditions']['removed'] == [kept.id]
+
+class DentalChartFeatureFixtures:
+    """Catalog entries and a charted patient shared by the chart feature tests below."""
+    
+    @pytest.fixture
+    def dental_condition(self, clinic):
+        """Create and return a test dental condition."""
+        return DentalCondition.objects.create(
+            clinic=clinic,
+            name='Cavity',
+            code='CAV',
+            description='Tooth decay or cavity',
+            color_code='#FF0000',
+            icon='cavity-icon'
+        )
+    
+    @pytest.fixture
+    def dental_procedure(self, clinic):
+        """Create and return a test dental procedure."""
+        return DentalProcedure.objects.create(
+            clinic=clinic,
+            name='Amalgam Filling',
+            code='D2140',
+            description='Amalgam filling - one surface',
+            category='restorative',
+            default_price=120.00,
+            duration_minutes=30
+        )
+    
+    @pytest.fixture
+    def patient(self, clinic):
+        """Create and return a patient with a full set of teeth."""
+        patient = Patient.objects.create(
+            clinic=clinic,
+            name='Test Patient',
+            age=30,
+            gender='M',
+            phone='1234567890'
+        )
+        if not DentalChartTooth.objects.filter(patient=patient).exists():
+            DentalChartTooth.objects.bulk_create([
+                DentalChartTooth(
+                    patient=patient,
+                    number=str(number),
+                    name=f'Tooth {number}',
+                    quadrant='upper_right',
+                    dentition_type='permanent'
+                )
+                for number in range(11, 19)
+            ])
+        return patient
+    
+    def chart_url(self, clinic, patient):
+        return reverse('dental-chart', kwargs={
+            'clinic_id': clinic.id,
+            'patient_id': patient.id
+        })
+    
+    def chart_entries(self, patient, user, dental_condition, dental_procedure, teeth):
+        """Add a condition and a procedure with a note to each of the given teeth."""
+        for tooth in teeth:
+            DentalChartCondition.objects.create(
+                tooth=tooth,
+                condition=dental_condition,
+                surface='occlusal',
+                created_by=user,
+                updated_by=user
+            )
+            procedure = DentalChartProcedure.objects.create(
+                tooth=tooth,
+                procedure=dental_procedure,
+                surface='occlusal',
+                performed_by=user,
+                price=120.00
+            )
+            ProcedureNote.objects.create(
+                procedure=procedure,
+                note='Follow-up',
+                appointment_date=timezone.now(),
+                created_by=user
+            )
+
+@pytest.mark.django_db
+class TestChartTeethProvisioning(DentalChartFeatureFixtures):
+    """Test when the tooth rows of a chart get created."""
+    
+    def test_deferred_teeth_created_on_first_chart_read(self, authenticated_client, clinic,
+                                                      clinic_membership, settings):
+        """Test that deferred provisioning creates the teeth when the chart is first read."""
+        settings.DENTAL_CHART_DEFER_TEETH = True
+        patient = Patient.objects.create(
+            clinic=clinic,
+            name='Deferred Patient',
+            age=25,
+            gender='F',
+            phone='5555555555'
+        )
+        assert not DentalChartTooth.objects.filter(patient=patient).exists()
+        
+        response = authenticated_client.get(self.chart_url(clinic, patient))
+        
+        assert len(response.data['permanent_teeth']) == 32
+        assert len(response.data['primary_teeth']) == 20
+    
+    def test_virtual_teeth_materialized_on_first_entry(self, authenticated_client, user, clinic,
+                                                      clinic_membership, settings, dental_condition):
+        """Test that virtual charts only store rows for teeth that have been charted."""
+        settings.DENTAL_CHART_VIRTUAL_TEETH = True
+        patient = Patient.objects.create(
+            clinic=clinic,
+            name='Virtual Patient',
+            age=25,
+            gender='F',
+            phone='5555555555'
+        )
+        assert not DentalChartTooth.objects.filter(patient=patient).exists()
+        
+        # Resolving a tooth writes nothing, a rejected entry leaves no row behind
+        tooth = get_chart_tooth(patient, '36')
+        assert tooth.pk is None
+        with pytest.raises(IntegrityError), transaction.atomic():
+            DentalChartCondition.objects.create(tooth=save_chart_tooth(tooth), condition=None, created_by=user)
+        assert not DentalChartTooth.objects.filter(patient=patient).exists()
+        
+        with transaction.atomic():
+            tooth = save_chart_tooth(tooth)
+            DentalChartCondition.objects.create(
+                tooth=tooth,
+                condition=dental_condition,
+                surface='occlusal',
+                created_by=user
+            )
+        assert get_chart_tooth(patient, '36') == tooth
+        assert get_chart_tooth(patient, '99') is None
+        assert DentalChartTooth.objects.filter(patient=patient).count() == 1
+        
+        response = authenticated_client.get(self.chart_url(clinic, patient))
+        
+        assert len(response.data['permanent_teeth']) == 32
+        assert len(response.data['primary_teeth']) == 20
+        charted = [tooth for tooth in response.data['permanent_teeth'] if tooth['conditions']]
+        assert len(charted) == 1
+        assert charted[0]['number'] == '36'
+        assert charted[0]['name'] == 'Lower Left First Molar'
+    
+    def test_backfill_command_creates_missing_teeth_and_resumes(self, clinic, settings, tmp_path):
+        """Test that the backfill command fills gaps in batches and skips complete charts."""
+        settings.DENTAL_CHART_DEFER_TEETH = True
+        patients = [
+            Patient.objects.create(
+                clinic=clinic,
+                name=f'Patient {i}',
+                age=30,
+                gender='M',
+                phone='1234567890'
+            )
+            for i in range(3)
+        ]
+        # Second patient already has one of the teeth
+        DentalChartTooth.objects.create(
+            patient=patients[1],
+            number='11',
+            name='Upper Right Central Incisor',
+            quadrant='upper_right',
+            dentition_type='permanent'
+        )
+        checkpoint = tmp_path / 'backfill.checkpoint'
+        
+        out = StringIO()
+        call_command('backfill_dental_chart_teeth', batch_size=2, checkpoint=str(checkpoint), stdout=out)
+        
+        for patient in patients:
+            assert DentalChartTooth.objects.filter(patient=patient).count() == 52
+        assert 'teeth/s' in out.getvalue()
+        assert not checkpoint.exists()
+        
+        # Resume from a checkpoint left behind by an interrupted run
+        checkpoint.write_text('{"last_patient_id": %d, "patients": 2, "teeth_created": 103}' % patients[1].id)
+        DentalChartTooth.objects.filter(patient=patients[0], number='A').delete()
+        out = StringIO()
+        call_command('backfill_dental_chart_teeth', batch_size=2, checkpoint=str(checkpoint), stdout=out)
+        
+        assert 'Resuming after patient' in out.getvalue()
+        assert not DentalChartTooth.objects.filter(patient=patients[0], number='A').exists()
+        assert DentalChartTooth.objects.filter(number='11', patient__in=patients).count() == 3
+
+@pytest.mark.django_db
+class TestDentalChartBatch(DentalChartFeatureFixtures):
+    """Test the transactional batch endpoint of the dental chart."""
+    
+    def test_batch_chart_entries_rejected_as_a_whole(self, authenticated_client, clinic, clinic_membership,
+                                                     patient, settings, dental_condition, dental_procedure):
+        """Test that a batch with one bad operation writes nothing."""
+        url = reverse('dental-chart-batch', kwargs={
+            'clinic_id': clinic.id,
+            'patient_id': patient.id
+        })
+        
+        # One bad operation rejects the whole batch
+        response = authenticated_client.post(url, {'operations': [
+            {'type': 'condition', 'tooth_number': '11', 'dentition_type': 'permanent',
+             'condition_id': dental_condition.id},
+            {'type': 'procedure', 'tooth_number': '11', 'dentition_type': 'permanent',
+             'procedure_id': dental_procedure.id + 1000},
+        ]}, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not DentalChartCondition.objects.filter(tooth__patient=patient).exists()
+        
+        # So does an unknown tooth, without leaving rows of the other teeth behind
+        settings.DENTAL_CHART_VIRTUAL_TEETH = True
+        DentalChartTooth.objects.filter(patient=patient, number='36').delete()
+        response = authenticated_client.post(url, {'operations': [
+            {'type': 'condition', 'tooth_number': '36', 'dentition_type': 'permanent',
+             'condition_id': dental_condition.id},
+            {'type': 'condition', 'tooth_number': '99', 'dentition_type': 'permanent',
+             'condition_id': dental_condition.id},
+        ]}, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not DentalChartTooth.objects.filter(patient=patient, number='36').exists()
+
+@pytest.mark.django_db
+class TestCompactChart(DentalChartFeatureFixtures):
+    """Test the compact columnar encoding of the dental chart."""
+    
+    def test_compact_chart_matches_full_chart(self, authenticated_client, user, clinic, clinic_membership,
+                                              patient, dental_condition, dental_procedure):
+        """Test that the compact encoding carries the same chart in a smaller payload."""
+        teeth = list(DentalChartTooth.objects.filter(patient=patient).order_by('id'))
+        self.chart_entries(patient, user, dental_condition, dental_procedure, teeth[:3])
+        url = reverse('dental-chart', kwargs={
+            'clinic_id': clinic.id,
+            'patient_id': patient.id
+        })
+        full = authenticated_client.get(url)
+        compact = authenticated_client.get(url, {'format': 'compact'})
+        
+        assert compact.status_code == status.HTTP_200_OK
+        assert compact['ETag'] != full['ETag']
+        assert len(compact.content) < len(full.content)
+        
+        template = authenticated_client.get(reverse('dental-chart-tooth-template', kwargs={
+            'clinic_id': clinic.id
+        })).data
+        data = compact.data
+        
+        # Decode the compact payload back into nested teeth
+        def rows(columns, *skip):
+            fields = [field for field in columns if field not in skip]
+            return [dict(zip(fields, values)) for values in zip(*(columns[field] for field in fields))]
+        
+        decoded = []
+        for tooth in data['teeth']:
+            values = template['teeth'][tooth] if isinstance(tooth, int) else tooth
+            decoded.append({**dict(zip(data['tooth_fields'], values)), 'conditions': [], 'procedures': []})
+        for tooth, condition in zip(data['conditions']['tooth'], rows(data['conditions'], 'tooth')):
+            decoded[tooth]['conditions'].append(condition)
+        procedures = rows(data['procedures'], 'tooth')
+        for procedure in procedures:
+            procedure['progress_notes'] = []
+        for index, note in zip(data['progress_notes']['procedure'], rows(data['progress_notes'], 'procedure')):
+            procedures[index]['progress_notes'].append(note)
+        for tooth, procedure in zip(data['procedures']['tooth'], procedures):
+            decoded[tooth]['procedures'].append(procedure)
+        
+        expected = [
+            {**tooth, 'conditions': [dict(c) for c in tooth['conditions']],
+             'procedures': [{**p, 'progress_notes': [dict(n) for n in p['progress_notes']]} for p in tooth['procedures']]}
+            for tooth in full.data['permanent_teeth'] + full.data['primary_teeth']
+        ]
+        assert decoded == expected
+        assert data['version'] == full.data['version']
+
+@pytest.mark.django_db
+class TestFastChartPath(DentalChartFeatureFixtures):
+    """Test the values() fast path the chart is served from."""
+    
+    def serialized_chart(self, patient):
+        """Serialize the chart with the DRF serializers the fast path replaces."""
+        return DentalChartToothSerializer(
+            get_dental_chart_teeth_queryset().filter(patient=patient), many=True
+        ).data
+    
+    def test_fast_chart_path_matches_serializers(self, user, patient, dental_condition, dental_procedure):
+        """Test that the values() fast path builds exactly what the serializers build."""
+        teeth = list(DentalChartTooth.objects.filter(patient=patient).order_by('id'))
+        self.chart_entries(patient, user, dental_condition, dental_procedure, teeth[:3])
+        # Entries without users or prices exercise the null handling
+        DentalChartCondition.objects.create(tooth=teeth[3], condition=dental_condition)
+        procedure = DentalChartProcedure.objects.create(tooth=teeth[3], procedure=dental_procedure)
+        ProcedureNote.objects.create(procedure=procedure, note='Walk-in', appointment_date=timezone.now())
+        
+        fast = get_fast_chart_teeth(patient)
+        
+        assert json.loads(json.dumps(fast)) == json.loads(json.dumps(self.serialized_chart(patient)))
+        
+        last_updated = timezone.now()
+        chart = get_fast_chart_payload(patient, 7, last_updated, fast)
+        expected = DentalChartViewSerializer({
+            'id': patient.id,
+            'patient_id': patient.id,
+            'patient_name': patient.name,
+            'last_updated': last_updated,
+            'version': 7,
+            'permanent_teeth': get_dental_chart_teeth_queryset().filter(patient=patient, dentition_type='permanent'),
+            'primary_teeth': get_dental_chart_teeth_queryset().filter(patient=patient, dentition_type='primary'),
+        }).data
+        assert json.loads(json.dumps(chart)) == json.loads(json.dumps(expected))
+
+@pytest.mark.django_db
+class TestChartUserNames(DentalChartFeatureFixtures):
+    """Test how the chart resolves the names of the users who wrote it."""
+    
+    def test_user_names_loaded_once_per_response(self, user, patient):
+        """Test that a list response loads every referenced user in a single query."""
+        other = User.objects.create_user(username='assistant', password='x', first_name='Ann')
+        for i in range(10):
+            ChartHistory.objects.create(
+                patient=patient,
+                user=user if i % 2 else other,
+                action='add_condition',
+                tooth_number='11',
+                category='conditions',
+                details={}
+            )
+        ChartHistory.objects.create(patient=patient, user=None, action='add_condition',
+                                    tooth_number='11', details={})
+        
+        with CaptureQueriesContext(connection) as queries:
+            data = ChartHistorySerializer(ChartHistory.objects.filter(patient=patient), many=True).data
+        
+        # One query for the history, one for both users
+        assert len(queries) == 2
+        names = {entry['user_name'] for entry in data}
+        assert names == {user.get_full_name() or user.username, 'Ann', None}
+
+@pytest.mark.django_db
+class TestClinicCatalogCache(DentalChartFeatureFixtures):
+    """Test the versioned cache the clinic's conditions and procedures are read from."""
+    
+    def test_catalog_served_from_cache_until_changed(self, authenticated_client, clinic, clinic_membership,
+                                                     patient, dental_condition, dental_procedure):
+        """Test that catalog lists and chart writes read the cached catalog until it changes."""
+        url = reverse('dental-conditions', kwargs={'clinic_id': clinic.id})
+        authenticated_client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = authenticated_client.get(url)
+        
+        assert [condition['name'] for condition in response.data['results']] == ['Cavity']
+        assert not any('dentalcondition' in query['sql'] for query in queries.captured_queries)
+        
+        # Creating an entry moves the catalog to a new version
+        response = authenticated_client.post(url, {'name': 'Abrasion', 'code': 'ABR'}, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        response = authenticated_client.get(url)
+        assert [condition['name'] for condition in response.data['results']] == ['Abrasion', 'Cavity']
+        
+        # Chart writes validate catalog ids against the cache
+        batch_url = reverse('dental-chart-batch', kwargs={
+            'clinic_id': clinic.id,
+            'patient_id': patient.id
+        })
+        with CaptureQueriesContext(connection) as queries:
+            response = authenticated_client.post(batch_url, {'operations': [
+                {'type': 'condition', 'tooth_number': '11', 'dentition_type': 'permanent',
+                 'condition_id': dental_condition.id},
+                {'type': 'procedure', 'tooth_number': '11', 'dentition_type': 'permanent',
+                 'procedure_id': dental_procedure.id},
+            ]}, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        assert not any(
+            'dentalcondition"' in query['sql'] or 'dentalprocedure"' in query['sql']
+            for query in queries.captured_queries if query['sql'].startswith('SELECT')
+        )
+        
+        dental_procedure.delete()
+        response = authenticated_client.get(reverse('dental-procedures', kwargs={'clinic_id': clinic.id}))
+        assert response.data['results'] == []
+    
+    @pytest.mark.django_db(transaction=True)
+    def test_batch_chart_entries_with_stale_catalog(self, authenticated_client, clinic, clinic_membership,
+                                                    patient, dental_condition, dental_procedure, monkeypatch):
+        """Test that batches checked against another worker's stale catalog answer 400, not 500."""
+        stale = ClinicCatalog([dental_condition], [dental_procedure])
+        monkeypatch.setattr(VersionedCache, 'get', lambda self, object_id, load: stale)
+        batch_url = reverse('dental-chart-batch', kwargs={
+            'clinic_id': clinic.id,
+            'patient_id': patient.id
+        })
+        
+        # Entries the stale catalog misses are looked up in the database
+        abrasion = DentalCondition.objects.create(clinic=clinic, name='Abrasion', code='ABR')
+        response = authenticated_client.post(batch_url, {'operations': [
+            {'type': 'condition', 'tooth_number': '11', 'dentition_type': 'permanent',
+             'condition_id': abrasion.id},
+        ]}, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        
+        # Entries it still lists after their deletion fail on their foreign key
+        DentalProcedure.objects.filter(id=dental_procedure.id).delete()
+        response = authenticated_client.post(batch_url, {'operations': [
+            {'type': 'procedure', 'tooth_number': '12', 'dentition_type': 'permanent',
+             'procedure_id': dental_procedure.id},
+        ]}, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not DentalChartProcedure.objects.filter(tooth__patient=patient).exists()
+    
+    def test_catalog_cache_on_process_local_alias(self, settings, tmp_path):
+        """Test that versioned caches private to each worker keep entries briefly and fail the deploy check."""
+        settings.CACHES = {
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'shared': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': str(tmp_path)},
+        }
+        settings.DENTAL_CATALOG_CACHE = {'ALIAS': 'default', 'TIMEOUT': 3600}
+        settings.CLINIC_MEMBERSHIP_CACHE = {'ALIAS': 'default', 'TIMEOUT': 3600}
+        assert get_catalog_cache().entry_timeout == PROCESS_LOCAL_TIMEOUT
+        errors = check_versioned_caches(None)
+        assert [error.id for error in errors] == ['api.E001', 'api.E001']
+        assert 'CLINIC_MEMBERSHIP_CACHE' in errors[1].msg
+        
+        settings.DENTAL_CATALOG_CACHE = {'ALIAS': 'shared', 'TIMEOUT': 3600}
+        settings.CLINIC_MEMBERSHIP_CACHE = {'ALIAS': 'shared', 'TIMEOUT': 3600}
+        assert get_catalog_cache().entry_timeout == 3600
+        assert check_versioned_caches(None) == []
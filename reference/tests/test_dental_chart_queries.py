@@ -0,0 +1,265 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from django.utils import timezone
+from api.cache import get_catalog_cache
+from api.models import Patient
+from api.models.dental_chart import (
+    DentalCondition, DentalProcedure, DentalChartTooth,
+    DentalChartCondition, DentalChartProcedure, ProcedureNote, ChartHistory
+)
+from django.contrib.auth.models import User
+
+@pytest.mark.django_db
+class TestDentalChartQueryCount:
+    """Test that loading a dental chart costs a fixed number of queries."""
+
+    @pytest.fixture
+    def dental_condition(self, clinic):
+        """Create and return a test dental condition."""
+        return DentalCondition.objects.create(
+            clinic=clinic,
+            name='Cavity',
+            code='CAV',
+            description='Tooth decay or cavity',
+            color_code='#FF0000',
+            icon='cavity-icon'
+        )
+
+    @pytest.fixture
+    def dental_procedure(self, clinic):
+        """Create and return a test dental procedure."""
+        return DentalProcedure.objects.create(
+            clinic=clinic,
+            name='Amalgam Filling',
+            code='D2140',
+            description='Amalgam filling - one surface',
+            category='restorative',
+            default_price=120.00,
+            duration_minutes=30
+        )
+
+    @pytest.fixture
+    def patient(self, clinic):
+        """Create and return a patient with a full set of teeth."""
+        patient = Patient.objects.create(
+            clinic=clinic,
+            name='Test Patient',
+            age=30,
+            gender='M',
+            phone='1234567890'
+        )
+        if not DentalChartTooth.objects.filter(patient=patient).exists():
+            DentalChartTooth.objects.bulk_create([
+                DentalChartTooth(
+                    patient=patient,
+                    number=str(number),
+                    name=f'Tooth {number}',
+                    quadrant='upper_right',
+                    dentition_type='permanent'
+                )
+                for number in range(11, 19)
+            ])
+        return patient
+
+    def chart_entries(self, patient, user, dental_condition, dental_procedure, teeth):
+        """Add a condition and a procedure with a note to each of the given teeth."""
+        for tooth in teeth:
+            DentalChartCondition.objects.create(
+                tooth=tooth,
+                condition=dental_condition,
+                surface='occlusal',
+                created_by=user,
+                updated_by=user
+            )
+            procedure = DentalChartProcedure.objects.create(
+                tooth=tooth,
+                procedure=dental_procedure,
+                surface='occlusal',
+                performed_by=user,
+                price=120.00
+            )
+            ProcedureNote.objects.create(
+                procedure=procedure,
+                note='Follow-up',
+                appointment_date=timezone.now(),
+                created_by=user
+            )
+
+    def count_chart_queries(self, client, clinic, patient):
+        url = reverse('dental-chart', kwargs={
+            'clinic_id': clinic.id,
+            'patient_id': patient.id
+        })
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        return len(queries), response
+
+    def test_chart_query_count_is_independent_of_chart_size(self, authenticated_client, user, clinic,
+                                                            clinic_membership, patient,
+                                                            dental_condition, dental_procedure):
+        """Test that a dense chart needs no more queries than a sparse one."""
+        teeth = list(DentalChartTooth.objects.filter(patient=patient).order_by('id'))
+        self.chart_entries(patient, user, dental_condition, dental_procedure, teeth[:1])
+        sparse_count, _ = self.count_chart_queries(authenticated_client, clinic, patient)
+
+        self.chart_entries(patient, user, dental_condition, dental_procedure, teeth[1:])
+        dense_count, response = self.count_chart_queries(authenticated_client, clinic, patient)
+
+        assert dense_count == sparse_count
+
+        charted = [
+            tooth for tooth in response.data['permanent_teeth'] + response.data['primary_teeth']
+            if tooth['conditions']
+        ]
+        assert len(charted) == len(teeth)
+        procedure = charted[0]['procedures'][0]
+        assert procedure['performed_by'] == user.get_full_name()
+        assert len(procedure['progress_notes']) == 1
+
+    def test_new_patient_teeth_created_in_one_insert(self, clinic):
+        """Test that a new patient gets the full tooth template with a single insert."""
+        with CaptureQueriesContext(connection) as queries:
+            patient = Patient.objects.create(
+                clinic=clinic,
+                name='New Patient',
+                age=25,
+                gender='F',
+                phone='5555555555'
+            )
+        
+        tooth_inserts = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('INSERT') and 'dentalcharttooth' in query['sql']
+        ]
+        assert len(tooth_inserts) == 1
+        assert DentalChartTooth.objects.filter(patient=patient, dentition_type='permanent').count() == 32
+        assert DentalChartTooth.objects.filter(patient=patient, dentition_type='primary').count() == 20
+
+    def test_conditional_chart_request_skips_chart_build(self, authenticated_client, user, clinic,
+                                                        clinic_membership, patient, dental_condition,
+                                                        dental_procedure):
+        """Test that an unchanged chart is answered with 304 from the ETag alone."""
+        teeth = list(DentalChartTooth.objects.filter(patient=patient).order_by('id'))
+        self.chart_entries(patient, user, dental_condition, dental_procedure, teeth[:2])
+        full_count, response = self.count_chart_queries(authenticated_client, clinic, patient)
+        etag = response['ETag']
+        assert response['Last-Modified']
+        
+        url = reverse('dental-chart', kwargs={
+            'clinic_id': clinic.id,
+            'patient_id': patient.id
+        })
+        with CaptureQueriesContext(connection) as queries:
+            response = authenticated_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert len(queries) < full_count
+        assert not any('dentalcharttooth' in query['sql'] for query in queries.captured_queries)
+        
+        # Any chart write changes the ETag
+        self.chart_entries(patient, user, dental_condition, dental_procedure, teeth[2:3])
+        response = authenticated_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'] != etag
+        
+        # So does renaming a catalog entry or a user the chart shows
+        etag = response['ETag']
+        dental_condition.name = 'Renamed Condition'
+        dental_condition.save()
+        response = authenticated_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        conditions = [condition for tooth in response.data['permanent_teeth'] for condition in tooth['conditions']]
+        assert {condition['condition_name'] for condition in conditions} == {'Renamed Condition'}
+        
+        etag = response['ETag']
+        catalog_version = get_catalog_cache().get_version(clinic.id)
+        user.first_name = 'Renamed'
+        user.save()
+        response = authenticated_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        conditions = [condition for tooth in response.data['permanent_teeth'] for condition in tooth['conditions']]
+        assert {condition['created_by'] for condition in conditions} == {user.get_full_name()}
+        # Names have their own version, the cached catalog stays valid
+        assert get_catalog_cache().get_version(clinic.id) == catalog_version
+        
+        # Saves that keep the names, e.g. a password change, keep the ETag
+        etag = response['ETag']
+        user = User.objects.get(id=user.id)
+        user.set_password('changed-password')
+        user.save()
+        response = authenticated_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    @pytest.mark.parametrize('chart_cache', [
+        {'BACKEND': 'api.cache.LocMemChartCache', 'OPTIONS': {'max_entries': 16}},
+        {'BACKEND': 'api.cache.SharedChartCache', 'OPTIONS': {'alias': 'default'}},
+    ])
+    def test_rendered_chart_served_from_cache_until_next_write(self, authenticated_client, user, clinic,
+                                                              clinic_membership, patient, settings,
+                                                              dental_condition, dental_procedure,
+                                                              chart_cache):
+        """Test that repeated chart reads come from the cache and writes invalidate it."""
+        settings.DENTAL_CHART_CACHE = chart_cache
+        teeth = list(DentalChartTooth.objects.filter(patient=patient).order_by('id'))
+        self.chart_entries(patient, user, dental_condition, dental_procedure, teeth[:1])
+        
+        miss_count, first = self.count_chart_queries(authenticated_client, clinic, patient)
+        hit_count, second = self.count_chart_queries(authenticated_client, clinic, patient)
+        
+        assert hit_count < miss_count
+        assert second.data == first.data
+        
+        self.chart_entries(patient, user, dental_condition, dental_procedure, teeth[1:2])
+        _, third = self.count_chart_queries(authenticated_client, clinic, patient)
+        
+        charted = [tooth for tooth in third.data['permanent_teeth'] + third.data['primary_teeth'] if tooth['conditions']]
+        assert len(charted) == 2
+
+    def test_batch_chart_entries_query_count_is_independent_of_batch_size(self, authenticated_client, clinic,
+                                                                         clinic_membership, patient,
+                                                                         dental_condition, dental_procedure):
+        """Test that a batch of findings costs the same number of queries however many it holds."""
+        url = reverse('dental-chart-batch', kwargs={
+            'clinic_id': clinic.id,
+            'patient_id': patient.id
+        })
+        
+        def post_batch(numbers):
+            operations = []
+            for number in numbers:
+                operations.append({
+                    'type': 'condition',
+                    'tooth_number': str(number),
+                    'dentition_type': 'permanent',
+                    'condition_id': dental_condition.id,
+                    'surface': 'occlusal',
+                    'severity': 'mild'
+                })
+                operations.append({
+                    'type': 'procedure',
+                    'tooth_number': str(number),
+                    'dentition_type': 'permanent',
+                    'procedure_id': dental_procedure.id,
+                    'status': 'completed'
+                })
+            with CaptureQueriesContext(connection) as queries:
+                response = authenticated_client.post(url, {'operations': operations}, format='json')
+            assert response.status_code == status.HTTP_201_CREATED
+            return len(queries), response
+        
+        # The first write also creates the chart state row
+        post_batch([11])
+        small_count, _ = post_batch([12])
+        large_count, response = post_batch(range(13, 19))
+        
+        assert large_count == small_count
+        assert len(response.data['conditions']) == 6
+        assert float(response.data['procedures'][0]['price']) == 120.00
+        assert DentalChartCondition.objects.filter(tooth__patient=patient).count() == 8
+        assert DentalChartProcedure.objects.filter(tooth__patient=patient).count() == 8
+        assert ChartHistory.objects.filter(patient=patient).count() == 16
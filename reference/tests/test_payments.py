@@ -7,6 +7,15 @@ from decimal import Decimal
 from api.models import Payment, PaymentItem, Treatment, Patient, Clinic, ClinicMembership, Appointment, Tooth, ToothCondition
 from rest_framework.test import APITestCase
 from django.utils import timezone
+from django.core.management import call_command
+from io import StringIO
+import csv
+import json
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from api.models.payment_ledger import PatientBalance
+from api.serializers.patients import PatientListSerializer
+from api.serializers.payments import PaymentSummarySerializer
 
 @pytest.mark.django_db
 class TestPaymentEndpoints:
@@ -273,6 +282,40 @@ class TestPaymentEndpoints:
         assert payment.items.first().description == 'Updated item'
         assert payment.items.first().amount == Decimal('120.00')
     
+    def test_update_payment_items_touches_only_changed_rows(self, authenticated_client, user, clinic, clinic_membership,
+                                                           payment, payment_item, treatment):
+        """Test that updating items keeps unchanged rows and rewrites only the changed ones."""
+        other_item = PaymentItem.objects.create(
+            payment=payment,
+            description='X-ray',
+            amount=30.00
+        )
+        url = reverse('clinic-payment-detail', args=[clinic.id, payment.id])
+        data = {
+            'payment_items': [
+                # Unchanged, matched on content
+                {'description': 'Filling', 'amount': '100.00', 'treatment_id': treatment.id},
+                # Changed, matched by id
+                {'id': other_item.id, 'description': 'X-ray (2 films)', 'amount': '45.00'},
+                # New
+                {'description': 'Polish', 'amount': '20.00'},
+            ]
+        }
+        response = authenticated_client.patch(url, data, format='json')
+        
+        assert response.status_code == status.HTTP_200_OK
+        items = {item.description: item for item in payment.items.all()}
+        assert set(items) == {'Filling', 'X-ray (2 films)', 'Polish'}
+        assert items['Filling'].id == payment_item.id
+        assert items['X-ray (2 films)'].id == other_item.id
+        assert items['X-ray (2 films)'].amount == Decimal('45.00')
+        
+        # Dropping an item deletes only that row
+        data['payment_items'] = data['payment_items'][:2]
+        response = authenticated_client.patch(url, data, format='json')
+        assert response.status_code == status.HTTP_200_OK
+        assert set(payment.items.values_list('id', flat=True)) == {payment_item.id, other_item.id}
+
     def test_get_patient_balance(self, authenticated_client, user, clinic, clinic_membership, patient, payment, payment_item):
         """Test getting patient balance."""
         # Create another payment for the same patient
@@ -302,6 +345,145 @@ class TestPaymentEndpoints:
         
         assert response.status_code == status.HTTP_400_BAD_REQUEST
     
+    def test_patient_balance_ledger_follows_payments(self, user, clinic, patient, payment):
+        """Test that the balance ledger is kept in step as payments are written, moved and deleted."""
+        ledger = PatientBalance.objects.get(patient=patient)
+        assert ledger.total_billed == Decimal('100.00')
+        assert ledger.balance_due == Decimal('50.00')
+        assert ledger.payment_count == 1
+        
+        payment.amount_paid = Decimal('80.00')
+        payment.save()
+        ledger.refresh_from_db()
+        assert ledger.balance_due == Decimal('20.00')
+        
+        # Moving the payment takes it off the old patient's ledger
+        other_patient = Patient.objects.create(
+            clinic=clinic,
+            name='Other Patient',
+            age=40,
+            gender='F',
+            phone='9876543210'
+        )
+        payment.patient = other_patient
+        payment.save()
+        ledger.refresh_from_db()
+        assert ledger.payment_count == 0
+        assert ledger.total_billed == Decimal('0')
+        assert other_patient.balance_ledger.total_paid == Decimal('80.00')
+        
+        Payment.objects.filter(id=payment.id).delete()
+        other_patient.balance_ledger.refresh_from_db()
+        assert other_patient.balance_ledger.payment_count == 0
+        assert PaymentSummarySerializer.for_patient(other_patient).data['balance_due'] == '0.00'
+
+    def test_patient_balances_read_from_ledger(self, authenticated_client, clinic, clinic_membership, patient, payment):
+        """Test that the balance endpoints and the patient list read the ledger, not the payments."""
+        PatientBalance.objects.filter(patient=patient).update(total_billed=Decimal('500.00'))
+
+        url = reverse('patient-balance', args=[clinic.id, patient.id])
+        with CaptureQueriesContext(connection) as queries:
+            response = authenticated_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert float(response.data['balance']) == 450.00
+        assert not any('api_payment' in query['sql'] for query in queries.captured_queries)
+
+        url = reverse('payment-patient-summary', args=[clinic.id, patient.id])
+        response = authenticated_client.get(url)
+        assert response.data['balance_due'] == '450.00'
+
+        patients = PatientListSerializer.with_balance_ledger(Patient.objects.filter(clinic=clinic))
+        with CaptureQueriesContext(connection) as queries:
+            data = PatientListSerializer(patients, many=True).data
+        assert len(queries) == 1
+        assert data[0]['balance_due'] == '450.00'
+
+    def test_reconcile_patient_balances(self, patient, payment):
+        """Test that the reconciliation command reports and repairs ledgers out of step."""
+        PatientBalance.objects.filter(patient=patient).update(total_paid=Decimal('10.00'))
+        
+        out = StringIO()
+        call_command('reconcile_patient_balances', stdout=out)
+        assert f"Patient {patient.id}: total_paid is 10.00" in out.getvalue()
+        assert '1 ledgers out of step' in out.getvalue()
+        
+        call_command('reconcile_patient_balances', '--fix', stdout=StringIO())
+        assert PatientBalance.objects.get(patient=patient).total_paid == Decimal('50.00')
+        
+        out = StringIO()
+        call_command('reconcile_patient_balances', stdout=out)
+        assert '0 ledgers out of step' in out.getvalue()
+    
+    def test_receivables_report(self, authenticated_client, user, clinic, clinic_membership, patient, payment):
+        """Test the clinic-wide receivables report with aging, streamed as CSV and NDJSON."""
+        today = date.today()
+        Payment.objects.create(
+            clinic=clinic,
+            patient=patient,
+            created_by=user,
+            payment_date=today - timedelta(days=100),
+            total_amount=300.00,
+            amount_paid=100.00,
+            payment_method='card'
+        )
+        # A balance payment settles the oldest charges first
+        Payment.objects.create(
+            clinic=clinic,
+            patient=patient,
+            created_by=user,
+            payment_date=today - timedelta(days=45),
+            total_amount=0.00,
+            amount_paid=150.00,
+            payment_method='cash'
+        )
+        settled_patient = Patient.objects.create(
+            clinic=clinic,
+            name='Settled Patient',
+            age=40,
+            gender='F',
+            phone='9876543210'
+        )
+        Payment.objects.create(
+            clinic=clinic,
+            patient=settled_patient,
+            created_by=user,
+            payment_date=today,
+            total_amount=80.00,
+            amount_paid=80.00,
+            payment_method='cash'
+        )
+        
+        url = reverse('receivables-report', args=[clinic.id])
+        with CaptureQueriesContext(connection) as queries:
+            response = authenticated_client.get(url)
+            content = b''.join(response.streaming_content).decode()
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'].startswith('text/csv')
+        report_queries = [query for query in queries.captured_queries if 'api_payment' in query['sql']]
+        assert len(report_queries) == 1
+        rows = list(csv.DictReader(StringIO(content)))
+        assert len(rows) == 1
+        assert rows[0]['patient_name'] == 'Test Patient'
+        assert rows[0]['total_billed'] == '400.00'
+        assert rows[0]['balance_due'] == '100.00'
+        assert rows[0]['current'] == '50.00'
+        assert rows[0]['days_over_90'] == '50.00'
+        assert rows[0]['days_31_60'] == '0.00'
+        
+        response = authenticated_client.get(url, {'format': 'ndjson', 'include_settled': 'true'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        assert [row['patient_name'] for row in rows] == ['Test Patient', 'Settled Patient']
+        assert rows[1]['balance_due'] == '0.00'
+        
+        # Payments after the report date are left out
+        response = authenticated_client.get(url, {'format': 'ndjson', 'as_of': (today - timedelta(days=1)).isoformat()})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        assert rows[0]['total_billed'] == '300.00'
+        
+        assert authenticated_client.get(url, {'as_of': 'someday'}).status_code == status.HTTP_400_BAD_REQUEST
+        assert authenticated_client.get(url, {'as_of': '2024-02-30'}).status_code == status.HTTP_400_BAD_REQUEST
+    
     def test_get_patient_payments(self, authenticated_client, user, clinic, clinic_membership, patient, payment, payment_item):
         """Test getting patient payments."""
         # Create another payment for the same patient
@@ -1,10 +1,16 @@
 from decimal import Decimal
 from django.utils import timezone
+from datetime import timedelta
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.urls import reverse
 from api.models import Clinic, Patient, Appointment, Payment, ClinicMembership
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from io import StringIO
+from api.models.clinic_metrics import ClinicDailyMetrics
 
 class ClinicStatsTests(APITestCase):
     def setUp(self):
@@ -69,4 +75,114 @@ class ClinicStatsTests(APITestCase):
         self.assertEqual(response.data['todayCount'], 3)
         self.assertIn('dailyChange', response.data)
         self.assertIn('monthlyRevenue', response.data)
-        self.assertIn('completionRate', response.data) 
\ No newline at end of file
+        self.assertIn('completionRate', response.data) 
+    
+    def test_stats_read_from_daily_rollup(self):
+        Payment.objects.create(
+            clinic=self.clinic,
+            patient=Patient.objects.first(),
+            created_by=self.user,
+            payment_date=timezone.now().date(),
+            total_amount=Decimal('120.00'),
+            amount_paid=Decimal('100.00'),
+            payment_method='cash'
+        )
+        
+        def table_queries(queries, table):
+            return [query for query in queries.captured_queries if f'FROM "{table}"' in query['sql']]
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('clinic-patient-stats', kwargs={'clinic_id': self.clinic.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(table_queries(queries, 'api_clinicdailymetrics')), 1)
+        self.assertEqual(len(table_queries(queries, 'api_patient')), 0)
+        # Active patients are a distinct count over the last three months of appointments
+        self.assertEqual(len(table_queries(queries, 'api_appointment')), 1)
+        self.assertEqual(response.data['newPatientsThisMonth'], 5)
+        self.assertEqual(response.data['activePatients'], 1)
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('clinic-appointment-stats', kwargs={'clinic_id': self.clinic.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(table_queries(queries, 'api_clinicdailymetrics')), 1)
+        self.assertEqual(len(table_queries(queries, 'api_appointment')), 0)
+        self.assertEqual(len(table_queries(queries, 'api_payment')), 0)
+        self.assertEqual(response.data['dailyChange'], 3)
+        self.assertEqual(response.data['monthlyRevenue'], 100.0)
+        
+        # Status changes move appointments between rollup columns
+        appointment = Appointment.objects.first()
+        appointment.status = 'completed'
+        appointment.save()
+        response = self.client.get(reverse('clinic-appointment-stats', kwargs={'clinic_id': self.clinic.id}))
+        self.assertEqual(response.data['completionRate'], 33.3)
+    
+    def test_rebuild_clinic_metrics(self):
+        today = timezone.now().date()
+        ClinicDailyMetrics.objects.filter(clinic=self.clinic, date=today).update(appointments_scheduled=0, new_patients=2)
+        
+        out = StringIO()
+        call_command('rebuild_clinic_metrics', '--check', stdout=out)
+        self.assertIn(f"Clinic {self.clinic.id} on {today}: new_patients is 2, expected 5", out.getvalue())
+        self.assertIn('appointments_scheduled is 0, expected 3', out.getvalue())
+        
+        call_command('rebuild_clinic_metrics', stdout=StringIO())
+        metrics = ClinicDailyMetrics.objects.get(clinic=self.clinic, date=today)
+        self.assertEqual((metrics.new_patients, metrics.appointments_scheduled), (5, 3))
+        
+        out = StringIO()
+        call_command('rebuild_clinic_metrics', '--check', stdout=out)
+        self.assertIn('0 out of step', out.getvalue())
+    
+    def test_stats_series(self):
+        today = timezone.now().date()
+        earlier = today - timedelta(days=10)
+        patient = Patient.objects.first()
+        Appointment.objects.create(
+            clinic=self.clinic,
+            patient=patient,
+            dentist=self.user,
+            date=earlier,
+            start_time='09:00',
+            end_time='10:00',
+            status='completed'
+        )
+        for day, amount in [(today, '100.00'), (earlier, '40.00')]:
+            Payment.objects.create(
+                clinic=self.clinic,
+                patient=patient,
+                created_by=self.user,
+                payment_date=day,
+                total_amount=Decimal(amount),
+                amount_paid=Decimal(amount),
+                payment_method='cash'
+            )
+        
+        url = reverse('clinic-stats-series', kwargs={'clinic_id': self.clinic.id})
+        params = {'start_date': (today - timedelta(days=13)).isoformat(), 'end_date': today.isoformat()}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {**params, 'bucket': 'day'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len([query for query in queries.captured_queries if 'api_clinicdailymetrics' in query['sql']]), 1)
+        # Every day of the range, quiet days included
+        self.assertEqual(len(response.data['series']), 14)
+        points = {point['period']: point for point in response.data['series']}
+        self.assertEqual(points[today.isoformat()]['appointments'], 3)
+        self.assertEqual(points[today.isoformat()]['newPatients'], 5)
+        self.assertEqual(points[earlier.isoformat()]['completionRate'], 100.0)
+        self.assertEqual(points[earlier.isoformat()]['revenue'], 40.0)
+        
+        response = self.client.get(url, {**params, 'bucket': 'week'})
+        weeks = {point['period']: point for point in response.data['series']}
+        this_week = today - timedelta(days=today.weekday())
+        self.assertEqual(list(weeks)[0], (today - timedelta(days=13 + (today - timedelta(days=13)).weekday())).isoformat())
+        self.assertEqual(weeks[this_week.isoformat()]['revenue'], 100.0)
+        self.assertEqual(sum(point['revenue'] for point in weeks.values()), 140.0)
+        self.assertEqual(sum(point['appointments'] for point in weeks.values()), 4)
+        
+        response = self.client.get(url, {**params, 'bucket': 'month'})
+        self.assertEqual(response.data['series'][-1]['period'], today.replace(day=1).isoformat())
+        self.assertEqual(sum(point['revenue'] for point in response.data['series']), 140.0)
+        
+        response = self.client.get(url, {**params, 'bucket': 'year'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -129,4 +129,53 @@ class TestTimeSlotEndpoints:
         
         # Invalid date format
         response = authenticated_client.get(url, {'dentist': dentist_user.id, 'date': 'invalid-date'})
-        assert response.status_code == status.HTTP_400_BAD_REQUEST
\ No newline at end of file
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_get_availability_for_several_dentists(self, authenticated_client, user, clinic, clinic_membership, patient,
+                                                   dentist_user, dentist_membership, appointment):
+        """Test searching open slots of several dentists at once."""
+        tomorrow = date.today() + timedelta(days=1)
+        other_dentist = User.objects.create_user(username='other_dentist', password='dentistpassword')
+        ClinicMembership.objects.create(user=other_dentist, clinic=clinic, role='dentist')
+        # Back to back bookings are merged into one busy block
+        for start, end in [(time(9, 0), time(10, 0)), (time(10, 0), time(12, 0))]:
+            Appointment.objects.create(
+                clinic=clinic,
+                patient=patient,
+                dentist=other_dentist,
+                date=tomorrow,
+                start_time=start,
+                end_time=end,
+                status='scheduled'
+            )
+        
+        url = reverse('availability', args=[clinic.id])
+        params = {
+            'dentists': f'{dentist_user.id},{other_dentist.id}',
+            'start_date': tomorrow.strftime('%Y-%m-%d'),
+            'end_date': tomorrow.strftime('%Y-%m-%d'),
+            'duration': 60
+        }
+        response = authenticated_client.get(url, params)
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['duration_minutes'] == 60
+        slots = [(slot['dentist'], slot['start_time']) for slot in response.data['slots']]
+        # The 60 minute slot at 09:30 would run into the 10:00 appointment
+        assert slots[:4] == [
+            (dentist_user.id, '09:00'),
+            (dentist_user.id, '10:30'),
+            (dentist_user.id, '11:00'),
+            (dentist_user.id, '11:30'),
+        ]
+        assert (other_dentist.id, '12:00') in slots
+        assert all(start >= '12:00' for dentist, start in slots if dentist == other_dentist.id)
+        assert slots[-1] == (other_dentist.id, '16:00')
+        
+        # First N openings from tomorrow on
+        response = authenticated_client.get(url, {'start_date': params['start_date'], 'limit': 2})
+        assert [slot['start_time'] for slot in response.data['slots']] == ['09:00', '09:30']
+        
+        # Only dentists of the clinic can be searched
+        response = authenticated_client.get(url, {'dentists': str(user.id)})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
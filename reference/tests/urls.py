@@ -12,6 +12,8 @@ from api.views import auth
 from api.views import dentists
 from api.views import dental_chart
 from api.views import stats
+from api.views import reports
+from api.views import availability
 
 router = DefaultRouter()
 # Register viewsets
@@ -48,6 +50,9 @@ urlpatterns = [
     path('clinics/<int:clinic_id>/time-slots/', 
          appointments.AppointmentViewSet.as_view({'get': 'time_slots'}), 
          name='time_slots'),
+    path('clinics/<int:clinic_id>/availability/',
+         availability.AvailabilityViewSet.as_view({'get': 'search'}),
+         name='availability'),
     
     # Dental Chart endpoints
     path('clinics/<int:clinic_id>/dental-conditions/', 
@@ -62,6 +67,15 @@ urlpatterns = [
     path('clinics/<int:clinic_id>/patients/<int:patient_id>/dental-chart/history/', 
          dental_chart.DentalChartViewSet.as_view({'get': 'get_chart_history'}),
          name='dental-chart-history'),
+    path('clinics/<int:clinic_id>/dental-chart/tooth-template/', 
+         dental_chart.DentalChartViewSet.as_view({'get': 'get_tooth_template'}),
+         name='dental-chart-tooth-template'),
+    path('clinics/<int:clinic_id>/patients/<int:patient_id>/dental-chart/changes/', 
+         dental_chart.DentalChartViewSet.as_view({'get': 'get_chart_changes'}),
+         name='dental-chart-changes'),
+    path('clinics/<int:clinic_id>/patients/<int:patient_id>/dental-chart/batch/', 
+         dental_chart.DentalChartViewSet.as_view({'post': 'batch_chart_entries'}),
+         name='dental-chart-batch'),
     path('clinics/<int:clinic_id>/patients/<int:patient_id>/dental-chart/tooth/<str:tooth_number>/condition/', 
          dental_chart.DentalChartViewSet.as_view({'post': 'add_tooth_condition'}), 
          name='add-tooth-condition'),
@@ -88,11 +102,19 @@ urlpatterns = [
         payments.PaymentViewSet.as_view({'get': 'patient_summary'}),
         name='payment-patient-summary'
     ),
+    path(
+        'clinics/<int:clinic_id>/patients/<int:patient_id>/balance/',
+        payments.PaymentViewSet.as_view({'get': 'patient_balance'}),
+        name='patient-balance'
+    ),
     path(
         'clinics/<int:clinic_id>/patients/<int:patient_id>/payment-summary-test/',
         payments.PaymentViewSet.as_view({'get': 'patient_summary_test'}),
         name='payment-patient-summary-test'
     ),
+    path('clinics/<int:clinic_id>/reports/receivables/',
+         reports.ReportViewSet.as_view({'get': 'receivables'}),
+         name='receivables-report'),
     # Stats endpoints
     path('clinics/<int:clinic_id>/stats/patients/',
          stats.ClinicStatsViewSet.as_view({'get': 'patient_stats'}),
@@ -102,6 +124,10 @@ urlpatterns = [
          stats.ClinicStatsViewSet.as_view({'get': 'appointment_stats'}),
          name='clinic-appointment-stats'),
     
+    path('clinics/<int:clinic_id>/stats/series/',
+         stats.ClinicStatsViewSet.as_view({'get': 'series'}),
+         name='clinic-stats-series'),
+    
     # General procedures endpoint
     path('clinics/<int:clinic_id>/patients/<int:patient_id>/general-procedures/',
          dental_chart.DentalChartViewSet.as_view({
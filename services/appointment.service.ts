@@ -39,6 +39,45 @@ export interface TimeSlot {
   appointment_id?: string;
 }
 
+export interface AvailableSlot {
+  dentist: number;
+  date: string;
+  start_time: string;
+  end_time: string;
+}
+
+export interface AvailabilityResponse {
+  start_date: string;
+  end_date: string;
+  duration_minutes: number;
+  slots: AvailableSlot[];
+}
+
+export interface AvailabilityQuery {
+  dentistIds?: string[];
+  startDate?: string;
+  endDate?: string;
+  duration?: number;
+  procedureId?: string;
+  limit?: number;
+}
+
+export interface StatsSeriesPoint {
+  period: string;               // First day of the bucket
+  revenue: number;
+  appointments: number;
+  completed: number;
+  completionRate: number;       // Completed out of the non-cancelled appointments, in percent
+  newPatients: number;
+}
+
+export interface StatsSeriesResponse {
+  bucket: 'day' | 'week' | 'month';
+  start_date: string;
+  end_date: string;
+  series: StatsSeriesPoint[];
+}
+
 export interface AppointmentListResponse {
   results: Appointment[];
   count: number;
@@ -182,6 +221,22 @@ export const appointmentService = {
     }));
   },
   
+  // Free slots of several dentists over a date range, e.g. the next N openings
+  getAvailability: async (
+    clinicId: string,
+    query: AvailabilityQuery = {}
+  ): Promise<AvailabilityResponse> => {
+    const queryParams = new URLSearchParams();
+    if (query.dentistIds?.length) queryParams.append('dentists', query.dentistIds.join(','));
+    if (query.startDate) queryParams.append('start_date', query.startDate);
+    if (query.endDate) queryParams.append('end_date', query.endDate);
+    if (query.duration) queryParams.append('duration', query.duration.toString());
+    if (query.procedureId) queryParams.append('procedure', query.procedureId);
+    if (query.limit) queryParams.append('limit', query.limit.toString());
+    
+    return apiGet(`/clinics/${clinicId}/availability/?${queryParams.toString()}`);
+  },
+  
   // Get appointments for a specific patient
   getPatientAppointments: async (
     clinicId: string,
@@ -239,6 +294,22 @@ export const appointmentService = {
   
   getAppointmentStats: async (clinicId: string): Promise<AppointmentStatsResponse> => {
     return apiGet(`/clinics/${clinicId}/stats/appointments/`);
+  },
+  
+  // Revenue, appointment, completion rate and new patient series bucketed by day, week or month
+  getStatsSeries: async (
+    clinicId: string,
+    startDate: string,
+    endDate: string,
+    bucket: 'day' | 'week' | 'month' = 'day'
+  ): Promise<StatsSeriesResponse> => {
+    const queryParams = new URLSearchParams({
+      start_date: startDate,
+      end_date: endDate,
+      bucket
+    });
+    
+    return apiGet(`/clinics/${clinicId}/stats/series/?${queryParams.toString()}`);
   }
 };
 
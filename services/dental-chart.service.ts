@@ -21,8 +21,8 @@ export interface ToothCondition {
   severity?: string;
   created_at: string;
   updated_at: string;
-  created_by: string;
-  updated_by: string;
+  created_by: string | null;
+  updated_by: string | null;
 }
 
 export interface ProcedureNote {
@@ -43,7 +43,7 @@ export interface ToothProcedure {
   date_performed: string;
   price: string | number;
   status: string;
-  performed_by: string;
+  performed_by: string | null;
 }
 
 export interface DentalChart {
@@ -51,10 +51,50 @@ export interface DentalChart {
   patient_id: number;
   patient_name: string;
   last_updated: string;
+  version: number;
   permanent_teeth: Tooth[];
   primary_teeth: Tooth[];
 }
 
+export type CompactTooth = number | [string, 'permanent' | 'primary', string, string];
+
+export interface CompactDentalChart {
+  format: 'compact';
+  id: number;
+  patient_id: number;
+  patient_name: string;
+  last_updated: string | null;
+  version: number;
+  tooth_fields: string[];
+  // Template index, or an inline row for teeth off the template
+  teeth: CompactTooth[];
+  // Columnar arrays keyed by field name, 'tooth' indexes into teeth
+  conditions: Record<string, any[]> & { tooth: number[] };
+  procedures: Record<string, any[]> & { tooth: number[] };
+  // 'procedure' indexes into the procedures columns
+  progress_notes: Record<string, any[]> & { procedure: number[] };
+}
+
+export interface ToothTemplate {
+  tooth_fields: string[];
+  teeth: [string, 'permanent' | 'primary', string, string][];
+}
+
+export interface ChartEntryChanges<T> {
+  updated: T[];
+  removed: number[];
+}
+
+export interface DentalChartChanges {
+  patient_id: number;
+  since: number;
+  version: number;
+  last_updated: string | null;
+  conditions: ChartEntryChanges<ToothCondition & { tooth_number: string; dentition_type: 'permanent' | 'primary' }>;
+  procedures: ChartEntryChanges<ToothProcedure & { tooth_number: string; dentition_type: 'permanent' | 'primary' }>;
+  general_procedures: ChartEntryChanges<any>;
+}
+
 export interface DentalCondition {
   id: number;
   name: string;
@@ -84,9 +124,7 @@ export interface ChartHistoryEntry {
 }
 
 export interface ChartHistoryResponse {
-  count: number;
   next: string | null;
-  previous: string | null;
   results: ChartHistoryEntry[];
 }
 
@@ -112,20 +150,77 @@ export interface AddToothConditionData {
   dentition_type: 'permanent' | 'primary';
 }
 
+export interface ChartBatchOperation {
+  type: 'condition' | 'procedure';
+  tooth_number: string;
+  dentition_type: 'permanent' | 'primary';
+  condition_id?: number;
+  procedure_id?: number;
+  surface?: string;
+  notes?: string;
+  severity?: 'mild' | 'moderate' | 'severe';
+  date_performed?: string;
+  price?: number;
+  status?: string;
+}
+
+export interface ChartBatchResponse {
+  version: number;
+  conditions: ToothCondition[];
+  procedures: ToothProcedure[];
+}
+
 export const dentalChartService = {
   // Get patient's dental chart
   getPatientDentalChart: async (clinicId: string, patientId: string): Promise<DentalChart> => {
     return apiGet(`/clinics/${clinicId}/patients/${patientId}/dental-chart/`);
   },
 
-  // Get all dental conditions
-  getDentalConditions: async (clinicId: string): Promise<ConditionsResponse> => {
-    return apiGet(`/clinics/${clinicId}/dental-conditions/`);
+  // Get patient's dental chart in the compact columnar encoding
+  getCompactDentalChart: async (clinicId: string, patientId: string): Promise<CompactDentalChart> => {
+    return apiGet(`/clinics/${clinicId}/patients/${patientId}/dental-chart/?format=compact`);
+  },
+
+  // Get the static tooth metadata compact charts refer to by index
+  getToothTemplate: async (clinicId: string): Promise<ToothTemplate> => {
+    return apiGet(`/clinics/${clinicId}/dental-chart/tooth-template/`);
+  },
+
+  // Get chart entries changed since the version the client already has
+  getDentalChartChanges: async (
+    clinicId: string,
+    patientId: string,
+    since: number
+  ): Promise<DentalChartChanges> => {
+    return apiGet(`/clinics/${clinicId}/patients/${patientId}/dental-chart/changes/?since=${since}`);
+  },
+
+  // Record many tooth conditions and procedures in one request
+  batchChartEntries: async (
+    clinicId: string,
+    patientId: string,
+    operations: ChartBatchOperation[]
+  ): Promise<ChartBatchResponse> => {
+    return apiPost(`/clinics/${clinicId}/patients/${patientId}/dental-chart/batch/`, { operations });
+  },
+
+  // Get all dental conditions, best matches first when searching
+  getDentalConditions: async (clinicId: string, search?: string): Promise<ConditionsResponse> => {
+    const query = search ? `?search=${encodeURIComponent(search)}` : '';
+    return apiGet(`/clinics/${clinicId}/dental-conditions/${query}`);
   },
 
-  // Get all dental procedures
-  getDentalProcedures: async (clinicId: string): Promise<ProceduresResponse> => {
-    return apiGet(`/clinics/${clinicId}/dental-procedures/`);
+  // Get all dental procedures, best matches first when searching
+  getDentalProcedures: async (
+    clinicId: string,
+    filters?: { search?: string; category?: string }
+  ): Promise<ProceduresResponse> => {
+    const queryParams = new URLSearchParams();
+    if (filters?.search) queryParams.append('search', filters.search);
+    if (filters?.category) queryParams.append('category', filters.category);
+
+    const query = queryParams.toString();
+    return apiGet(`/clinics/${clinicId}/dental-procedures/${query ? `?${query}` : ''}`);
   },
 
   // Add condition to tooth
@@ -179,15 +274,21 @@ export const dentalChartService = {
     filters?: {
       tooth_number?: string;
       category?: 'conditions' | 'procedures';
+      action?: string;
       start_date?: string;
       end_date?: string;
+      cursor?: string;
+      page_size?: number;
     }
   ): Promise<ChartHistoryResponse> => {
     const queryParams = new URLSearchParams();
     if (filters?.tooth_number) queryParams.append('tooth_number', filters.tooth_number);
     if (filters?.category) queryParams.append('category', filters.category);
+    if (filters?.action) queryParams.append('action', filters.action);
     if (filters?.start_date) queryParams.append('start_date', filters.start_date);
     if (filters?.end_date) queryParams.append('end_date', filters.end_date);
+    if (filters?.cursor) queryParams.append('cursor', filters.cursor);
+    if (filters?.page_size) queryParams.append('page_size', String(filters.page_size));
 
     const url = `/clinics/${clinicId}/patients/${patientId}/dental-chart/history/${
       queryParams.toString() ? `?${queryParams.toString()}` : ''
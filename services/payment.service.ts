@@ -1,4 +1,4 @@
-import { apiGet, apiPost, apiPatch, apiDelete } from "./api.utils";
+import { apiGet, apiPost, apiPatch, apiDelete, fetchWithClinic } from "./api.utils";
 
 export interface Payment {
   id: string | number;
@@ -60,6 +60,20 @@ export interface PaymentSummary {
   last_payment_date?: string;
 }
 
+export interface ReceivablesRow {
+  patient_id: number;
+  patient_name: string;
+  total_billed: string;
+  total_paid: string;
+  balance_due: string;
+  current: string;
+  days_31_60: string;
+  days_61_90: string;
+  days_over_90: string;
+  unapplied_credit: string;
+  last_payment_date: string;
+}
+
 export interface PaymentListResponse {
   results: Payment[];
   count: number;
@@ -104,6 +118,20 @@ export const paymentService = {
     return apiGet(`/clinics/${clinicId}/patients/${patientId}/balance/`);
   },
   
+  // Clinic-wide receivables with aging, as CSV text or parsed NDJSON rows
+  getReceivablesReport: async (
+    clinicId: string,
+    format: 'csv' | 'ndjson' = 'csv',
+    asOf?: string
+  ): Promise<string | ReceivablesRow[]> => {
+    const queryParams = new URLSearchParams({ format });
+    if (asOf) queryParams.append('as_of', asOf);
+    
+    const text: string = await fetchWithClinic(`/clinics/${clinicId}/reports/receivables/?${queryParams}`);
+    if (format === 'csv') return text;
+    return text.split('\n').filter(Boolean).map(line => JSON.parse(line));
+  },
+  
   // Get a single payment by ID
   getPayment: async (
     clinicId: string,